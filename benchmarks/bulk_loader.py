@@ -0,0 +1,84 @@
+"""
+Throughput of storing a document's segments and embeddings, per row versus in bulk.
+
+Stores the same synthetic document twice: once through store_segment and
+store_embedding, which open two transactions per segment, and once through
+store_document_segments, which writes everything in one transaction with
+multi-row inserts. Reports segments stored per second for each path.
+
+Needs a running Postgres with pgvector. The benchmark rows are deleted at the end.
+
+Usage (assuming running from project root, with the DB_* variables set):
+  uv run benchmarks/bulk_loader.py [--segments 2000]
+"""
+
+import argparse
+import time
+
+import numpy as np
+from sqlalchemy import delete, select
+
+from ucr_chatbot.config import Config
+from ucr_chatbot.db.models import (
+    Documents,
+    Embeddings,
+    Segments,
+    Session,
+    add_new_document,
+    base,
+    engine,
+    store_document_segments,
+    store_embedding,
+    store_segment,
+)
+
+PER_ROW_PATH = "benchmark/per_row.txt"
+BULK_PATH = "benchmark/bulk.txt"
+
+
+def remove_document(file_path: str):
+    """Deletes a benchmark document with its segments and embeddings."""
+    with Session(engine) as session:
+        segment_ids = select(Segments.id).where(Segments.document_id == file_path)
+        session.execute(delete(Embeddings).where(Embeddings.segment_id.in_(segment_ids)))
+        session.execute(delete(Segments).where(Segments.document_id == file_path))
+        session.execute(delete(Documents).where(Documents.file_path == file_path))
+        session.commit()
+
+
+def main():
+    """Runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--segments", type=int, default=2000)
+    parser.add_argument("--course", type=int, default=1)
+    args = parser.parse_args()
+
+    base.metadata.create_all(engine)
+    rng = np.random.default_rng(0)
+    texts = [f"Segment {i} of a benchmark document. " * 20 for i in range(args.segments)]
+    vectors = rng.normal(size=(args.segments, Config.EMBEDDING_DIMENSIONS)).tolist()
+
+    for file_path in (PER_ROW_PATH, BULK_PATH):
+        remove_document(file_path)
+        add_new_document(file_path, args.course)
+
+    start = time.perf_counter()
+    for text, vector in zip(texts, vectors):
+        store_embedding(vector, store_segment(text, PER_ROW_PATH))
+    per_row = time.perf_counter() - start
+
+    start = time.perf_counter()
+    store_document_segments(BULK_PATH, texts, vectors)
+    bulk = time.perf_counter() - start
+
+    print(f"{'path':<10} {'seconds':>10} {'segments/s':>12}")
+    print(f"{'per row':<10} {per_row:>10.2f} {args.segments / per_row:>12.0f}")
+    print(f"{'bulk':<10} {bulk:>10.2f} {args.segments / bulk:>12.0f}")
+    print(f"speedup: {per_row / bulk:.1f}x")
+
+    for file_path in (PER_ROW_PATH, BULK_PATH):
+        remove_document(file_path)
+
+
+if __name__ == "__main__":
+    main()
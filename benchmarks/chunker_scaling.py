@@ -0,0 +1,118 @@
+"""
+Scaling of the segment chunker with the length of the text.
+
+Chunks synthetic texts from 10 KB to 50 MB with the Chunker that every file
+parser uses, and with the list-based splitting that _parse_pdf used before it,
+which pops and inserts long sentences in place and so is quadratic in the
+number of sentences times the number of long ones. Three texts are measured:
+
+  * prose, with sentences of 5 to 30 words;
+  * notes, prose in which every 40 sentences a code listing or table runs
+    on for over a thousand characters without a full stop, each of which the
+    legacy splitting pops and reinserts in the middle of the sentence list;
+  * a slide deck without any full stops.
+
+The legacy splitting is only run up to --legacy-max bytes. Times are reported in
+milliseconds and in MB/s.
+
+Needs no database.
+
+Usage (assuming running from project root, with the DB_* variables set):
+  uv run benchmarks/chunker_scaling.py [--sizes 10000 100000 1000000 10000000 50000000]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from ucr_chatbot.api.file_parsing.chunker import Chunker
+from ucr_chatbot.config import Config
+
+
+def prose(size: int, seed: int = 0) -> str:
+    """Generates about size characters of sentences of random words."""
+    rng = np.random.default_rng(seed)
+    words = ["".join(rng.choice(list("etaoinshrdlu"), n)) for n in rng.integers(2, 10, 2000)]
+    pieces: list[str] = []
+    length = 0
+    while length < size:
+        sentence = " ".join(rng.choice(words, int(rng.integers(5, 31)))).capitalize() + ". "
+        pieces.append(sentence)
+        length += len(sentence)
+    return "".join(pieces)[:size]
+
+
+def notes(size: int) -> str:
+    """Generates about size characters of prose broken up by long runs without full stops."""
+    unit = "Short sentence here. " * 40 + "x" * 900 + " long run without stop " * 20 + ". "
+    return (unit * (size // len(unit) + 1))[:size]
+
+
+def slides(size: int) -> str:
+    """Generates about size characters of bullet points without full stops."""
+    return ("- bullet point about registers and opcodes\n" * (size // 43 + 1))[:size]
+
+
+def legacy_chunk(text: str, chars_per_seg: int, overlap: int) -> list[str]:
+    """Splits and combines text the way _parse_pdf did before the Chunker."""
+    sentences = [s + "." for s in text.split(".")]
+    i = 0
+    while i < len(sentences):
+        sentence = sentences[i]
+        if len(sentence) > (chars_per_seg / 2):
+            sentences.pop(i)
+            for j in range(0, len(sentence), chars_per_seg):
+                sentences.insert(i, sentence[j : j + chars_per_seg])
+                i += 1
+        else:
+            i += 1
+    segments: list[str] = []
+    curr_segment = ""
+    for i, sentence in enumerate(sentences):
+        if (len(curr_segment) + len(sentence)) < chars_per_seg:
+            curr_segment += sentence
+        else:
+            segments.append(curr_segment)
+            curr_segment = ""
+            for k in range(overlap, 0, -1):
+                if i - k >= 0:
+                    curr_segment += sentences[i - k]
+    if curr_segment:
+        segments.append(curr_segment)
+    return segments
+
+
+def timed(function, *args) -> tuple[float, int]:  # type: ignore
+    """Runs function and returns the milliseconds it took and the chunks it made."""
+    start = time.perf_counter()
+    chunks = function(*args)  # type: ignore
+    return (time.perf_counter() - start) * 1000, len(chunks)  # type: ignore
+
+
+def main():
+    """Runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000, 10_000_000, 50_000_000]
+    )
+    parser.add_argument("--legacy-max", type=int, default=50_000_000)
+    args = parser.parse_args()
+
+    chunker = Chunker(Config.SEGMENT_SIZE, Config.SEGMENT_OVERLAP)
+    print(f"{'text':<8} {'bytes':>10} {'chunks':>8} {'chunker ms':>11} {'MB/s':>7} {'legacy ms':>10} {'MB/s':>7}")
+    for name, generate in (("prose", prose), ("notes", notes), ("slides", slides)):
+        for size in args.sizes:
+            text = generate(size)
+            # Blocks of 64 KiB, as a streaming reader gives them.
+            blocks = [text[i : i + 65536] for i in range(0, len(text), 65536)]
+            ms, chunks = timed(lambda: list(chunker.chunk(blocks)))
+            line = f"{name:<8} {size:>10} {chunks:>8} {ms:>11.1f} {size / 1000 / ms:>7.1f}"
+            if size <= args.legacy_max:
+                legacy_ms, _ = timed(legacy_chunk, text, Config.SEGMENT_SIZE, Config.SEGMENT_OVERLAP)
+                line += f" {legacy_ms:>10.1f} {size / 1000 / legacy_ms:>7.1f}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
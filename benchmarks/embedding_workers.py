@@ -0,0 +1,101 @@
+"""
+Benchmark for the concurrent embedding stage used during document ingestion.
+
+Starts a local HTTP server that imitates Ollama's /api/embed endpoint, with a
+fixed per-request latency, a per-text latency, and a limited number of
+requests it will serve in parallel. Then embeds the same segments through
+EmbeddingWorkerPool with 1, 4, and 8 workers and reports segments per second.
+
+Usage (assuming running from project root, with the DB_* variables set):
+  uv run benchmarks/embedding_workers.py [--segments 2000] [--batch-size 8]
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+import ucr_chatbot.api.embedding.embedding as embedding
+from ucr_chatbot.api.ollama_transport import ollama_client, transport_stats
+from ucr_chatbot.api.embedding.workers import EmbeddingWorkerPool
+
+
+def make_handler(
+    request_latency: float, text_latency: float, parallel: int, dimensions: int
+) -> type[BaseHTTPRequestHandler]:
+    """Creates a request handler that imitates Ollama's embed endpoint."""
+    slots = threading.BoundedSemaphore(parallel)
+
+    class FakeOllamaHandler(BaseHTTPRequestHandler):
+        """Serves fake embeddings after a simulated model delay."""
+
+        def do_POST(self):  # noqa: N802
+            """Handles a POST to /api/embed."""
+            body: dict[str, Any] = json.loads(
+                self.rfile.read(int(self.headers["Content-Length"]))
+            )
+            texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            with slots:
+                time.sleep(request_latency + text_latency * len(texts))
+            payload = json.dumps(
+                {
+                    "model": body["model"],
+                    "embeddings": [[0.0] * dimensions for _ in texts],
+                }
+            ).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format: str, *args: Any):
+            """Silences per-request logging."""
+
+    return FakeOllamaHandler
+
+
+def main():
+    """Runs the benchmark and prints a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--segments", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--request-latency", type=float, default=0.02)
+    parser.add_argument("--text-latency", type=float, default=0.002)
+    parser.add_argument("--server-parallel", type=int, default=4)
+    parser.add_argument("--dimensions", type=int, default=768)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0),
+        make_handler(
+            args.request_latency,
+            args.text_latency,
+            args.server_parallel,
+            args.dimensions,
+        ),
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    embedding.client = ollama_client(60.0, host=f"http://127.0.0.1:{server.server_port}")
+
+    segments = [f"Segment number {i} of a long textbook." for i in range(args.segments)]
+    print(f"{'workers':>8} {'seconds':>10} {'segments/s':>12}")
+    for workers in (1, 4, 8):
+        pool = EmbeddingWorkerPool(
+            workers=workers, max_in_flight=2 * workers, batch_size=args.batch_size
+        )
+        start = time.perf_counter()
+        result = pool.embed(segments)
+        elapsed = time.perf_counter() - start
+        assert len(result) == len(segments)
+        print(f"{workers:>8} {elapsed:>10.2f} {len(segments) / elapsed:>12.1f}")
+
+    stats = transport_stats()["/api/embed"]
+    print(f"requests: {stats.requests}, mean latency: {stats.mean_seconds * 1000:.1f} ms")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Course-filtered vector search over many courses of very different sizes.
+
+Loads synthetic courses whose sizes span several orders of magnitude into one
+Embeddings table, builds the HNSW index, and runs top-k queries scoped to each
+course in two ways:
+
+  * joined: the course is read from Documents through a join, so the index
+    returns the nearest vectors of all courses and the filter runs afterwards,
+    as retrieval did before course_id was copied onto Embeddings;
+  * filtered: the Retriever's query, which filters on Embeddings.course_id and
+    is_active and lets pgvector's iterative index scan keep searching until k
+    rows of the course are found.
+
+For each course, reports the mean number of rows returned, recall@k against an
+exact search of the course, and query latency.
+
+Needs a running Postgres with pgvector 0.8 or later. The benchmark rows are
+deleted at the end.
+
+Usage (assuming running from project root, with the DB_* variables set):
+  uv run benchmarks/filtered_search.py [--sizes 50,500,5000,50000] [--queries 100] [--k 10]
+"""
+
+import argparse
+import time
+
+import numpy as np
+from sqlalchemy import delete, select, text
+
+from ucr_chatbot.api.context_retrieval.retriever import Retriever
+from ucr_chatbot.config import Config, VectorStorage
+from ucr_chatbot.db.models import (
+    Courses,
+    Documents,
+    Embeddings,
+    Segments,
+    Session,
+    base,
+    engine,
+    vector_distance,
+)
+from vector_index import load_corpus, report, synthetic_vectors
+
+
+def joined_query(embedding: list[float], course_id: int, k: int):
+    """Builds the search that filters on the course after joining Documents."""
+    return (
+        select(Segments.id)
+        .join(Embeddings)
+        .join(Documents)
+        .where(Documents.course_id == course_id)
+        .where(Embeddings.model == Config.EMBEDDING_MODEL)
+        .order_by(vector_distance(embedding))
+        .limit(k)
+    )
+
+
+def main():
+    """Runs the benchmark."""
+    from ucr_chatbot.db.cli import build_index, migrate_embeddings
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=str, default="50,500,5000,50000")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    base.metadata.create_all(engine)
+    migrate_embeddings()
+
+    dimensions = Config.EMBEDDING_DIMENSIONS
+    courses: dict[int, tuple[str, np.ndarray, list[int]]] = {}
+    for seed, size in enumerate(sizes):
+        with Session(engine) as session:
+            course = Courses(name=f"filtered-search-benchmark-{size}")
+            session.add(course)
+            session.commit()
+            course_id = int(course.id)  # type: ignore
+        document_path = f"benchmark/filtered_search_{course_id}.txt"
+        vectors = synthetic_vectors(size, dimensions, seed=seed)
+        segment_ids = load_corpus(course_id, vectors, document_path=document_path)
+        courses[course_id] = (document_path, vectors, segment_ids)
+
+    build_index(Config.HNSW_M, Config.HNSW_EF_CONSTRUCTION)
+    with engine.connect() as connection:
+        connection.execute(text('ANALYZE "Embeddings"'))
+
+    queries = synthetic_vectors(args.queries, dimensions, seed=len(sizes))
+    retriever = Retriever(storage=VectorStorage.FLOAT32)
+    for course_id, (_, vectors, segment_ids) in courses.items():
+        ids = np.array(segment_ids)
+        exact = [
+            set(ids[np.argsort(np.linalg.norm(vectors - query, axis=1))[: args.k]])
+            for query in queries
+        ]
+        print(f"course of {len(vectors)} segments")
+        for label, build in (
+            ("joined", lambda q: joined_query(q, course_id, args.k)),
+            (
+                "filtered",
+                lambda q: retriever.search_query(
+                    q, course_id, Config.EMBEDDING_MODEL, args.k
+                ).with_only_columns(Segments.id),
+            ),
+        ):
+            latencies: list[float] = []
+            returned: list[int] = []
+            recalls: list[float] = []
+            with Session(engine) as session:
+                for query, truth in zip(queries, exact):
+                    start = time.perf_counter()
+                    found = session.scalars(build(query.tolist())).all()
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    returned.append(len(found))
+                    recalls.append(len(truth & set(found)) / len(truth))
+            report(f"  {label}", latencies)
+            print(
+                f"{'':<12} rows {np.mean(returned):.1f}/{args.k}"
+                f"   recall@{args.k} {np.mean(recalls):.3f}"
+            )
+
+    with Session(engine) as session:
+        for course_id, (document_path, _, _) in courses.items():
+            segment_ids = select(Segments.id).where(Segments.document_id == document_path)
+            session.execute(delete(Embeddings).where(Embeddings.segment_id.in_(segment_ids)))
+            session.execute(delete(Segments).where(Segments.document_id == document_path))
+            session.execute(delete(Documents).where(Documents.file_path == document_path))
+            session.execute(delete(Courses).where(Courses.id == course_id))
+        session.commit()
+
+
+if __name__ == "__main__":
+    main()
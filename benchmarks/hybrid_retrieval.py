@@ -0,0 +1,179 @@
+"""
+Recall and latency of vector, lexical, and hybrid retrieval on the bundled test PDFs.
+
+Parses and embeds the PDFs in tests/file_parser/test_files into a throwaway
+course, then asks two kinds of known-item questions, each answered by one
+segment:
+
+  * identifier: a rare token copied from the segment, such as an opcode,
+    a register name, or a number, as students paste them;
+  * paraphrase: a run of words from the segment with every other word dropped,
+    which favours embeddings over exact word matches.
+
+For each retrieval mode reports recall@k per question kind, and the time
+spent embedding the prompt, in the vector query, in the full-text query, and
+fusing the rankings.
+
+Needs a running Postgres with pgvector and the configured embedding backend
+(EMBEDDING_BACKEND=hashing works without Ollama). The course is deleted at the end.
+
+Usage (assuming running from project root, with the DB_* variables set):
+  uv run benchmarks/hybrid_retrieval.py [--questions 100] [--k 5]
+"""
+
+import argparse
+from collections import Counter
+from pathlib import Path
+import re
+import time
+
+import numpy as np
+from sqlalchemy import delete, select
+
+from ucr_chatbot.api.context_retrieval.retriever import (
+    Retriever,
+    reciprocal_rank_fusion,
+)
+from ucr_chatbot.api.embedding.embedding import embed_text, embed_texts
+from ucr_chatbot.api.file_parsing.file_parsing import parse_file
+from ucr_chatbot.config import Config, RetrievalMode, VectorStorage
+from ucr_chatbot.db.models import (
+    Courses,
+    Documents,
+    Embeddings,
+    Segments,
+    Session,
+    add_new_document,
+    base,
+    engine,
+    store_document_segments,
+)
+
+TEST_FILES = Path(__file__).parent.parent / "tests" / "file_parser" / "test_files"
+
+
+def load_pdfs(course_id: int) -> dict[int, str]:
+    """Stores every bundled test PDF in the course and returns the segments by id."""
+    segments: dict[int, str] = {}
+    for pdf in sorted(TEST_FILES.glob("*.pdf")):
+        file_path = f"benchmark/{course_id}/{pdf.name}"
+        add_new_document(file_path, course_id)
+        texts = parse_file(str(pdf))
+        ids = store_document_segments(file_path, texts, embed_texts(texts))
+        segments.update(zip(ids, texts))
+    return segments
+
+
+def questions(
+    segments: dict[int, str], count: int, rng: np.random.Generator
+) -> dict[str, list[tuple[str, int]]]:
+    """Builds identifier and paraphrase questions, each paired with the id of its answer."""
+    frequency = Counter(
+        word for text in segments.values() for word in set(re.findall(r"\w+", text.lower()))
+    )
+    identifier: list[tuple[str, int]] = []
+    paraphrase: list[tuple[str, int]] = []
+    for segment_id in rng.permutation(list(segments)):
+        words = re.findall(r"\w+", segments[segment_id])
+        rare = [word for word in words if frequency[word.lower()] == 1]
+        if rare and len(identifier) < count:
+            identifier.append((f"What is {rare[0]}?", int(segment_id)))
+        if len(words) >= 24 and len(paraphrase) < count:
+            start = int(rng.integers(0, len(words) - 24))
+            paraphrase.append((" ".join(words[start : start + 24 : 2]), int(segment_id)))
+    return {"identifier": identifier, "paraphrase": paraphrase}
+
+
+def main():
+    """Runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    from ucr_chatbot.db.cli import migrate_embeddings, migrate_segments
+
+    base.metadata.create_all(engine)
+    migrate_embeddings()
+    migrate_segments()
+    with Session(engine) as session:
+        course = Courses(name="hybrid-retrieval-benchmark")
+        session.add(course)
+        session.commit()
+        course_id = int(course.id)  # type: ignore
+
+    try:
+        segments = load_pdfs(course_id)
+        print(f"{len(segments)} segments from {len(list(TEST_FILES.glob('*.pdf')))} PDFs")
+        asked = questions(segments, args.questions, np.random.default_rng(0))
+        retriever = Retriever(storage=VectorStorage.FLOAT32)
+        depth = args.k * Config.HYBRID_CANDIDATE_FACTOR
+
+        timings: dict[str, list[float]] = {"embed": [], "vector": [], "lexical": [], "fuse": []}
+        hits = {(mode, kind): 0 for mode in RetrievalMode for kind in asked}
+        with Session(engine) as session:
+            for kind, pairs in asked.items():
+                for prompt, answer in pairs:
+                    start = time.perf_counter()
+                    embedding = embed_text(prompt)
+                    timings["embed"].append(time.perf_counter() - start)
+
+                    start = time.perf_counter()
+                    vector = [
+                        int(segment.id)  # type: ignore
+                        for segment in session.scalars(
+                            retriever.search_query(embedding, course_id, Config.EMBEDDING_MODEL, depth)
+                        )
+                    ]
+                    timings["vector"].append(time.perf_counter() - start)
+
+                    start = time.perf_counter()
+                    query = retriever.lexical_query(prompt, course_id, Config.EMBEDDING_MODEL, depth)
+                    lexical = (
+                        [int(segment.id) for segment in session.scalars(query)]  # type: ignore
+                        if query is not None
+                        else []
+                    )
+                    timings["lexical"].append(time.perf_counter() - start)
+
+                    start = time.perf_counter()
+                    hybrid = reciprocal_rank_fusion(
+                        [vector, lexical],
+                        [Config.HYBRID_VECTOR_WEIGHT, Config.HYBRID_LEXICAL_WEIGHT],
+                    )
+                    timings["fuse"].append(time.perf_counter() - start)
+
+                    results = {
+                        RetrievalMode.VECTOR: vector,
+                        RetrievalMode.LEXICAL: lexical,
+                        RetrievalMode.HYBRID: hybrid,
+                    }
+                    for mode, ranking in results.items():
+                        hits[(mode, kind)] += answer in ranking[: args.k]
+
+        print(f"{'mode':<10}" + "".join(f"{kind:>14}" for kind in asked))
+        for mode in RetrievalMode:
+            row = "".join(
+                f"{hits[(mode, kind)] / max(1, len(pairs)):>14.3f}"
+                for kind, pairs in asked.items()
+            )
+            print(f"{mode.name.lower():<10}{row}")
+        print(f"recall@{args.k} over {', '.join(f'{len(p)} {k}' for k, p in asked.items())} questions")
+        for stage, seconds in timings.items():
+            print(
+                f"{stage:<8} p50 {np.percentile(seconds, 50) * 1000:8.2f} ms"
+                f"   p95 {np.percentile(seconds, 95) * 1000:8.2f} ms"
+            )
+    finally:
+        with Session(engine) as session:
+            documents = select(Documents.file_path).where(Documents.course_id == course_id)
+            segment_ids = select(Segments.id).where(Segments.document_id.in_(documents))
+            session.execute(delete(Embeddings).where(Embeddings.segment_id.in_(segment_ids)))
+            session.execute(delete(Segments).where(Segments.document_id.in_(documents)))
+            session.execute(delete(Documents).where(Documents.course_id == course_id))
+            session.execute(delete(Courses).where(Courses.id == course_id))
+            session.commit()
+
+
+if __name__ == "__main__":
+    main()
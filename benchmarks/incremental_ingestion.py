@@ -0,0 +1,112 @@
+"""
+Cost of re-ingesting an edited document, incrementally versus from scratch.
+
+Stores a synthetic document, then uploads new versions of it in which a
+growing fraction of the segments was edited. For each version, reports how
+many segments had to be embedded and how long ingestion took when only the
+changed segments are embedded (what the ingestion worker does) and when every
+segment is embedded again.
+
+Embedding is simulated with a fixed cost per text so that the benchmark does
+not need Ollama; pass --embed-ms 0 to measure the database work alone.
+
+Needs a running Postgres with pgvector. The benchmark rows are deleted at the end.
+
+Usage (assuming running from project root, with the DB_* variables set):
+  uv run benchmarks/incremental_ingestion.py [--segments 2000] [--embed-ms 5]
+"""
+
+import argparse
+import time
+from typing import Sequence
+
+import numpy as np
+
+from ucr_chatbot.config import Config
+from ucr_chatbot.db.models import (
+    add_new_document,
+    base,
+    engine,
+    segment_hash,
+    store_document_segments,
+    sync_document_segments,
+)
+from ucr_chatbot.worker import unstored_segments
+from bulk_loader import remove_document
+
+FILE_PATH = "benchmark/incremental.txt"
+COURSE_ID = 1
+EDIT_FRACTIONS = (0.0, 0.01, 0.1, 0.5, 1.0)
+
+
+def embed(texts: Sequence[str], embed_ms: float) -> dict[str, list[float]]:
+    """Stands in for the embedding model, taking embed_ms per text."""
+    time.sleep(len(texts) * embed_ms / 1000)
+    rng = np.random.default_rng(len(texts))
+    vectors = rng.normal(size=(len(texts), Config.EMBEDDING_DIMENSIONS)).tolist()
+    return {segment_hash(text): vector for text, vector in zip(texts, vectors)}
+
+
+def edit(segments: list[str], fraction: float, revision: int) -> list[str]:
+    """Rewrites an evenly spread fraction of the segments."""
+    step = max(1, round(1 / fraction)) if fraction else len(segments) + 1
+    return [
+        f"{text} (revision {revision})" if i % step == 0 else text
+        for i, text in enumerate(segments)
+    ]
+
+
+def ingest(
+    segments: list[str], embed_ms: float, incremental: bool
+) -> tuple[int, float]:
+    """Ingests a version of the document and returns the segments embedded and the seconds taken."""
+    start = time.perf_counter()
+    if incremental:
+        texts = list(unstored_segments(FILE_PATH, segments).values())
+        sync_document_segments(FILE_PATH, segments, embed(texts, embed_ms))
+        return len(texts), time.perf_counter() - start
+
+    # Without versioning a corrected upload replaces the whole document.
+    remove_document(FILE_PATH)
+    add_new_document(FILE_PATH, COURSE_ID)
+    embeddings = embed(segments, embed_ms)
+    store_document_segments(
+        FILE_PATH, segments, [embeddings[segment_hash(text)] for text in segments]
+    )
+    return len(segments), time.perf_counter() - start
+
+
+def main():
+    """Runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--segments", type=int, default=2000)
+    parser.add_argument("--embed-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    base.metadata.create_all(engine)
+    original = [f"Segment {i} of a lecture. " * 20 for i in range(args.segments)]
+
+    print(
+        f"{'edited':>7} {'embedded':>10} {'incremental s':>14} "
+        f"{'embedded':>10} {'full s':>8}"
+    )
+    for revision, fraction in enumerate(EDIT_FRACTIONS, 1):
+        results: list[tuple[int, float]] = []
+        for incremental in (True, False):
+            remove_document(FILE_PATH)
+            add_new_document(FILE_PATH, COURSE_ID)
+            ingest(original, 0, incremental=True)
+            results.append(
+                ingest(edit(original, fraction, revision), args.embed_ms, incremental)
+            )
+        (inc_count, inc_seconds), (full_count, full_seconds) = results
+        print(
+            f"{fraction:>7.0%} {inc_count:>10} {inc_seconds:>14.2f} "
+            f"{full_count:>10} {full_seconds:>8.2f}"
+        )
+
+    remove_document(FILE_PATH)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Offline ingestion and retrieval benchmark on the bundled test PDFs.
+
+Parses every PDF in tests/file_parser/test_files, embeds the segments with
+the local hashing backend, and then uses one sentence from each segment as a
+query. Reports embedding throughput and how often the source segment is
+ranked first (recall@1) or within the top five (recall@5).
+
+No database or Ollama server is needed.
+
+Usage (assuming running from project root, with the DB_* variables set):
+  EMBEDDING_BACKEND=hashing uv run benchmarks/local_retrieval.py
+"""
+
+from pathlib import Path
+import time
+
+import numpy as np
+
+from ucr_chatbot.api.embedding.embedding import embed_texts
+from ucr_chatbot.api.file_parsing.file_parsing import parse_file
+
+TEST_FILES = Path(__file__).resolve().parent.parent / "tests" / "file_parser" / "test_files"
+
+
+def probe_sentence(segment: str) -> str | None:
+    """Picks a reasonably long sentence from the middle of a segment to use as a query."""
+    sentences = [s.strip() for s in segment.split(".") if len(s.split()) >= 6]
+    if not sentences:
+        return None
+    return sentences[len(sentences) // 2]
+
+
+def main():
+    """Runs the benchmark and prints the results."""
+    segments: list[str] = []
+    start = time.perf_counter()
+    for pdf in sorted(TEST_FILES.glob("*.pdf")):
+        segments.extend(parse_file(str(pdf)))
+    parse_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matrix = np.asarray(embed_texts(segments), dtype=np.float32)
+    embed_seconds = time.perf_counter() - start
+
+    probes = [(i, probe_sentence(segment)) for i, segment in enumerate(segments)]
+    probes = [(i, probe) for i, probe in probes if probe is not None]
+    queries = np.asarray(embed_texts([probe for _, probe in probes]), dtype=np.float32)
+
+    hits_at_1 = 0
+    hits_at_5 = 0
+    for (expected, _), query in zip(probes, queries):
+        distances = np.linalg.norm(matrix - query, axis=1)
+        ranking = np.argsort(distances)
+        hits_at_1 += int(ranking[0] == expected)
+        hits_at_5 += int(expected in ranking[:5])
+
+    print(f"segments:          {len(segments)}")
+    print(f"parse time:        {parse_seconds:.2f}s")
+    print(f"embedding rate:    {len(segments) / embed_seconds:.0f} segments/s")
+    print(f"queries:           {len(probes)}")
+    print(f"recall@1:          {hits_at_1 / len(probes):.3f}")
+    print(f"recall@5:          {hits_at_5 / len(probes):.3f}")
+
+
+if __name__ == "__main__":
+    main()
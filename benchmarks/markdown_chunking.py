@@ -0,0 +1,145 @@
+"""
+Chunking of large markdown course notes, by headings versus by every #.
+
+Generates course notes made of nested sections of prose, bulleted lists, and
+fenced C and Python code with #include lines and # comments, with links to
+#anchors, then chunks them at each --sizes size with:
+
+  * the legacy _parse_md, which split the repr of the file's bytes on every
+    # character and pops and appends while iterating over the pieces;
+  * the heading-aware markdown chunker that .md files are parsed with now.
+
+For each it reports the time taken, the number of chunks, their mean length,
+the estimated tokens that embedding all of them costs, the share of the prose
+sentences that some chunk holds whole, and how many code block lines were
+separated from the rest of their block. The heading-aware chunks repeat
+SEGMENT_OVERLAP sentences of the chunk before, which costs embedding tokens;
+the legacy chunks lose sentences instead.
+
+Needs no database.
+
+Usage (assuming running from project root, with the DB_* variables set):
+  uv run benchmarks/markdown_chunking.py [--sizes 100000 1000000 10000000]
+"""
+
+import argparse
+from io import BytesIO
+import re
+import time
+
+import numpy as np
+
+from ucr_chatbot.api.file_parsing.file_parsing import _iter_md, segment_chunker
+from ucr_chatbot.api.language_model.prompt_packing import ApproximateTokenizer
+
+CODE_BLOCKS = (
+    "```c\n#include <stdio.h>\n#define SIZE 16\n\nint main(void) {\n"
+    '    printf("%d\\n", SIZE);\n    return 0;\n}\n```\n',
+    "```python\n# Walk the list.\nfor item in items:\n    total += item.value  # running sum\n```\n",
+)
+
+
+def course_notes(size: int, seed: int = 0) -> str:
+    """Generates about size characters of markdown course notes."""
+    rng = np.random.default_rng(seed)
+    words = ["".join(rng.choice(list("etaoinshrdlu"), n)) for n in rng.integers(2, 10, 2000)]
+
+    def sentence() -> str:
+        return " ".join(rng.choice(words, int(rng.integers(5, 25)))).capitalize() + "."
+
+    parts: list[str] = []
+    length = 0
+    week = 0
+    while length < size:
+        week += 1
+        parts.append(f"# Week {week}\n\n")
+        for topic in range(int(rng.integers(2, 5))):
+            parts.append(f"## Topic {week}.{topic}\n\n")
+            parts.append(" ".join(sentence() for _ in range(int(rng.integers(3, 9)))) + "\n\n")
+            parts.append(f"See [the slides](https://example.edu/cs100#week-{week}) first.\n\n")
+            for detail in range(int(rng.integers(0, 3))):
+                parts.append(f"### Detail {detail}\n\n")
+                parts.append("".join(f"- {sentence()}\n" for _ in range(int(rng.integers(2, 6)))) + "\n")
+            if rng.random() < 0.6:
+                parts.append(CODE_BLOCKS[int(rng.integers(0, len(CODE_BLOCKS)))] + "\n")
+        length = sum(len(part) for part in parts)
+    return "".join(parts)
+
+
+def legacy_parse_md(data: bytes, chars_per_seg: int = 1000) -> list[str]:
+    """Chunks markdown the way _parse_md did before the heading-aware chunker."""
+    raw_string = str(data)
+    new_string = raw_string.replace("\\r\\n", "\n")
+    new_string = new_string.replace("\\'", "'")
+    total_text = new_string[2:-1]
+    sections = total_text.split("#")
+    for i, section in enumerate(sections):
+        if section == "":
+            sections.pop(i)
+    for i, section in enumerate(sections):
+        if len(section) > chars_per_seg:
+            temp_section = section
+            sections.pop(i)
+            for j in range(0, len(temp_section), chars_per_seg):
+                sections.append(temp_section[j : j + chars_per_seg])
+    segments: list[str] = []
+    curr_segment = ""
+    for i, section in enumerate(sections):
+        if (len(curr_segment) + len(section)) < chars_per_seg:
+            curr_segment += section
+        else:
+            segments.append(curr_segment)
+            curr_segment = sections[i - 1]
+    segments.append(curr_segment)
+    return segments
+
+
+def broken_code_blocks(chunks: list[str]) -> int:
+    """Counts the code block lines that appear without the rest of their block."""
+    whole = sum(chunk.count("int main(void)") for chunk in chunks if "#include <stdio.h>" in chunk)
+    whole += sum(chunk.count("for item in items") for chunk in chunks if "# Walk the list." in chunk)
+    lines = sum(chunk.count("int main(void)") + chunk.count("for item in items") for chunk in chunks)
+    return lines - whole
+
+
+SENTENCE = re.compile(r"[A-Z][a-z ]+\.")
+
+
+def report(name: str, chunks: list[str], ms: float, sentences: set[str]):
+    """Prints the statistics of one chunking."""
+    tokenizer = ApproximateTokenizer()
+    tokens = sum(tokenizer.count(chunk) for chunk in chunks)
+    mean = np.mean([len(chunk) for chunk in chunks]) if chunks else 0
+    found = {sentence for chunk in chunks for sentence in SENTENCE.findall(chunk)}
+    coverage = len(sentences & found) / len(sentences)
+    print(
+        f"  {name:<8} {ms:>10.1f} {len(chunks):>8} {mean:>10.0f} {tokens:>12} "
+        f"{coverage:>9.1%} {broken_code_blocks(chunks):>12}"
+    )
+
+
+def main():
+    """Runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        notes = course_notes(size)
+        data = notes.encode()
+        code_blocks = len(re.findall("^```[a-z]", notes, re.MULTILINE))
+        sentences = set(SENTENCE.findall(notes))
+        print(f"{len(data)} bytes of notes, {code_blocks} code blocks")
+        print(f"  {'parser':<8} {'ms':>10} {'chunks':>8} {'mean chars':>10} {'embed tokens':>12} {'sentences':>9} {'broken code':>12}")
+
+        start = time.perf_counter()
+        legacy = legacy_parse_md(data)
+        report("legacy", legacy, (time.perf_counter() - start) * 1000, sentences)
+
+        start = time.perf_counter()
+        chunks = [segment.text for segment in _iter_md(BytesIO(data), segment_chunker())]  # type: ignore
+        report("headings", chunks, (time.perf_counter() - start) * 1000, sentences)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Latency of the memory-mapped vector index against pgvector.
+
+Writes a synthetic corpus of clustered unit vectors to a float32 and a float16
+index file with MmapVectorIndex, and measures top-k search latency and recall
+against an exact float32 scan. Unless --offline is passed, the same corpus is
+also loaded into a throwaway course and searched through the retriever's
+pgvector query, both with a sequential scan and with the HNSW index.
+
+Needs a running Postgres with pgvector unless --offline is passed. The benchmark
+rows and index files are deleted at the end unless --keep is passed.
+
+Usage (assuming running from project root, with the DB_* variables set):
+  uv run benchmarks/mmap_index.py [--segments 100000] [--queries 200] [--k 10]
+  uv run benchmarks/mmap_index.py --offline
+"""
+
+import argparse
+from pathlib import Path
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import delete, text
+
+from ucr_chatbot.api.context_retrieval.mmap_index import MmapVectorIndex
+from ucr_chatbot.config import Config
+from vector_index import load_corpus, report, synthetic_vectors
+
+DOCUMENT_PATH = "benchmark/mmap_index.txt"
+
+
+def recall(results: list[list[int]], exact: list[list[int]]) -> float:
+    """Computes the mean fraction of the exact top-k that each result contains."""
+    return float(np.mean([len(set(r) & set(e)) / len(e) for r, e in zip(results, exact)]))
+
+
+def exact_results(corpus: np.ndarray, ids: list[int], queries: np.ndarray, k: int) -> list[list[int]]:
+    """Finds the exact top-k segment ids of each query with a float32 scan."""
+    return [
+        [ids[i] for i in np.argsort(np.linalg.norm(corpus - query, axis=1))[:k]]
+        for query in queries
+    ]
+
+
+def run_mmap(
+    directory: Path, dtype: str, course_id: int, corpus: np.ndarray, ids: list[int], queries: np.ndarray, k: int
+) -> tuple[list[float], list[list[int]]]:
+    """Writes the corpus to an index file and times each search."""
+    index = MmapVectorIndex(directory, dtype)
+    start = time.perf_counter()
+    index.write(course_id, Config.EMBEDDING_MODEL, [(ids, corpus)])  # type: ignore
+    size = index.path(course_id, Config.EMBEDDING_MODEL, corpus.shape[1]).stat().st_size
+    print(f"wrote {dtype} index ({size / 2**20:.1f} MiB) in {time.perf_counter() - start:.1f}s")
+
+    index.search(course_id, Config.EMBEDDING_MODEL, queries[0].tolist(), k)
+    latencies: list[float] = []
+    results: list[list[int]] = []
+    for query in queries:
+        start = time.perf_counter()
+        found = index.search(course_id, Config.EMBEDDING_MODEL, query.tolist(), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append([segment_id for segment_id, _ in found])
+    return latencies, results
+
+
+def run_pgvector(course_id: int, queries: np.ndarray, k: int, exact: bool) -> tuple[list[float], list[list[int]]]:
+    """Runs each query through the retriever's pgvector search."""
+    from ucr_chatbot.api.context_retrieval.retriever import Retriever
+    from ucr_chatbot.db.models import Session, engine
+
+    retriever = Retriever()
+    latencies: list[float] = []
+    results: list[list[int]] = []
+    with Session(engine) as session:
+        if exact:
+            session.execute(text("SET enable_indexscan = off"))
+        for query in queries:
+            start = time.perf_counter()
+            segments = session.scalars(
+                retriever.search_query(query.tolist(), course_id, Config.EMBEDDING_MODEL, k)
+            ).all()
+            latencies.append((time.perf_counter() - start) * 1000)
+            results.append([int(segment.id) for segment in segments])  # type: ignore
+    return latencies, results
+
+
+def main():
+    """Runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--segments", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--offline", action="store_true")
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    dimensions = Config.EMBEDDING_DIMENSIONS
+    corpus = synthetic_vectors(args.segments, dimensions, seed=0)
+    queries = synthetic_vectors(args.queries, dimensions, seed=1)
+
+    course_id = 0
+    ids = list(range(1, args.segments + 1))
+    if not args.offline:
+        from ucr_chatbot.db.cli import build_index, migrate_embeddings
+        from ucr_chatbot.db.models import Courses, Session, base, engine
+
+        base.metadata.create_all(engine)
+        migrate_embeddings()
+        with Session(engine) as session:
+            course = Courses(name="mmap-index-benchmark")
+            session.add(course)
+            session.commit()
+            course_id = int(course.id)  # type: ignore
+        ids = load_corpus(course_id, corpus, document_path=DOCUMENT_PATH)
+
+    exact = exact_results(corpus, ids, queries, args.k)
+    directory = Path(tempfile.mkdtemp(prefix="mmap-index-"))
+    try:
+        for dtype in ("float32", "float16"):
+            latencies, results = run_mmap(directory, dtype, course_id, corpus, ids, queries, args.k)
+            report(f"mmap {dtype}", latencies)
+            print(f"{'':<12} recall@{args.k} {recall(results, exact):.3f}")
+
+        if not args.offline:
+            latencies, results = run_pgvector(course_id, queries, args.k, exact=True)
+            report("pg seq scan", latencies)
+            build_index(Config.HNSW_M, Config.HNSW_EF_CONSTRUCTION)
+            with engine.connect() as connection:
+                connection.execute(text('ANALYZE "Embeddings"'))
+            latencies, results = run_pgvector(course_id, queries, args.k, exact=False)
+            report("pg hnsw", latencies)
+            print(f"{'':<12} recall@{args.k} {recall(results, exact):.3f}")
+    finally:
+        if args.keep:
+            print(f"index files kept in {directory}")
+        else:
+            shutil.rmtree(directory)
+            if not args.offline:
+                from bulk_loader import remove_document
+
+                remove_document(DOCUMENT_PATH)
+                with Session(engine) as session:
+                    session.execute(delete(Courses).where(Courses.id == course_id))
+                    session.commit()
+
+
+if __name__ == "__main__":
+    main()
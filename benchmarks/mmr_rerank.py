@@ -0,0 +1,112 @@
+"""
+Prompt size saved by re-ranking retrieved segments by maximal marginal relevance.
+
+Parses the PDFs in tests/file_parser/test_files, whose segments overlap their
+neighbours by two sentences, embeds them with the configured backend, and asks
+questions made of a run of words from a random segment. For each question the
+top --k segments by vector distance are compared with the --k segments that MMR
+picks from the best --pool, and reports for both:
+
+  * the estimated prompt tokens of the context, built as generate_response does;
+  * how many distinct sentences that context holds.
+
+Since overlapping neighbours repeat sentences, MMR fits more distinct sentences
+into the same number of segments. The last line reports the tokens MMR needs to
+cover as many distinct sentences as the plain top --k, which is the prompt
+saving at equal coverage. Tokens are estimated by counting words and punctuation
+marks, which tracks subword tokenizers closely enough for a ratio.
+
+Needs no database. EMBEDDING_BACKEND=hashing works without Ollama.
+
+Usage (assuming running from project root, with the DB_* variables set):
+  uv run benchmarks/mmr_rerank.py [--questions 200] [--k 10] [--pool 20] [--lambda 0.7]
+"""
+
+import argparse
+from pathlib import Path
+import re
+
+import numpy as np
+
+from ucr_chatbot.api.context_retrieval.retriever import maximal_marginal_relevance
+from ucr_chatbot.api.embedding.embedding import embed_texts
+from ucr_chatbot.api.file_parsing.file_parsing import parse_file
+from ucr_chatbot.config import Config
+
+TEST_FILES = Path(__file__).parent.parent / "tests" / "file_parser" / "test_files"
+
+
+def estimate_tokens(text: str) -> int:
+    """Counts the words and punctuation marks of text."""
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+
+def sentences(text: str) -> set[str]:
+    """Splits text into sentences the way _parse_pdf did, ignoring whitespace."""
+    return {" ".join(s.split()) for s in text.split(".") if s.strip()}
+
+
+def measure(texts: list[str], picked: list[int]) -> tuple[int, int]:
+    """Gets the estimated prompt tokens and distinct sentences of a context."""
+    context = "\n".join(f"Reference number: {i}, text: {texts[i]}" for i in picked)
+    distinct = set[str]().union(*(sentences(texts[i]) for i in picked))
+    return estimate_tokens(context), len(distinct)
+
+
+def main():
+    """Runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--pool", type=int, default=Config.MMR_CANDIDATE_POOL)
+    parser.add_argument("--lambda", dest="mmr_lambda", type=float, default=Config.MMR_LAMBDA)
+    args = parser.parse_args()
+
+    texts = [text for pdf in sorted(TEST_FILES.glob("*.pdf")) for text in parse_file(str(pdf))]
+    corpus = np.asarray(embed_texts(texts), dtype=np.float32)
+    print(f"{len(texts)} segments from {len(list(TEST_FILES.glob('*.pdf')))} PDFs")
+
+    rng = np.random.default_rng(0)
+    prompts: list[str] = []
+    for i in rng.permutation(len(texts)):
+        words = re.findall(r"\w+", texts[i])
+        if len(words) >= 12:
+            start = int(rng.integers(0, len(words) - 12 + 1))
+            prompts.append(" ".join(words[start : start + 12]))
+        if len(prompts) == args.questions:
+            break
+    queries = np.asarray(embed_texts(prompts), dtype=np.float32)
+
+    plain: list[tuple[int, int]] = []
+    diverse: list[tuple[int, int]] = []
+    equal_coverage: list[int] = []
+    for query in queries:
+        ranked = np.argsort(np.linalg.norm(corpus - query, axis=1))
+        top = ranked[: args.k].tolist()
+        pool = ranked[: max(args.k, args.pool)].tolist()
+        order = maximal_marginal_relevance(query, corpus[pool], args.k, args.mmr_lambda)  # type: ignore
+        picked = [pool[i] for i in order]
+
+        plain.append(measure(texts, top))
+        diverse.append(measure(texts, picked))
+        # MMR picks greedily, so its shorter contexts are prefixes of the longer one.
+        for n in range(1, len(picked) + 1):
+            tokens, distinct = measure(texts, picked[:n])
+            if distinct >= plain[-1][1] or n == len(picked):
+                equal_coverage.append(tokens)
+                break
+
+    plain_tokens, plain_sentences = np.mean(plain, axis=0)
+    diverse_tokens, diverse_sentences = np.mean(diverse, axis=0)
+    print(f"{'context':<24} {'tokens':>8} {'sentences':>10}")
+    print(f"{f'top {args.k}':<24} {plain_tokens:>8.0f} {plain_sentences:>10.1f}")
+    print(f"{f'mmr {args.k} of {args.pool}':<24} {diverse_tokens:>8.0f} {diverse_sentences:>10.1f}")
+    saved = 1 - np.mean(equal_coverage) / plain_tokens
+    print(
+        f"mmr at equal coverage    {np.mean(equal_coverage):>8.0f}"
+        f"   ({saved:.1%} fewer prompt tokens, lambda {args.mmr_lambda})"
+    )
+
+
+if __name__ == "__main__":
+    main()
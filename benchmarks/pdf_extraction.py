@@ -0,0 +1,79 @@
+"""
+Time to parse a large PDF with its pages extracted by one or several processes.
+
+Writes a scaled-up textbook made of --copies copies of the pages of
+tests/file_parser/test_files/test_textbook.pdf, then parses it with each
+--workers count and reports the wall time, the pages extracted per second, and
+whether the segments match those of the single-process parse.
+
+Extraction is CPU-bound, so the speedup is bounded by the cores available.
+
+Needs no database.
+
+Usage (assuming running from project root, with the DB_* variables set):
+  uv run benchmarks/pdf_extraction.py [--copies 20] [--workers 1 2 4 8]
+"""
+
+import argparse
+import os
+from pathlib import Path
+import tempfile
+import time
+
+from pypdf import PdfReader, PdfWriter
+
+from ucr_chatbot.api.file_parsing.file_parsing import ParsedSegment, _iter_pdf, segment_chunker
+
+TEXTBOOK = Path(__file__).parent.parent / "tests" / "file_parser" / "test_files" / "test_textbook.pdf"
+
+
+def scaled_textbook(copies: int, path: Path) -> int:
+    """Writes copies of the textbook's pages to path and returns the page count."""
+    reader = PdfReader(TEXTBOOK)
+    writer = PdfWriter()
+    for _ in range(copies):
+        for page in reader.pages:
+            writer.add_page(page)
+    with path.open("wb") as f:
+        writer.write(f)
+    return len(reader.pages) * copies
+
+
+def parse(path: Path, workers: int) -> list[ParsedSegment]:
+    """Parses the PDF with its pages extracted by workers processes."""
+    with path.open("rb") as f:
+        return list(
+            _iter_pdf(
+                f,  # type: ignore
+                segment_chunker(),
+                workers=workers,
+                min_pages=0,
+            )
+        )
+
+
+def main():
+    """Runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--copies", type=int, default=20)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "textbook.pdf"
+        pages = scaled_textbook(args.copies, path)
+        print(f"{pages} pages, {path.stat().st_size / 2**20:.1f} MiB, {os.cpu_count()} CPUs")
+
+        baseline: list[ParsedSegment] | None = None
+        print(f"{'workers':>8} {'seconds':>8} {'pages/s':>8} {'same':>5}")
+        for workers in args.workers:
+            start = time.perf_counter()
+            segments = parse(path, workers)
+            elapsed = time.perf_counter() - start
+            if baseline is None:
+                baseline = segments
+            print(f"{workers:>8} {elapsed:>8.2f} {pages / elapsed:>8.1f} {str(segments == baseline):>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Recall, latency, and index size of the compact vector storage modes.
+
+For each of float32, halfvec, and binary storage, builds the HNSW index the
+way `cli.py build-index --storage ...` does, runs the retriever's two-stage
+search over a synthetic corpus of clustered unit vectors, and reports
+recall@k against an exact float32 sequential scan, query latency, and the
+on-disk size of the index.
+
+With --offline no database is needed: the two stages are simulated exactly
+with numpy, which isolates the recall lost to quantization from the recall
+lost to the approximate index.
+
+Needs a running Postgres with pgvector 0.7 or later unless --offline is passed.
+
+Usage (assuming running from project root, with the DB_* variables set):
+  uv run benchmarks/quantized_storage.py [--segments 100000] [--queries 200] [--k 10] [--factor 4]
+  uv run benchmarks/quantized_storage.py --offline
+"""
+
+import argparse
+import time
+
+import numpy as np
+from sqlalchemy import delete, select, text
+
+from ucr_chatbot.api.context_retrieval.retriever import Retriever
+from ucr_chatbot.config import Config, VectorStorage
+from ucr_chatbot.db.models import (
+    Courses,
+    Documents,
+    Embeddings,
+    Segments,
+    Session,
+    base,
+    engine,
+    vector_index_name,
+)
+from vector_index import DOCUMENT_PATH, load_corpus, report, synthetic_vectors
+
+BYTES_PER_DIMENSION = {
+    VectorStorage.FLOAT32: 4.0,
+    VectorStorage.HALFVEC: 2.0,
+    VectorStorage.BINARY: 1 / 8,
+}
+
+
+def recall(results: list[list[int]], exact: list[list[int]]) -> float:
+    """Computes the mean fraction of the exact top-k that each result contains."""
+    return float(np.mean([len(set(r) & set(e)) / len(e) for r, e in zip(results, exact)]))
+
+
+def simulate(
+    corpus: np.ndarray, queries: np.ndarray, k: int, factor: int, storage: VectorStorage
+) -> list[list[int]]:
+    """Runs the two-stage search with an exact scan in place of the index."""
+    results: list[list[int]] = []
+    if storage == VectorStorage.HALFVEC:
+        compact = corpus.astype(np.float16).astype(np.float32)
+    elif storage == VectorStorage.BINARY:
+        compact = corpus > 0
+    else:
+        compact = corpus
+    for query in queries:
+        if storage == VectorStorage.BINARY:
+            distances = np.count_nonzero(compact != (query > 0), axis=1)
+        else:
+            q = query.astype(np.float16).astype(np.float32) if storage == VectorStorage.HALFVEC else query
+            distances = np.linalg.norm(compact - q, axis=1)
+        if storage == VectorStorage.FLOAT32:
+            results.append(np.argsort(distances)[:k].tolist())
+            continue
+        candidates = np.argsort(distances, kind="stable")[: k * factor]
+        exact = np.linalg.norm(corpus[candidates] - query, axis=1)
+        results.append(candidates[np.argsort(exact)[:k]].tolist())
+    return results
+
+
+def run_offline(args: argparse.Namespace):
+    """Reports the recall of each storage mode without a database."""
+    dimensions = Config.EMBEDDING_DIMENSIONS
+    corpus = synthetic_vectors(args.segments, dimensions, seed=0)
+    queries = synthetic_vectors(args.queries, dimensions, seed=1)
+    exact = simulate(corpus, queries, args.k, args.factor, VectorStorage.FLOAT32)
+    print(f"{'storage':<10} {'bytes/vector':>13} {f'recall@{args.k}':>10}")
+    for storage in VectorStorage:
+        results = simulate(corpus, queries, args.k, args.factor, storage)
+        size = BYTES_PER_DIMENSION[storage] * dimensions
+        print(f"{storage.name.lower():<10} {size:>13.0f} {recall(results, exact):>10.3f}")
+
+
+def run_queries(
+    retriever: Retriever, course_id: int, queries: np.ndarray, k: int, ef_search: int | None
+) -> tuple[list[float], list[list[int]]]:
+    """Runs each query as the retriever does and returns latencies in ms and result ids.
+    Without ef_search the index is not used."""
+    latencies: list[float] = []
+    results: list[list[int]] = []
+    with Session(engine) as session:
+        if ef_search is None:
+            session.execute(text("SET enable_indexscan = off"))
+        else:
+            session.execute(text(f"SET hnsw.ef_search = {int(ef_search)}"))
+        for query in queries:
+            start = time.perf_counter()
+            segments = session.scalars(
+                retriever.search_query(query.tolist(), course_id, Config.EMBEDDING_MODEL, k)
+            ).all()
+            latencies.append((time.perf_counter() - start) * 1000)
+            results.append([int(segment.id) for segment in segments])  # type: ignore
+    return latencies, results
+
+
+def index_size(name: str) -> int:
+    """Gets the on-disk size of an index in bytes."""
+    with engine.connect() as connection:
+        return int(
+            connection.execute(text(f"SELECT pg_relation_size('{name}')")).scalar_one()
+        )
+
+
+def main():
+    """Runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--segments", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--factor", type=int, default=Config.RERANK_CANDIDATE_FACTOR)
+    parser.add_argument("--offline", action="store_true")
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    if args.offline:
+        run_offline(args)
+        return
+
+    from ucr_chatbot.db.cli import build_index, migrate_embeddings
+
+    base.metadata.create_all(engine)
+    migrate_embeddings()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        for storage in VectorStorage:
+            name = vector_index_name(Config.EMBEDDING_MODEL, storage)
+            connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+    with Session(engine) as session:
+        course = Courses(name="quantized-storage-benchmark")
+        session.add(course)
+        session.commit()
+        course_id = int(course.id)  # type: ignore
+
+    dimensions = Config.EMBEDDING_DIMENSIONS
+    load_corpus(course_id, synthetic_vectors(args.segments, dimensions, seed=0))
+    queries = synthetic_vectors(args.queries, dimensions, seed=1)
+
+    exact_retriever = Retriever(storage=VectorStorage.FLOAT32)
+    latencies, exact = run_queries(exact_retriever, course_id, queries, args.k, None)
+    report("seq scan", latencies)
+
+    for storage in VectorStorage:
+        name = vector_index_name(Config.EMBEDDING_MODEL, storage)
+        build_index(Config.HNSW_M, Config.HNSW_EF_CONSTRUCTION, storage=storage)
+        with engine.connect() as connection:
+            connection.execute(text('ANALYZE "Embeddings"'))
+        retriever = Retriever(storage=storage, candidate_factor=args.factor)
+        ef_search = max(40, args.k * args.factor)
+        latencies, results = run_queries(retriever, course_id, queries, args.k, ef_search)
+        report(storage.name.lower(), latencies)
+        print(
+            f"{'':<12} recall@{args.k} {recall(results, exact):.3f}"
+            f"   index {index_size(name) / 2**20:.1f} MiB"
+        )
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+    if not args.keep:
+        with Session(engine) as session:
+            segment_ids = select(Segments.id).where(Segments.document_id == DOCUMENT_PATH)
+            session.execute(delete(Embeddings).where(Embeddings.segment_id.in_(segment_ids)))
+            session.execute(delete(Segments).where(Segments.document_id == DOCUMENT_PATH))
+            session.execute(delete(Documents).where(Documents.file_path == DOCUMENT_PATH))
+            session.execute(delete(Courses).where(Courses.id == course_id))
+            session.commit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Time and memory to parse a large text file with the streaming reader.
+
+Writes a --megabytes MB UTF-8 text file of prose with accented words, then parses
+it with the streaming .txt parser and reports the wall time, the time until the
+first segment, and the peak memory that Python allocated while parsing, traced
+separately so that tracing does not slow the timed run.
+
+The legacy parser, which decoded the repr of the file's bytes and built segments
+one character at a time, is run on the first --legacy-megabytes MB for
+comparison. It reads the whole file at once, and it strips every space.
+
+Needs no database.
+
+Usage (assuming running from project root, with the DB_* variables set):
+  uv run benchmarks/txt_parsing.py [--megabytes 100] [--legacy-megabytes 5]
+"""
+
+import argparse
+from pathlib import Path
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from ucr_chatbot.api.file_parsing.file_parsing import iter_document
+
+
+def write_text(path: Path, size: int):
+    """Writes about size bytes of sentences of random words, some of them accented."""
+    rng = np.random.default_rng(0)
+    letters = list("etaoinshrdlu") + ["é", "ü", "ñ"]
+    words = ["".join(rng.choice(letters, n)) for n in rng.integers(2, 10, 2000)]
+    written = 0
+    with path.open("w", encoding="utf-8") as f:
+        while written < size:
+            paragraph = " ".join(
+                " ".join(rng.choice(words, int(rng.integers(5, 31)))).capitalize() + "."
+                for _ in range(int(rng.integers(3, 8)))
+            )
+            f.write(paragraph + "\n\n")
+            written += len(paragraph.encode()) + 2
+
+
+def legacy_parse_txt(path: Path, size: int, lenseg: int = 1000) -> list[str]:
+    """Parses the first size bytes of a text file the way _parse_txt used to."""
+    with path.open("rb") as f:
+        tempstr = str(f.read(size))
+    segments: list[str] = []
+    count = 0
+    bigline = ""
+    new = tempstr.replace("\\n", "\n")[2:-1]
+    for line in new:
+        count = count + len(line)
+        bigline = bigline + line.strip() + ""
+        if count > lenseg or bigline.endswith("."):
+            segments.append(bigline)
+            count = 0
+            bigline = ""
+    if len(bigline) > 0:
+        segments.append(bigline)
+    return segments
+
+
+def main():
+    """Runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--megabytes", type=int, default=100)
+    parser.add_argument("--legacy-megabytes", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "notes.txt"
+        write_text(path, args.megabytes * 10**6)
+        size = path.stat().st_size
+        print(f"{size / 10**6:.0f} MB text file")
+
+        start = time.perf_counter()
+        segments = iter_document(str(path))
+        next(segments)
+        first = time.perf_counter() - start
+        count = 1 + sum(1 for _ in segments)
+        elapsed = time.perf_counter() - start
+        print(
+            f"streaming: {count} segments in {elapsed:.1f}s ({size / 10**6 / elapsed:.1f} MB/s), "
+            f"first after {first * 1000:.1f}ms"
+        )
+
+        tracemalloc.start()
+        for _ in iter_document(str(path)):
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"streaming: peak {peak / 2**20:.1f} MiB allocated")
+
+        legacy_size = args.legacy_megabytes * 10**6
+        start = time.perf_counter()
+        legacy = legacy_parse_txt(path, legacy_size)
+        elapsed = time.perf_counter() - start
+        print(
+            f"legacy:    {len(legacy)} segments of the first {args.legacy_megabytes} MB "
+            f"in {elapsed:.1f}s ({args.legacy_megabytes / elapsed:.1f} MB/s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
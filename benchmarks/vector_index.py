@@ -0,0 +1,159 @@
+"""
+Before/after latency benchmark for the HNSW index on Embeddings.vector.
+
+Loads a synthetic corpus of clustered unit vectors into a throwaway course,
+measures top-k query latency with a sequential scan, builds the HNSW index
+with the same code path as `cli.py build-index`, and measures again. Also
+reports the recall of the approximate results against the exact ones.
+
+Needs a running Postgres with pgvector. The benchmark rows are deleted at the end
+unless --keep is passed.
+
+Usage (assuming running from project root):
+  uv run benchmarks/vector_index.py [--segments 100000] [--queries 200] [--k 10]
+"""
+
+import argparse
+import time
+
+import numpy as np
+from sqlalchemy import delete, insert, select, text
+
+from ucr_chatbot.config import Config
+from ucr_chatbot.db.models import (
+    Courses,
+    Documents,
+    Embeddings,
+    Segments,
+    Session,
+    base,
+    engine,
+    vector_distance,
+    vector_index_name,
+)
+
+DOCUMENT_PATH = "benchmark/vector_index.txt"
+
+
+def synthetic_vectors(count: int, dimensions: int, seed: int) -> np.ndarray:
+    """Generates unit vectors grouped around a few hundred topic centres."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(256, dimensions))
+    vectors = centres[rng.integers(0, len(centres), count)] + 0.35 * rng.normal(
+        size=(count, dimensions)
+    )
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def load_corpus(
+    course_id: int, vectors: np.ndarray, chunk: int = 5000, document_path: str = DOCUMENT_PATH
+) -> list[int]:
+    """Inserts one segment and one embedding per vector and returns the segment ids."""
+    all_ids: list[int] = []
+    with Session(engine) as session:
+        session.add(Documents(file_path=document_path, course_id=course_id))
+        session.commit()
+        for start in range(0, len(vectors), chunk):
+            block = vectors[start : start + chunk]
+            segment_ids = session.scalars(
+                insert(Segments).returning(Segments.id, sort_by_parameter_order=True),
+                [{"text": f"segment {start + i}", "document_id": document_path} for i in range(len(block))],
+            ).all()
+            session.execute(
+                insert(Embeddings),
+                [
+                    {"vector": vector, "segment_id": segment_id, "course_id": course_id}
+                    for vector, segment_id in zip(block, segment_ids)
+                ],
+            )
+            session.commit()
+            all_ids.extend(segment_ids)
+    return all_ids
+
+
+def run_queries(queries: np.ndarray, k: int, exact: bool) -> tuple[list[float], list[list[int]]]:
+    """Runs each query as the retriever does and returns latencies in ms and result ids."""
+    latencies: list[float] = []
+    results: list[list[int]] = []
+    with Session(engine) as session:
+        if exact:
+            session.execute(text("SET enable_indexscan = off"))
+        for query in queries:
+            start = time.perf_counter()
+            ids = session.scalars(
+                select(Embeddings.segment_id)
+                .where(Embeddings.model == Config.EMBEDDING_MODEL)
+                .order_by(vector_distance(query))
+                .limit(k)
+            ).all()
+            latencies.append((time.perf_counter() - start) * 1000)
+            results.append([int(i) for i in ids])
+    return latencies, results
+
+
+def report(label: str, latencies: list[float]):
+    """Prints latency percentiles."""
+    print(
+        f"{label:<12} p50 {np.percentile(latencies, 50):8.2f} ms"
+        f"   p95 {np.percentile(latencies, 95):8.2f} ms"
+    )
+
+
+def main():
+    """Runs the benchmark."""
+    from ucr_chatbot.db.cli import build_index, migrate_embeddings
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--segments", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    base.metadata.create_all(engine)
+    migrate_embeddings()
+    index_name = vector_index_name(Config.EMBEDDING_MODEL)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+
+    with Session(engine) as session:
+        course = Courses(name="vector-index-benchmark")
+        session.add(course)
+        session.commit()
+        course_id = int(course.id)  # type: ignore
+
+    dimensions = Config.EMBEDDING_DIMENSIONS
+    start = time.perf_counter()
+    load_corpus(course_id, synthetic_vectors(args.segments, dimensions, seed=0))
+    print(f"loaded {args.segments} segments in {time.perf_counter() - start:.1f}s")
+
+    queries = synthetic_vectors(args.queries, dimensions, seed=1)
+    exact_latencies, exact_results = run_queries(queries, args.k, exact=True)
+    report("seq scan", exact_latencies)
+
+    start = time.perf_counter()
+    build_index(Config.HNSW_M, Config.HNSW_EF_CONSTRUCTION)
+    print(f"built index in {time.perf_counter() - start:.1f}s")
+
+    with engine.connect() as connection:
+        connection.execute(text('ANALYZE "Embeddings"'))
+    index_latencies, index_results = run_queries(queries, args.k, exact=False)
+    report("hnsw", index_latencies)
+
+    recall = np.mean(
+        [len(set(a) & set(e)) / len(e) for a, e in zip(index_results, exact_results)]
+    )
+    print(f"recall@{args.k} of hnsw against exact: {recall:.3f}")
+
+    if not args.keep:
+        with Session(engine) as session:
+            segment_ids = select(Segments.id).where(Segments.document_id == DOCUMENT_PATH)
+            session.execute(delete(Embeddings).where(Embeddings.segment_id.in_(segment_ids)))
+            session.execute(delete(Segments).where(Segments.document_id == DOCUMENT_PATH))
+            session.execute(delete(Documents).where(Documents.file_path == DOCUMENT_PATH))
+            session.execute(delete(Courses).where(Courses.id == course_id))
+            session.commit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import numpy as np
+
+from ucr_chatbot.api.context_retrieval import mmap_index
+from ucr_chatbot.api.context_retrieval.mmap_index import MmapVectorIndex
+
+
+def test_search_matches_exact_scan(tmp_path, monkeypatch):
+    """Tests that a built index returns the exact nearest segments, and that appended ones are found."""
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(500, 8)).astype(np.float32)
+    stored = {"vectors": vectors[:400], "ids": list(range(1000, 1400))}
+    monkeypatch.setattr(
+        mmap_index,
+        "iter_course_embeddings",
+        lambda course_id, model: iter([(stored["ids"], stored["vectors"].tolist())]),
+    )
+
+    index = MmapVectorIndex(tmp_path, "float32", block_rows=64)
+    query = rng.normal(size=8)
+    results = index.search(3, "test-model", query.tolist(), 5)
+    exact = np.argsort(np.linalg.norm(vectors[:400] - query, axis=1))[:5]
+    assert [segment_id for segment_id, _ in results] == [1000 + i for i in exact]
+    assert np.isclose(results[0][1], np.linalg.norm(vectors[exact[0]] - query), atol=1e-4)
+
+    index.append(3, "test-model", list(range(1400, 1500)), vectors[400:].tolist())
+    index.append(3, "test-model", [1400], vectors[400:401].tolist())
+    assert index.path(3, "test-model", 8).stat().st_size == 500 * mmap_index.record_dtype(8, "float32").itemsize
+    results = index.search(3, "test-model", vectors[450].tolist(), 1)
+    assert results[0][0] == 1450
+
+    stored["ids"], stored["vectors"] = [], np.empty((0, 8))
+    monkeypatch.setattr(mmap_index, "iter_course_embeddings", lambda course_id, model: iter([]))
+    index.build(3, "test-model")
+    assert not index.path(3, "test-model", 8).exists()
+
+
+def test_float16_index(tmp_path, monkeypatch):
+    """Tests that a float16 index halves the vector storage and still ranks the nearest segment first."""
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(200, 16))
+    monkeypatch.setattr(
+        mmap_index,
+        "iter_course_embeddings",
+        lambda course_id, model: iter([(list(range(200)), vectors.tolist())]),
+    )
+    index = MmapVectorIndex(tmp_path, "float16")
+    assert index.search(1, "test-model", vectors[17].tolist(), 3)[0][0] == 17
+    assert mmap_index.record_dtype(16, "float16").itemsize < mmap_index.record_dtype(16, "float32").itemsize
+
+
+def test_empty_course_is_built_once(tmp_path, monkeypatch):
+    """Tests that searching a course without vectors builds its file only once."""
+    builds: list[int] = []
+
+    def fake_iter(course_id, model):
+        builds.append(course_id)
+        return iter([])
+
+    monkeypatch.setattr(mmap_index, "iter_course_embeddings", fake_iter)
+    index = MmapVectorIndex(tmp_path, "float32")
+    assert index.search(2, "test-model", [1.0, 0.0], 3) == []
+    assert index.search(2, "test-model", [1.0, 0.0], 3) == []
+    assert builds == [2]
+
+    index.append(2, "test-model", [5], [[1.0, 0.0]])
+    assert index.search(2, "test-model", [1.0, 0.0], 3) == [(5, 0.0)]
+
+
+def test_rebuild_stale(tmp_path, monkeypatch):
+    """Tests that a file marked stale keeps serving searches until a worker rebuilds it."""
+    stored = {"ids": [1, 2], "vectors": [[1.0, 0.0], [0.0, 1.0]]}
+    monkeypatch.setattr(
+        mmap_index,
+        "iter_course_embeddings",
+        lambda course_id, model: iter([(stored["ids"], stored["vectors"])]),
+    )
+    index = MmapVectorIndex(tmp_path, "float32")
+    assert index.search(4, "test-model", [0.0, 1.0], 1)[0][0] == 2
+
+    stored["ids"], stored["vectors"] = [1], [[1.0, 0.0]]
+    index.mark_stale(4, "test-model")
+    assert index.search(4, "test-model", [0.0, 1.0], 1)[0][0] == 2
+
+    assert index.rebuild_stale() == 1
+    assert index.search(4, "test-model", [0.0, 1.0], 1)[0][0] == 1
+    assert index.rebuild_stale() == 0
@@ -0,0 +1,82 @@
+from ucr_chatbot.api.context_retrieval.query_cache import QueryEmbeddingCache
+
+
+class FakeClock:
+    """A clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def counting_embed(calls):
+    def embed(prompt, model):
+        calls.append(prompt)
+        return [float(len(prompt))]
+    return embed
+
+
+def test_repeated_prompts_are_cached():
+    """Tests that normalized duplicates of a prompt are embedded once."""
+    calls = []
+    cache = QueryEmbeddingCache(max_size=10, ttl=60, embed=counting_embed(calls))
+
+    assert cache.get("What is a linked list?") == [22.0]
+    assert cache.get("  What is a   linked list?\n") == [22.0]
+
+    assert calls == ["What is a linked list?"]
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.size) == (1, 1, 1)
+    assert stats.hit_rate == 0.5
+
+
+def test_least_recently_used_entry_is_evicted():
+    """Tests that the cache drops the least recently used prompt when full."""
+    calls = []
+    cache = QueryEmbeddingCache(max_size=2, ttl=60, embed=counting_embed(calls))
+
+    cache.get("a")
+    cache.get("b")
+    cache.get("a")
+    cache.get("c")
+    cache.get("a")
+    cache.get("b")
+
+    assert calls == ["a", "b", "c", "b"]
+    assert cache.stats().evictions == 2
+
+
+def test_entries_expire():
+    """Tests that entries older than the ttl are embedded again."""
+    calls = []
+    clock = FakeClock()
+    cache = QueryEmbeddingCache(max_size=10, ttl=5, embed=counting_embed(calls), clock=clock)
+
+    cache.get("a")
+    clock.now = 4
+    cache.get("a")
+    clock.now = 6
+    cache.get("a")
+
+    assert calls == ["a", "a"]
+
+
+def test_zero_size_disables_caching():
+    """Tests that a cache of size zero always embeds."""
+    calls = []
+    cache = QueryEmbeddingCache(max_size=0, ttl=60, embed=counting_embed(calls))
+    cache.get("a")
+    cache.get("a")
+    assert calls == ["a", "a"]
+
+
+def test_models_do_not_share_entries():
+    """Tests that the same prompt is embedded separately for each model."""
+    calls = []
+    cache = QueryEmbeddingCache(max_size=10, ttl=60, embed=counting_embed(calls))
+    cache.get("a", "model-one")
+    cache.get("a", "model-two")
+    cache.get("a", "model-one")
+    assert calls == ["a", "a"]
@@ -0,0 +1,143 @@
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from ucr_chatbot.api.context_retrieval.retriever import (
+    Retriever,
+    above_cutoff,
+    cosine_similarities,
+    maximal_marginal_relevance,
+    reciprocal_rank_fusion,
+)
+from ucr_chatbot.config import VectorStorage
+from ucr_chatbot.db.models import Segments
+
+
+def compile_search(storage: VectorStorage) -> str:
+    """Compiles the search query of a Retriever using the given storage."""
+    retriever = Retriever(storage=storage, candidate_factor=5)
+    query = retriever.search_query([0.5, -0.25, 0.0], 1, "test-model", 3)
+    return str(query.compile(dialect=postgresql.dialect()))
+
+
+def test_float32_search_orders_by_exact_distance():
+    """Tests that full-precision storage searches the index once, without a re-ranking stage."""
+    sql = compile_search(VectorStorage.FLOAT32)
+    assert 'CAST("Embeddings".vector AS VECTOR(3)) <->' in sql
+    assert sql.count("LIMIT") == 1
+
+
+def test_search_filters_on_embedding_columns():
+    """Tests that the course and active filters read Embeddings, without joining Documents."""
+    sql = compile_search(VectorStorage.FLOAT32)
+    assert '"Embeddings".course_id =' in sql
+    assert '"Embeddings".is_active' in sql
+    assert '"Documents"' not in sql
+
+
+def test_halfvec_search_reranks_candidates():
+    """Tests that halfvec storage fetches candidates by halfvec distance and re-ranks them exactly."""
+    sql = compile_search(VectorStorage.HALFVEC)
+    assert 'CAST("Embeddings".vector AS HALFVEC(3)) <->' in sql
+    assert "anon_1.vector <->" in sql
+    assert sql.count("LIMIT") == 2
+
+
+def test_binary_search_reranks_candidates():
+    """Tests that binary storage fetches candidates by Hamming distance and re-ranks them exactly."""
+    retriever = Retriever(storage=VectorStorage.BINARY, candidate_factor=5)
+    compiled = retriever.search_query([0.5, -0.25, 0.0], 1, "test-model", 3).compile(
+        dialect=postgresql.dialect()
+    )
+    assert 'CAST(binary_quantize("Embeddings".vector) AS BIT(3)) <~>' in str(compiled)
+    assert "anon_1.vector <->" in str(compiled)
+    assert "100" in compiled.params.values()
+    assert 15 in compiled.params.values()
+
+
+def test_lexical_search_drops_stop_words():
+    """Tests that full-text search ORs the prompt's words but its stop words, and ranks
+    matches with ts_rank_cd."""
+    compiled = (
+        Retriever()
+        .lexical_query("What does the linker do? And NOT the loader?", 1, "test-model", 3)
+        .compile(dialect=postgresql.dialect())
+    )
+    assert '"Segments".search_vector @@ to_tsquery(' in str(compiled)
+    assert "ts_rank_cd" in str(compiled)
+    assert "linker | loader" in compiled.params.values()
+    assert Retriever().lexical_query("?!", 1, "test-model", 3) is None
+    assert Retriever().lexical_query("What is it?", 1, "test-model", 3) is None
+
+
+def test_lexical_search_requires_identifiers():
+    """Tests that segments must contain every identifier of the prompt to match."""
+    compiled = (
+        Retriever()
+        .lexical_query("Why does my_func return EINVAL from getValue?", 1, "test-model", 3)
+        .compile(dialect=postgresql.dialect())
+    )
+    assert "my_func & einval & getvalue" in compiled.params.values()
+    assert "my_func | return | einval | getvalue" in compiled.params.values()
+
+
+def test_reciprocal_rank_fusion():
+    """Tests that items ranked well by both searches come first and weights shift the order."""
+    vector = [1, 2, 3]
+    lexical = [4, 3, 1]
+    assert reciprocal_rank_fusion([vector, lexical], [1.0, 1.0], k=60) == [1, 3, 4, 2]
+    assert reciprocal_rank_fusion([vector, lexical], [0.0, 1.0], k=60)[:3] == [4, 3, 1]
+
+
+def test_maximal_marginal_relevance_skips_near_duplicates():
+    """Tests that a near-duplicate of the best candidate is passed over unless lambda is 1."""
+    query = [1.0, 0.0]
+    candidates = [[1.0, 0.1], [1.0, 0.12], [0.7, -0.7]]
+    assert maximal_marginal_relevance(query, candidates, 2, 0.5) == [0, 2]
+    assert maximal_marginal_relevance(query, candidates, 2, 1.0) == [0, 1]
+    assert maximal_marginal_relevance(query, candidates, 5, 0.5) == [0, 2, 1]
+    assert maximal_marginal_relevance(query, [], 3, 0.5) == []
+
+
+def test_search_selects_candidate_vectors():
+    """Tests that every search returns each segment's vector for the re-ranking stage."""
+    for storage in VectorStorage:
+        query = Retriever(storage=storage).search_query([0.5, -0.25, 0.0], 1, "test-model", 3)
+        columns = list(query.selected_columns)
+        assert len(columns) == len(Segments.__table__.columns) + 1
+        assert columns[-1].name == "vector"
+    query = Retriever().lexical_query("hello", 1, "test-model", 3)
+    assert query is not None and list(query.selected_columns)[-1].name == "vector"
+
+
+def test_similarity_cutoff():
+    """Tests that segments are dropped below the absolute floor or too far below the best one."""
+    similarities = cosine_similarities([1.0, 0.0], [[2.0, 0.0], [1.0, 1.0], [0.0, 3.0], [-1.0, 0.0]])
+    assert similarities == pytest.approx([1.0, 2**-0.5, 0.0, -1.0])
+    assert above_cutoff(similarities, -1.0, 2.0) == [0, 1, 2, 3]
+    assert above_cutoff(similarities, 0.5, 2.0) == [0, 1]
+    assert above_cutoff(similarities, -1.0, 0.2) == [0]
+    assert above_cutoff([0.3, 0.2], 0.5, 2.0) == []
+
+
+def test_expand_neighbours_merges_adjacent_hits():
+    """Tests that hits are widened to their neighbours in one query and that hits whose
+    ranges touch are merged, keeping the best hit's id and rank."""
+    document = [Segments(id=10 + i, text=f"s{i}", document_id="a.pdf", ordinal=i, page=1 + i // 4) for i in range(12)]
+    other = Segments(id=50, text="other", document_id="b.pdf", ordinal=0, page=None)
+    unnumbered = Segments(id=60, text="unnumbered", document_id="c.pdf", ordinal=None, page=None)
+    queries: list[str] = []
+
+    class StubSession:
+        def scalars(self, query):
+            queries.append(str(query.compile(dialect=postgresql.dialect())))
+            return [segment for segment in document if 1 <= segment.ordinal <= 8] + [other]
+
+    hits = [document[5], other, document[2], unnumbered, document[7]]
+    expanded = Retriever(neighbours=1)._expand_neighbours(StubSession(), hits, {15: 0.9, 12: 0.5})
+
+    assert len(queries) == 1 and queries[0].count("BETWEEN") == 2
+    assert [(s.id, s.similarity) for s in expanded] == [(15, 0.9), (50, None), (60, None)]
+    assert expanded[0].text == "\n".join(f"s{i}" for i in range(1, 9))
+    assert expanded[0].page == 1
+    assert expanded[1].text == "other"
+    assert expanded[2].text == "unnumbered"
@@ -0,0 +1,70 @@
+from ucr_chatbot.api.embedding import cache
+from ucr_chatbot.api.embedding.cache import embed_texts_cached, normalize_text, text_hash
+from ucr_chatbot.api.embedding.embedding import embed_texts
+from ucr_chatbot.config import Config, hashing_model_name
+
+
+def test_normalize_text():
+    """Tests that whitespace differences do not change the cache key."""
+    assert normalize_text("  Linked\n lists\tare  lists. ") == "Linked lists are lists."
+    assert text_hash("a  b") == text_hash("a\nb")
+    assert text_hash("a b") != text_hash("a c")
+
+
+def test_embed_texts_cached_only_embeds_misses(monkeypatch):
+    """Tests that cached texts skip the embedding function and duplicates are embedded once."""
+    stored = {text_hash("cached"): [1.0]}
+    embedded_batches = []
+
+    def fake_get(model, hashes):
+        return {h: stored[h] for h in hashes if h in stored}
+
+    def fake_store(model, embeddings):
+        stored.update(embeddings)
+
+    def fake_embed(texts):
+        embedded_batches.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    monkeypatch.setattr(cache, "get_cached_embeddings", fake_get)
+    monkeypatch.setattr(cache, "store_cached_embeddings", fake_store)
+    monkeypatch.setattr(cache, "evict_embedding_cache", lambda max_rows: 0)
+
+    before = cache.cache_stats()
+    result = embed_texts_cached(["cached", "new", "new ", "cached"], embed=fake_embed)
+    after = cache.cache_stats()
+
+    assert result == [[1.0], [3.0], [3.0], [1.0]]
+    assert embedded_batches == [["new"]]
+    assert after.hits - before.hits == 2
+    assert after.misses - before.misses == 2
+
+    embedded_batches.clear()
+    assert embed_texts_cached(["new"], embed=fake_embed) == [[3.0]]
+    assert embedded_batches == []
+
+
+def test_hashed_embeddings_are_not_cached_for_ollama_models(monkeypatch):
+    """Tests that a vector from the hashing backend is cached under its own model name,
+    so that a lookup for an Ollama model misses it."""
+    stored: dict[tuple[str, str], list[float]] = {}
+
+    def fake_get(model, hashes):
+        return {h: stored[(model, h)] for h in hashes if (model, h) in stored}
+
+    def fake_store(model, embeddings):
+        stored.update({(model, h): vector for h, vector in embeddings.items()})
+
+    monkeypatch.setattr(cache, "get_cached_embeddings", fake_get)
+    monkeypatch.setattr(cache, "store_cached_embeddings", fake_store)
+    monkeypatch.setattr(cache, "evict_embedding_cache", lambda max_rows: 0)
+    monkeypatch.setattr("ucr_chatbot.api.embedding.embedding.client", None)
+
+    embed_texts_cached(["linked lists"], embed=embed_texts)
+    assert list(stored) == [(hashing_model_name(Config.EMBEDDING_DIMENSIONS), text_hash("linked lists"))]
+
+    ollama_vector = [0.25] * Config.EMBEDDING_DIMENSIONS
+    result = embed_texts_cached(
+        ["linked lists"], embed=lambda texts: [ollama_vector for _ in texts], model="nomic-embed-text"
+    )
+    assert result == [ollama_vector]
@@ -1,6 +1,9 @@
 import pytest
 from unittest.mock import MagicMock
-from ucr_chatbot.api.embedding.embedding import embed_text
+from ollama import ResponseError
+from ucr_chatbot.api.embedding.embedding import embed_text, embed_texts
+from ucr_chatbot.api.embedding.hashing import hashing_embed
+from ucr_chatbot.config import Config, hashing_model_name
 
 def test_embed_text_success(monkeypatch):
     """
@@ -9,9 +12,9 @@ def test_embed_text_success(monkeypatch):
     # 1. Create a fake Ollama client object
     mock_ollama_client = MagicMock()
 
-    # 2. Configure the fake client's 'embeddings' method to return a predictable dictionary
+    # 2. Configure the fake client's 'embed' method to return a predictable dictionary
     fake_embedding = [0.1, -0.2, 0.3, 0.4]
-    mock_ollama_client.embeddings.return_value = {"embedding": fake_embedding}
+    mock_ollama_client.embed.return_value = {"embeddings": [fake_embedding]}
 
     # 3. Use monkeypatch to replace the real 'client' in your embedding module with our fake one
     monkeypatch.setattr("ucr_chatbot.api.embedding.embedding.client", mock_ollama_client)
@@ -25,12 +28,108 @@ def test_embed_text_success(monkeypatch):
     assert all(isinstance(x, float) for x in result)
 
     # 6. Assert that the underlying client method was called correctly
-    mock_ollama_client.embeddings.assert_called_once_with(
-        model="nomic-embed-text",
-        prompt="This input text doesn't matter because the client is mocked"
+    mock_ollama_client.embed.assert_called_once_with(
+        model=Config.EMBEDDING_MODEL,
+        input=["This input text doesn't matter because the client is mocked"]
     )
 
 
+def fake_embed(model, input):
+    """Embeds each text as a one-element vector holding its length."""
+    return {"embeddings": [[float(len(text))] for text in input]}
+
+
+def test_embed_texts_batches_in_order(monkeypatch):
+    """Tests that embed_texts sends fixed-size batches and keeps the input order."""
+    mock_ollama_client = MagicMock()
+    mock_ollama_client.embed.side_effect = fake_embed
+    monkeypatch.setattr("ucr_chatbot.api.embedding.embedding.client", mock_ollama_client)
+
+    texts = ["a" * i for i in range(1, 8)]
+    result = embed_texts(texts, batch_size=3)
+
+    assert result == [[float(i)] for i in range(1, 8)]
+    batch_sizes = [len(call.kwargs["input"]) for call in mock_ollama_client.embed.call_args_list]
+    assert batch_sizes == [3, 3, 1]
+
+
+def test_embed_texts_respects_character_budget(monkeypatch):
+    """Tests that a batch is closed before it exceeds the character budget."""
+    mock_ollama_client = MagicMock()
+    mock_ollama_client.embed.side_effect = fake_embed
+    monkeypatch.setattr("ucr_chatbot.api.embedding.embedding.client", mock_ollama_client)
+
+    embed_texts(["aaaa", "bbbb", "cccc"], batch_size=10, max_batch_chars=8)
+
+    batch_sizes = [len(call.kwargs["input"]) for call in mock_ollama_client.embed.call_args_list]
+    assert batch_sizes == [2, 1]
+
+
+def test_embed_texts_splits_rejected_batches(monkeypatch):
+    """Tests that a batch rejected by Ollama is split in half and retried."""
+    def embed_small_batches(model, input):
+        if len(input) > 2:
+            raise ResponseError("input too large", 400)
+        return fake_embed(model, input)
+
+    mock_ollama_client = MagicMock()
+    mock_ollama_client.embed.side_effect = embed_small_batches
+    monkeypatch.setattr("ucr_chatbot.api.embedding.embedding.client", mock_ollama_client)
+
+    texts = ["a" * i for i in range(1, 6)]
+    assert embed_texts(texts, batch_size=5) == [[float(i)] for i in range(1, 6)]
+
+
+def test_embed_texts_does_not_split_server_errors(monkeypatch):
+    """Tests that a batch failing with a server error is raised for retry instead of split."""
+    mock_ollama_client = MagicMock()
+    mock_ollama_client.embed.side_effect = ResponseError("internal error", 500)
+    monkeypatch.setattr("ucr_chatbot.api.embedding.embedding.client", mock_ollama_client)
+
+    with pytest.raises(ResponseError):
+        embed_texts(["a", "b", "c", "d"], batch_size=4)
+    assert mock_ollama_client.embed.call_count == 1
+
+
+def test_embed_texts_testing_mode(monkeypatch):
+    """Tests that the local fallback returns one embedding per text."""
+    monkeypatch.setattr("ucr_chatbot.api.embedding.embedding.client", None)
+    result = embed_texts(["one", "two", "three"], batch_size=2)
+    assert len(result) == 3
+    assert all(len(embedding) == Config.EMBEDDING_DIMENSIONS for embedding in result)
+    assert result[0] == hashing_embed("one")
+
+
+def test_hashing_backend_uses_its_own_model_name(monkeypatch):
+    """Tests that hashed vectors are named after their dimensions and are never made for an Ollama model."""
+    monkeypatch.setattr("ucr_chatbot.api.embedding.embedding.client", None)
+    assert Config.EMBEDDING_MODEL == hashing_model_name(Config.EMBEDDING_DIMENSIONS)
+    assert embed_texts(["one"], model=hashing_model_name(8)) == [hashing_embed("one", dimensions=8)]
+    with pytest.raises(ValueError):
+        embed_texts(["one"], model="nomic-embed-text")
+
+
+def distance(a, b):
+    return sum((x - y) ** 2 for x, y in zip(a, b)) ** 0.5
+
+
+def test_hashing_embed_is_deterministic_and_normalized():
+    """Tests that the hashing backend is stable and returns unit vectors."""
+    vector = hashing_embed("The LC-3 ADD instruction adds two registers.")
+    assert vector == hashing_embed("The LC-3 ADD instruction adds two registers.")
+    assert len(vector) == Config.EMBEDDING_DIMENSIONS
+    assert abs(sum(x * x for x in vector) - 1.0) < 1e-9
+    assert hashing_embed("...", dimensions=8) == [0.0] * 8
+
+
+def test_hashing_embed_places_related_text_closer():
+    """Tests that texts sharing vocabulary are closer than unrelated texts."""
+    query = hashing_embed("How does the LC-3 ADD instruction use registers?")
+    related = hashing_embed("The ADD instruction of the LC-3 adds two source registers.")
+    unrelated = hashing_embed("A binary search tree keeps smaller keys in its left subtree.")
+    assert distance(query, related) < distance(query, unrelated)
+
+
 # def test_embedding_module_raises_connection_error(monkeypatch):
 #     """
 #     Tests that a ConnectionError is raised if the Ollama server is down
@@ -43,4 +142,4 @@ def test_embed_text_success(monkeypatch):
 #     with pytest.raises(ConnectionError, match="Could not connect to Ollama"):
 #         import importlib
 #         import ucr_chatbot.api.embedding.embedding
-#         importlib.reload(ucr_chatbot.api.embedding.embedding)
\ No newline at end of file
+#         importlib.reload(ucr_chatbot.api.embedding.embedding)
@@ -0,0 +1,70 @@
+from ucr_chatbot.api.embedding import reembedding
+from ucr_chatbot.api.embedding.reembedding import reembed_course
+
+
+def test_reembed_course_backfills_then_cuts_over(monkeypatch):
+    """Tests that segments are embedded in batches before the course switches models,
+    that uploads made during the backfill are caught up, that the last ones are embedded
+    by the switch itself, and that old vectors are deleted."""
+    segments = {1: "one", 2: "two", 3: "three"}
+    stored: dict[int, str] = {}
+    events: list[str] = []
+
+    def missing():
+        return [(i, text) for i, text in sorted(segments.items()) if i not in stored]
+
+    def fake_missing(course_id, model, limit):
+        batch = missing()[:limit]
+        if not batch and 4 in stored:
+            segments[5] = "uploaded after the catch-up"
+        return batch
+
+    def fake_store(segment_ids, vectors, model):
+        events.append(f"store {len(segment_ids)}")
+        stored.update(dict.fromkeys(segment_ids, model))
+
+    def fake_switch(course_id, model, embed):
+        batch = missing()
+        embed([text for _, text in batch])
+        stored.update(dict.fromkeys((i for i, _ in batch), model))
+        events.append(f"switch {model} with {len(batch)}")
+        return len(batch)
+
+    def before_cutover():
+        events.append("index")
+        segments[4] = "uploaded during backfill"
+
+    monkeypatch.setattr(reembedding, "get_segments_missing_embedding", fake_missing)
+    monkeypatch.setattr(reembedding, "store_embeddings", fake_store)
+    monkeypatch.setattr(reembedding, "switch_course_embedding_model", fake_switch)
+    monkeypatch.setattr(
+        reembedding,
+        "delete_course_embeddings",
+        lambda course_id, keep_model: events.append(f"delete all but {keep_model}"),
+    )
+    monkeypatch.setattr(
+        reembedding,
+        "embed_texts_cached",
+        lambda texts, embed, model: [[float(len(text))] for text in texts],
+    )
+
+    progress: list[int] = []
+    embedded = reembed_course(
+        7,
+        "new-model",
+        batch_size=2,
+        before_cutover=before_cutover,
+        on_progress=progress.append,
+    )
+
+    assert embedded == 5
+    assert stored == dict.fromkeys(range(1, 6), "new-model")
+    assert progress == [2, 3, 4, 5]
+    assert events == [
+        "store 2",
+        "store 1",
+        "index",
+        "store 1",
+        "switch new-model with 1",
+        "delete all but new-model",
+    ]
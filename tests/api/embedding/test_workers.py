@@ -0,0 +1,81 @@
+import random
+import threading
+import time
+
+import httpx
+import pytest
+from ollama import ResponseError
+
+from ucr_chatbot.api.embedding.workers import EmbeddingWorkerPool, is_transient_error
+
+
+def slow_embed(texts):
+    """Embeds each text as its length after a short random delay."""
+    time.sleep(random.uniform(0, 0.01))
+    return [[float(len(text))] for text in texts]
+
+
+def test_pool_preserves_order():
+    """Tests that embeddings come back in input order regardless of completion order."""
+    pool = EmbeddingWorkerPool(workers=4, max_in_flight=4, batch_size=3, embed=slow_embed)
+    texts = ["a" * i for i in range(1, 51)]
+    assert pool.embed(iter(texts)) == [[float(i)] for i in range(1, 51)]
+
+
+def test_pool_bounds_in_flight_batches():
+    """Tests that no more than max_in_flight batches are ever outstanding."""
+    lock = threading.Lock()
+    current = 0
+    peak = 0
+
+    def tracking_embed(texts):
+        nonlocal current, peak
+        with lock:
+            current += 1
+            peak = max(peak, current)
+        time.sleep(0.005)
+        with lock:
+            current -= 1
+        return [[0.0] for _ in texts]
+
+    pool = EmbeddingWorkerPool(workers=8, max_in_flight=2, batch_size=1, embed=tracking_embed)
+    pool.embed(["text"] * 30)
+    assert 1 <= peak <= 2
+
+
+def test_pool_retries_transient_errors():
+    """Tests that transient failures are retried and then succeed."""
+    failures = {"count": 0}
+
+    def flaky_embed(texts):
+        if failures["count"] < 2:
+            failures["count"] += 1
+            raise httpx.ConnectError("connection refused")
+        return [[1.0] for _ in texts]
+
+    pool = EmbeddingWorkerPool(workers=1, retries=3, backoff=0, embed=flaky_embed)
+    assert pool.embed(["a", "b"]) == [[1.0], [1.0]]
+    assert failures["count"] == 2
+
+
+def test_pool_raises_permanent_errors():
+    """Tests that non-transient failures are not retried."""
+    calls = {"count": 0}
+
+    def broken_embed(texts):
+        calls["count"] += 1
+        raise ResponseError("model not found", 404)
+
+    pool = EmbeddingWorkerPool(workers=2, retries=3, backoff=0, batch_size=1, embed=broken_embed)
+    with pytest.raises(ResponseError):
+        pool.embed(["a"])
+    assert calls["count"] == 1
+
+
+def test_is_transient_error():
+    """Tests the classification of embedding errors."""
+    assert is_transient_error(ResponseError("busy", 503))
+    assert is_transient_error(ResponseError("slow down", 429))
+    assert not is_transient_error(ResponseError("bad request", 400))
+    assert is_transient_error(httpx.ReadTimeout("timed out"))
+    assert not is_transient_error(ValueError("bad"))
@@ -0,0 +1,100 @@
+from ucr_chatbot.api.context_retrieval.retriever import RetrievedSegment
+from ucr_chatbot.api.language_model.prompt_packing import (
+    ApproximateTokenizer,
+    HistoryMessage,
+    Tokenizer,
+    pack_prompt,
+    packing_totals,
+    reset_packing_totals,
+    truncate_at_sentence,
+)
+
+TEMPLATE = "Context:\n{context}\nHistory:\n{history}\nQuestion: {question}"
+
+
+class WordTokenizer(Tokenizer):
+    """Counts one token per whitespace-separated word."""
+
+    def count(self, text: str) -> int:
+        return len(text.split())
+
+
+def test_approximate_tokenizer():
+    """Tests that words count a token per four characters and punctuation counts one each."""
+    tokenizer = ApproximateTokenizer()
+    assert tokenizer.count("") == 0
+    assert tokenizer.count("a cat, sat.") == 5
+    assert tokenizer.count("tokenization") == 3
+
+
+def test_truncate_at_sentence():
+    """Tests that text is cut after the last whole sentence that fits."""
+    text = "One two three. Four five six! Seven eight nine?"
+    tokenizer = WordTokenizer()
+    assert truncate_at_sentence(text, 9, tokenizer) == text
+    assert truncate_at_sentence(text, 7, tokenizer) == "One two three. Four five six!"
+    assert truncate_at_sentence(text, 0, tokenizer) == ""
+
+
+def test_truncate_long_first_sentence_at_word():
+    """Tests that a first sentence longer than the limit is cut after its last whole word."""
+    text = "One two three. Four five six!"
+    tokenizer = WordTokenizer()
+    assert truncate_at_sentence(text, 2, tokenizer) == "One two"
+    assert truncate_at_sentence(text, 1, tokenizer) == "One"
+    assert truncate_at_sentence("Supercalifragilistic words", 1, ApproximateTokenizer()) == ""
+
+
+def test_pack_prompt_fits_budget():
+    """Tests that the best segments and newest messages are kept, long segments are cut,
+    and the token counts are reported."""
+    reset_packing_totals()
+    tokenizer = WordTokenizer()
+    segments = [
+        RetrievedSegment(1, "Alpha beta. Gamma delta.", "a.pdf"),
+        RetrievedSegment(2, "Epsilon zeta eta theta. Iota kappa lambda mu.", "a.pdf"),
+        RetrievedSegment(3, "Nu xi omicron pi rho sigma tau upsilon.", "a.pdf"),
+        RetrievedSegment(4, "Phi chi psi omega.", "a.pdf"),
+    ]
+    history = [HistoryMessage("StudentMessage", f"message {i}") for i in range(6)]
+
+    packed = pack_prompt(
+        TEMPLATE,
+        "why?",
+        segments,
+        history,
+        budget=36,
+        tokenizer=tokenizer,
+        history_share=0.25,
+        max_segment_tokens=6,
+    )
+
+    assert tokenizer.count(packed.prompt) <= 36
+    assert [segment.id for segment in packed.segments] == [1, 2, 3]
+    assert "Epsilon zeta eta theta." in packed.prompt
+    assert "Iota" not in packed.prompt
+    assert "Nu xi omicron pi rho sigma\n" in packed.prompt
+    assert "Phi" not in packed.prompt
+    assert "StudentMessage: message 5" in packed.prompt
+    assert "message 0" not in packed.prompt
+    assert packed.prompt.index("message 4") < packed.prompt.index("message 5")
+
+    stats = packed.stats
+    assert stats.template_tokens == 4
+    assert stats.total_tokens == tokenizer.count(packed.prompt)
+    assert stats.segments_truncated == 2
+    assert stats.segments_dropped == 1
+    assert stats.messages_used + stats.messages_dropped == 6
+    assert packing_totals().prompts == 1
+    assert packing_totals().prompt_tokens == stats.total_tokens
+
+
+def test_pack_prompt_without_segments():
+    """Tests that the no-context text stands in for context and history takes the whole budget."""
+    history = [HistoryMessage("BotMessage", "hello there")]
+    packed = pack_prompt(
+        TEMPLATE, "why?", [], history, budget=100, tokenizer=WordTokenizer(), no_context="Nothing."
+    )
+    assert "Context:\nNothing.\n" in packed.prompt
+    assert "BotMessage: hello there" in packed.prompt
+    assert packed.segments == []
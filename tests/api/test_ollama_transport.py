@@ -0,0 +1,62 @@
+import httpx
+import pytest
+from ollama import ResponseError
+
+from ucr_chatbot.api.ollama_transport import (
+    ollama_client,
+    reset_transport_stats,
+    shared_transport,
+    transport_stats,
+)
+
+
+def test_clients_share_one_connection_pool():
+    """Tests that every client created without a transport reuses the same pool."""
+    assert shared_transport() is shared_transport()
+    embedding_client = ollama_client(1.0)
+    generation_client = ollama_client(60.0)
+    assert embedding_client._client._transport is shared_transport()  # type: ignore
+    assert generation_client._client._transport is shared_transport()  # type: ignore
+    assert embedding_client._client.timeout.read == 1.0  # type: ignore
+    assert generation_client._client.timeout.read == 60.0  # type: ignore
+
+
+def test_requests_are_counted_per_endpoint():
+    """Tests that successful and failed requests are counted for their endpoint."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/api/embed":
+            return httpx.Response(200, json={"model": "m", "embeddings": [[0.5, 0.5]]})
+        return httpx.Response(500, json={"error": "unavailable"})
+
+    reset_transport_stats()
+    client = ollama_client(1.0, transport=httpx.MockTransport(handler))
+    assert client.embed(model="m", input=["text"])["embeddings"] == [[0.5, 0.5]]
+    with pytest.raises(ResponseError):
+        client.generate(model="m", prompt="hi")
+
+    stats = transport_stats()
+    assert stats["/api/embed"].requests == 1
+    assert stats["/api/embed"].errors == 0
+    assert stats["/api/generate"].errors == 1
+    assert stats["/api/embed"].mean_seconds >= 0.0
+
+
+def test_transport_errors_are_counted():
+    """Tests that requests that fail before a response arrives are counted as errors."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/api/embed":
+            raise httpx.ConnectError("refused", request=request)
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    reset_transport_stats()
+    client = ollama_client(1.0, transport=httpx.MockTransport(handler))
+    with pytest.raises(ConnectionError):
+        client.embed(model="m", input=["text"])
+    with pytest.raises(httpx.ReadTimeout):
+        client.generate(model="m", prompt="hi")
+
+    stats = transport_stats()
+    assert (stats["/api/embed"].requests, stats["/api/embed"].errors) == (1, 1)
+    assert (stats["/api/generate"].requests, stats["/api/generate"].errors) == (1, 1)
@@ -53,3 +53,72 @@ def test_mock(db: Connection):
   for row in result:
     answer = row
   assert answer.email == 'test001@ucr.edu'
+
+def test_build_index(capsys):
+  """Tests that the vector index is created and can be rebuilt with new parameters"""
+  initialize(True)
+  main(shlex.split('build-index'))
+  assert vector_index_name(Config.EMBEDDING_MODEL) in [index["name"] for index in inspect(engine).get_indexes("Embeddings")]
+
+  main(shlex.split('rebuild-index --m 8 --ef-construction 32'))
+  output = capsys.readouterr().out
+  assert "rebuilt (m=8, ef_construction=32)" in output
+  assert vector_index_name(Config.EMBEDDING_MODEL) in [index["name"] for index in inspect(engine).get_indexes("Embeddings")]
+
+  main(shlex.split('build-index --storage halfvec'))
+  assert vector_index_name(Config.EMBEDDING_MODEL, VectorStorage.HALFVEC) in [index["name"] for index in inspect(engine).get_indexes("Embeddings")]
+
+def test_compact(db: Connection, capsys):
+  """Tests that compaction removes an inactive document's segments but keeps the ones messages cite"""
+  initialize(True)
+  mock()
+  add_new_document("1/old.pdf", 1)
+  vector = [0.] * Config.EMBEDDING_DIMENSIONS
+  cited, uncited = store_document_segments("1/old.pdf", ["cited", "uncited"], [vector, vector])
+  db.execute(insert(Conversations).values(id=1, initiated_by="test002@ucr.edu", course_id=1))
+  db.execute(insert(Messages).values(id=1, body="hi", type=MessageType.BOT_MESSAGES, conversation_id=1, written_by="test002@ucr.edu"))
+  db.execute(insert(References).values(message=1, segment=cited))
+  db.commit()
+  set_document_inactive("1/old.pdf")
+
+  main(shlex.split('compact --batch-size 1'))
+  assert "Compacted 2 embeddings, 1 segments, and 0 documents" in capsys.readouterr().out
+  assert db.execute(select(Segments.id, Segments.is_active)).all() == [(cited, False)]
+  assert db.execute(select(Embeddings)).first() is None
+  assert db.execute(select(References.segment)).scalar_one() == cited
+
+def test_compact_keeps_documents_being_ingested(db: Connection, capsys):
+  """Tests that compaction keeps an inactive document while an ingestion job for it is pending"""
+  initialize(True)
+  mock()
+  add_new_document("1/queued.pdf", 1)
+  job_id = enqueue_ingestion_job("1/queued.pdf", 1)
+  set_document_inactive("1/queued.pdf")
+
+  main(shlex.split('compact'))
+  assert "0 documents" in capsys.readouterr().out
+  assert db.execute(select(Documents.file_path).where(Documents.file_path == "1/queued.pdf")).scalar_one() == "1/queued.pdf"
+
+  finish_ingestion_job(job_id)
+  main(shlex.split('compact'))
+  assert "1 documents" in capsys.readouterr().out
+
+def test_compact_keeps_reuploaded_files(db: Connection, capsys):
+  """Tests that compaction removes the uploads of deleted documents but keeps a file saved after their rows were locked"""
+  import os, time
+  initialize(True)
+  mock()
+  uploads = Path(Config.FILE_STORAGE_PATH) / "1"
+  uploads.mkdir(parents=True, exist_ok=True)
+  for name in ("stale.txt", "reuploaded.txt"):
+    add_new_document(f"1/{name}", 1)
+    (uploads / name).write_bytes(b"12345")
+    set_document_inactive(f"1/{name}")
+  later = time.time() + 60
+  os.utime(uploads / "reuploaded.txt", (later, later))
+
+  main(shlex.split('compact'))
+  assert "2 documents" in capsys.readouterr().out
+  assert not (uploads / "stale.txt").exists()
+  assert (uploads / "reuploaded.txt").read_bytes() == b"12345"
+  (uploads / "reuploaded.txt").unlink()
@@ -3,6 +3,8 @@ import os
 from pathlib import Path
 
 from sqlalchemy import insert, select, delete, inspect
+from sqlalchemy.exc import IntegrityError
+import pytest
 
 from datetime import datetime, timezone
 
@@ -14,6 +16,9 @@ import pandas as pd
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
 
 from ucr_chatbot.db.models import *
+from ucr_chatbot.config import Config
+from ucr_chatbot.api.context_retrieval.retriever import Retriever
+from ucr_chatbot.api.embedding.reembedding import reembed_course
 from helper_functions import *
 
 def test_initialize_db():
@@ -38,7 +43,7 @@ def test_add_new_course(db: Connection):
     for row in result:
         answer = row
     assert answer is not None
-    assert answer == (12, 'CS164')
+    assert answer == (12, 'CS164', None)
 
 # def test_add_course_integrity(capsys):
 #     """tests the add_new_course function exception occurs when error"""
@@ -158,7 +163,7 @@ def test_add_new_document(db: Connection):
     for row in result:
         answer = row
     assert answer is not None
-    assert answer == ("slide_1.pdf", 1, True)
+    assert answer == ("slide_1.pdf", 1, True, 1)
 
 def test_add_document_integrity(capsys):
     """tests the add_new_document function exception occurs when error"""
@@ -180,11 +185,11 @@ def test_insert_segments(db: Connection):
     for row in result:
         answer = row
     assert answer is not None
-    assert answer ==(100,"hello", "slide_1.pdf")
+    assert answer ==(100,"hello", "slide_1.pdf", None, True, None, None, None)
 
 def test_insert_embeddings(db: Connection): 
     """tests if an embedding can be inserted and selected out of db"""
-    emb = [0.,0.,0.,0.,0.,0.,0.,0.,0.,0.]
+    emb = [0.] * Config.EMBEDDING_DIMENSIONS
     stmt = insert(Embeddings).values(id =100, vector=emb, segment_id=100)
     db.execute(stmt)
     db.commit()
@@ -229,7 +234,7 @@ def test_delete_reference(db: Connection):
 
 def test_delete_embeddings(db: Connection): 
     """tests if an embedding can be deleted from db"""
-    stmt = delete(Embeddings).where(Embeddings.id ==100, Embeddings.vector==[0,0,0,0,0,0,0,0,0,0], Embeddings.segment_id==100)
+    stmt = delete(Embeddings).where(Embeddings.id ==100, Embeddings.vector==[0] * Config.EMBEDDING_DIMENSIONS, Embeddings.segment_id==100)
     db.execute(stmt)
     db.commit()
 
@@ -393,12 +398,12 @@ def test_store_segment(db: Connection):
     for row in result:
         answer = row
     assert answer is not None
-    assert answer == (segment_id, 'Text string', 'slide_1.pdf')  
+    assert answer == (segment_id, 'Text string', 'slide_1.pdf', segment_hash('Text string'), True, None, None, None)
 
 def test_store_embedding(db: Connection):
     """Tests the store_embedding wrapper function"""
     segment_id = store_segment("Text string", "slide_2.pdf")
-    embedding = [i for i in range(100)]
+    embedding = [i for i in range(Config.EMBEDDING_DIMENSIONS)]
     store_embedding(embedding, segment_id)
     s = select(Embeddings).where(Embeddings.vector==embedding, Embeddings.segment_id==segment_id)
     result = db.execute(s)
@@ -407,7 +412,170 @@ def test_store_embedding(db: Connection):
     for row in result:
         answer = row
     assert answer is not None
-    id, vector, seg_id = answer
+    id, vector, seg_id, model, course_id, is_active = answer
     assert id == 1
     assert np.allclose(vector, embedding)
     assert seg_id == segment_id
+    assert model == Config.EMBEDDING_MODEL
+    assert (course_id, is_active) == (1, True)
+
+    set_document_inactive("slide_2.pdf")
+    assert db.execute(select(Embeddings.is_active).where(Embeddings.segment_id == segment_id)).scalar_one() is False
+
+def test_store_embeddings(db: Connection):
+    """Tests storing several segments' embeddings at once, skipping missing segments"""
+    add_new_document(file_path="batch.pdf", course_id=1)
+    segment_ids = [store_segment(text, "batch.pdf") for text in ("a", "b")]
+    vectors = [[float(i)] * Config.EMBEDDING_DIMENSIONS for i in range(3)]
+    assert store_embeddings([*segment_ids, -1], vectors, "test-model") == 2
+
+    rows = db.execute(select(Embeddings.segment_id, Embeddings.course_id, Embeddings.is_active).where(Embeddings.model == "test-model").order_by(Embeddings.segment_id)).all()
+    assert [tuple(row) for row in rows] == [(segment_ids[0], 1, True), (segment_ids[1], 1, True)]
+
+def test_store_document_segments(db: Connection):
+    """Tests that a document's segments and embeddings are stored together, or not at all"""
+    add_new_document(file_path="bulk.pdf", course_id=1)
+    vectors = [[float(i)] * Config.EMBEDDING_DIMENSIONS for i in range(3)]
+    segment_ids = store_document_segments("bulk.pdf", ["a", "b", "c"], vectors)
+
+    rows = db.execute(select(Segments.id, Segments.text).where(Segments.document_id == "bulk.pdf").order_by(Segments.id)).all()
+    assert [tuple(row) for row in rows] == list(zip(segment_ids, ["a", "b", "c"]))
+    stored = db.execute(select(Embeddings.segment_id, Embeddings.vector).where(Embeddings.segment_id.in_(segment_ids)).order_by(Embeddings.segment_id)).all()
+    assert [row[0] for row in stored] == segment_ids
+    assert np.allclose(stored[2][1], vectors[2])
+
+    with pytest.raises(IntegrityError):
+        store_document_segments("missing.pdf", ["x", "y"], vectors[:2])
+    assert db.execute(select(Segments).where(Segments.document_id == "missing.pdf")).first() is None
+
+def test_sync_document_segments(db: Connection):
+    """Tests that a new version of a document reuses unchanged segments and retires removed ones"""
+    add_new_document(file_path="versioned.pdf", course_id=1)
+
+    def vectors(texts: list[str]) -> dict[str, list[float]]:
+        return {segment_hash(t): [float(len(t))] * Config.EMBEDDING_DIMENSIONS for t in texts}
+
+    first = sync_document_segments("versioned.pdf", ["a", "b", "c"], vectors(["a", "b", "c"]))
+    assert (first.version, first.added, first.retired, first.reused) == (1, 3, 0, 0)
+    ids = dict(db.execute(select(Segments.text, Segments.id).where(Segments.document_id == "versioned.pdf")).all())
+
+    second = sync_document_segments("versioned.pdf", ["a", "c", "d"], vectors(["d"]))
+    assert (second.version, second.added, second.retired, second.reused) == (2, 1, 1, 2)
+
+    active = dict(db.execute(select(Segments.text, Segments.id).where(Segments.document_id == "versioned.pdf", Segments.is_active)).all())
+    assert active["a"] == ids["a"] and active["c"] == ids["c"] and "b" not in active
+    assert db.execute(select(Embeddings).where(Embeddings.segment_id == ids["b"])).first() is None
+
+    with pytest.raises(ValueError):
+        sync_document_segments("versioned.pdf", ["a", "e"], {})
+
+
+def test_sync_document_segments_positions(db: Connection):
+    """Tests that segments are numbered in document order and reused ones move to their new position and page"""
+    add_new_document(file_path="positions.pdf", course_id=1)
+    vectors = {segment_hash(t): [1.0] * Config.EMBEDDING_DIMENSIONS for t in ["a", "b", "c", "d"]}
+
+    sync_document_segments("positions.pdf", ["a", "b", "c"], vectors, pages=[1, 1, 2])
+    sync_document_segments("positions.pdf", ["d", "a", "c"], vectors, pages=[1, 2, 3])
+
+    rows = db.execute(
+        select(Segments.text, Segments.ordinal, Segments.page)
+        .where(Segments.document_id == "positions.pdf", Segments.is_active)
+        .order_by(Segments.ordinal)
+    ).all()
+    assert [tuple(row) for row in rows] == [("d", 0, 1), ("a", 1, 2), ("c", 2, 3)]
+
+
+def test_sync_document_segments_sections(db: Connection):
+    """Tests that segments are stored with their section and reused ones move to their new section"""
+    add_new_document(file_path="notes.md", course_id=1)
+    vectors = {segment_hash(t): [1.0] * Config.EMBEDDING_DIMENSIONS for t in ["a", "b"]}
+
+    sync_document_segments("notes.md", ["a", "b"], vectors, sections=["Intro", None])
+    sync_document_segments("notes.md", ["a", "b"], vectors, sections=["Intro > Loops", None])
+
+    rows = db.execute(
+        select(Segments.text, Segments.section)
+        .where(Segments.document_id == "notes.md", Segments.is_active)
+        .order_by(Segments.ordinal)
+    ).all()
+    assert [tuple(row) for row in rows] == [("a", "Intro > Loops"), ("b", None)]
+
+def test_course_embedding_model(db: Connection):
+    """Tests switching a course's embedding model and finding the segments it has not embedded"""
+    add_new_course("CS179")
+    course_id = db.execute(select(Courses.id).where(Courses.name == "CS179")).scalar_one()
+    add_new_document(file_path="reembed.pdf", course_id=course_id)
+    first = store_segment("first", "reembed.pdf")
+    second = store_segment("second", "reembed.pdf")
+    store_embedding([1.0] * Config.EMBEDDING_DIMENSIONS, first)
+
+    assert get_course_embedding_model(course_id) == Config.EMBEDDING_MODEL
+    assert get_segments_missing_embedding(course_id, Config.EMBEDDING_MODEL, 10) == [(second, "second")]
+    assert get_segments_missing_embedding(course_id, "test-model", 1) == [(first, "first")]
+
+    store_embedding([1.0, 2.0], first, "test-model")
+    set_course_embedding_model(course_id, "test-model")
+    assert get_course_embedding_model(course_id) == "test-model"
+    assert delete_course_embeddings(course_id, keep_model="test-model") == 1
+
+def test_reembed_course_cutover(db: Connection):
+    """Tests that a segment uploaded during a re-embed is searchable by the new model as soon as the course switches"""
+    add_new_course("CS152")
+    course_id = db.execute(select(Courses.id).where(Courses.name == "CS152")).scalar_one()
+    old_vector = [1.0] * Config.EMBEDDING_DIMENSIONS
+    for file_path, texts in (("cutover.pdf", ["a", "b"]), ("late.pdf", ["late"])):
+        add_new_document(file_path=file_path, course_id=course_id)
+    sync_document_segments("cutover.pdf", ["a", "b"], {segment_hash(text): old_vector for text in ["a", "b"]})
+
+    def upload():
+        sync_document_segments("late.pdf", ["late"], {segment_hash("late"): old_vector})
+
+    reembed_course(
+        course_id,
+        "cutover-model",
+        keep_old=True,
+        embed=lambda texts: [[1.0, float(len(text))] for text in texts],
+        before_cutover=upload,
+    )
+    assert get_course_embedding_model(course_id) == "cutover-model"
+    late_id = db.execute(select(Segments.id).where(Segments.document_id == "late.pdf")).scalar_one()
+    with Session(engine) as session:
+        found = session.execute(Retriever().search_query([1.0, 4.0], course_id, "cutover-model", 3)).all()
+        assert int(found[0][0].id) == late_id
+
+    with pytest.raises(EmbeddingModelChangedError):
+        sync_document_segments("late.pdf", ["later"], {segment_hash("later"): old_vector})
+
+def test_embedding_cache(db: Connection):
+    """Tests storing, looking up, and evicting cached embeddings"""
+    store_cached_embeddings("test-model", {"a" * 64: [1.0, 2.0], "b" * 64: [3.0, 4.0]})
+    store_cached_embeddings("test-model", {"a" * 64: [9.0, 9.0]})
+
+    found = get_cached_embeddings("test-model", ["a" * 64, "c" * 64])
+    assert list(found) == ["a" * 64]
+    assert np.allclose(found["a" * 64], [1.0, 2.0])
+    assert get_cached_embeddings("other-model", ["a" * 64]) == {}
+
+    assert evict_embedding_cache(1) == 1
+    assert list(get_cached_embeddings("test-model", ["a" * 64, "b" * 64])) == ["a" * 64]
+
+def test_lexical_query_ranks_identifier_match_first(db: Connection):
+    """Tests that full-text search for an identifier puts the segment containing it first"""
+    add_new_course("CS153")
+    course_id = db.execute(select(Courses.id).where(Courses.name == "CS153")).scalar_one()
+    add_new_document(file_path="syscalls.pdf", course_id=course_id)
+    texts = [
+        "What is a process and what does the kernel do when it starts one?",
+        "Why does the scheduler do what it does for each process?",
+        "Call sys_uptime to read the ticks since the kernel started.",
+    ]
+    vectors = [[1.0] * Config.EMBEDDING_DIMENSIONS] * len(texts)
+    segment_ids = store_document_segments("syscalls.pdf", texts, vectors)
+
+    query = Retriever().lexical_query(
+        "What does sys_uptime do in the kernel?", course_id, Config.EMBEDDING_MODEL, 3
+    )
+    with Session(engine) as session:
+        found = [int(segment.id) for segment, _ in session.execute(query).all()]
+    assert found == [segment_ids[2]]
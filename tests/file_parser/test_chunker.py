@@ -0,0 +1,40 @@
+from ucr_chatbot.api.file_parsing.chunker import Chunker
+
+
+def test_chunks_whole_sentences_with_overlap():
+    """Tests that chunks hold whole sentences, repeat the last ones of the chunk before,
+    and record where they start."""
+    text = "One two. Three four! Five six? Seven eight. Nine ten."
+    chunks = list(Chunker(24, overlap=1).chunk([text]))
+    assert [chunk.text for chunk in chunks] == [
+        "One two. Three four!",
+        "Three four! Five six?",
+        "Five six? Seven eight.",
+        "Seven eight. Nine ten.",
+    ]
+    assert [text[chunk.start :].startswith(chunk.text) for chunk in chunks] == [True] * 4
+
+
+def test_blocks_split_anywhere():
+    """Tests that a text gives the same chunks however it is cut into blocks."""
+    text = "Alpha beta gamma. Delta epsilon.\n\nZeta eta theta iota. Kappa lambda mu nu xi."
+    chunker = Chunker(30, overlap=1)
+    whole = list(chunker.chunk([text]))
+    for size in (1, 3, 7, 16):
+        blocks = [text[i : i + size] for i in range(0, len(text), size)]
+        assert list(chunker.chunk(blocks)) == whole
+
+
+def test_long_sentences_are_cut():
+    """Tests that a text without sentence ends is cut between words, and a long word inside."""
+    text = "word " * 50 + "x" * 25
+    chunks = list(Chunker(12).chunk([text]))
+    assert all(len(chunk.text) <= 12 for chunk in chunks)
+    assert chunks[0].text == "word word"
+    assert "".join(chunk.text for chunk in chunks).replace(" ", "") == text.replace(" ", "")
+
+
+def test_token_measure():
+    """Tests that chunks are bounded by the given measure rather than characters."""
+    chunks = list(Chunker(3, measure=lambda text: len(text.split())).chunk(["a b c d. e f g h i."]))
+    assert [chunk.text for chunk in chunks] == ["a b c", "d.", "e f g", "h i."]
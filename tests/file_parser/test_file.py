@@ -1,5 +1,15 @@
-from ucr_chatbot.api.file_parsing import parse_file
+from ucr_chatbot.api.file_parsing import iter_document, parse_document, parse_file
+from ucr_chatbot.api.file_parsing.chunker import Chunker
+from ucr_chatbot.api.file_parsing.file_parsing import (
+    InvalidFileExtensionError,
+    _iter_pdf,
+    _iter_txt,
+    detect_encoding,
+    segment_chunker,
+)
+from io import BytesIO
 import os
+import pytest
 
 # def test_md():
 #     test_string = """# My Markdown Example
@@ -49,4 +59,47 @@ def test_complex_pdf():
     result = parse_file(f"tests{os.sep}file_parser{os.sep}test_files{os.sep}test_textbook2.pdf")
     print(result)
     #assert result == ["dog"]
-    assert isinstance(result, list)
\ No newline at end of file
+    assert isinstance(result, list)
+
+
+def test_streaming_pdf():
+    """Tests that streaming a PDF yields the same segments and pages as parsing it whole."""
+    path = f"tests{os.sep}file_parser{os.sep}test_files{os.sep}test_textbook.pdf"
+    segments = iter_document(path)
+    first = next(segments)
+    assert [first, *segments] == parse_document(path)
+    assert first.page == 1
+
+
+def test_streaming_invalid_extension():
+    """Tests that an unsupported file is rejected before the iterator is used."""
+    with pytest.raises(InvalidFileExtensionError):
+        iter_document("notes.docx")
+
+
+def test_parallel_pdf_extraction():
+    """Tests that pages extracted by several processes give the same segments in order."""
+    path = f"tests{os.sep}file_parser{os.sep}test_files{os.sep}test_textbook.pdf"
+    with open(path, "rb") as f:
+        parallel = list(_iter_pdf(f, segment_chunker(), workers=2, min_pages=0))
+    assert parallel == parse_document(path)
+
+
+TEXT = "Café au lait costs 3.50€. Naïve déjà vu!\n\nSecond paragraph, with “quotes”."
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "utf-8-sig", "utf-16", "utf-16-le", "cp1252"])
+def test_txt_encodings(tmp_path, encoding):
+    """Tests that text files are decoded in the encoding they were written in."""
+    path = tmp_path / "notes.txt"
+    path.write_bytes(TEXT.encode(encoding))
+    assert parse_file(str(path)) == [TEXT]
+
+
+def test_txt_blocks_split_characters():
+    """Tests that characters and sentences cut between read blocks are put back together."""
+    data = (TEXT + " ") * 20
+    whole = list(_iter_txt(BytesIO(data.encode()), Chunker(120, overlap=1)))
+    assert list(_iter_txt(BytesIO(data.encode()), Chunker(120, overlap=1), block_size=3)) == whole
+    assert all(len(text) <= 120 for text in whole)
+    assert detect_encoding("déjà".encode()[:2]) == "utf-8"
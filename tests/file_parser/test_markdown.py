@@ -0,0 +1,53 @@
+from ucr_chatbot.api.file_parsing.chunker import Chunker
+from ucr_chatbot.api.file_parsing.markdown import chunk_markdown
+
+NOTES = """# Week 1
+
+Intro to C. See https://example.com/notes#pointers for more.
+
+## Compiling
+
+```c
+#include <stdio.h>
+int main(void) { return 0; }
+```
+
+Run gcc on it.
+
+### Flags
+
+Use -Wall.
+
+## Linking
+
+Link the objects.
+#hashtag is not a heading.
+"""
+
+
+def test_headings_give_section_paths():
+    """Tests that every chunk carries the headings above it and no chunk spans two sections."""
+    chunks = list(chunk_markdown([NOTES], Chunker(1000)))
+    assert [chunk.section for chunk in chunks] == [
+        ("Week 1",),
+        ("Week 1", "Compiling"),
+        ("Week 1", "Compiling", "Flags"),
+        ("Week 1", "Linking"),
+    ]
+    assert chunks[0].text == "Intro to C. See https://example.com/notes#pointers for more."
+    assert chunks[3].text == "Link the objects.\n#hashtag is not a heading."
+    assert all(NOTES[chunk.start :].startswith(chunk.text) for chunk in chunks)
+
+
+def test_code_blocks_stay_whole():
+    """Tests that a fenced code block is not split at a # or a full stop inside it."""
+    chunks = list(chunk_markdown([NOTES], Chunker(60)))
+    code = [chunk.text for chunk in chunks if "#include" in chunk.text]
+    assert code == ["```c\n#include <stdio.h>\nint main(void) { return 0; }\n```"]
+
+
+def test_blocks_split_anywhere():
+    """Tests that the chunks do not depend on where the text is cut into blocks."""
+    whole = list(chunk_markdown([NOTES], Chunker(40, overlap=1)))
+    blocks = [NOTES[i : i + 5] for i in range(0, len(NOTES), 5)]
+    assert list(chunk_markdown(blocks, Chunker(40, overlap=1))) == whole
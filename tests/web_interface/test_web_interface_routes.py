@@ -9,6 +9,7 @@ from db.helper_functions import *
 from unittest.mock import MagicMock
 
 from ucr_chatbot.config import Config
+from ucr_chatbot.worker import run_once
 
 def test_course_selection_ok_response(client: FlaskClient):
     response = client.get('/')
@@ -25,8 +26,8 @@ def test_file_upload(client: FlaskClient, monkeypatch, app):
         session["_user_id"] = "testupload@ucr.edu" 
 
     mock_ollama_client = MagicMock()
-    fake_embedding = [i for i in range(100)]
-    mock_ollama_client.embeddings.return_value = {"embedding": fake_embedding}
+    fake_embedding = [i for i in range(Config.EMBEDDING_DIMENSIONS)]
+    mock_ollama_client.embed.side_effect = lambda model, input: {"embeddings": [fake_embedding for _ in input]}
     monkeypatch.setattr("ucr_chatbot.api.embedding.embedding.client", mock_ollama_client)
 
     data = {"file": (io.BytesIO(b"Test file for CS009A"), "test_file.txt")}
@@ -90,8 +91,8 @@ def test_file_download(client: FlaskClient, monkeypatch, app):
         sess["_user_id"] = "testdownload@ucr.edu"
 
     mock_ollama_client = MagicMock()
-    fake_embedding = [i for i in range(100)]
-    mock_ollama_client.embeddings.return_value = {"embedding": fake_embedding}
+    fake_embedding = [i for i in range(Config.EMBEDDING_DIMENSIONS)]
+    mock_ollama_client.embed.side_effect = lambda model, input: {"embeddings": [fake_embedding for _ in input]}
     monkeypatch.setattr("ucr_chatbot.api.embedding.embedding.client", mock_ollama_client)
 
     data = {
@@ -132,8 +133,8 @@ def test_file_delete(client: FlaskClient, monkeypatch, app):
         sess["_user_id"] = "testdelete@ucr.edu"
 
     mock_ollama_client = MagicMock()
-    fake_embedding = [i for i in range(100)]
-    mock_ollama_client.embeddings.return_value = {"embedding": fake_embedding}
+    fake_embedding = [i for i in range(Config.EMBEDDING_DIMENSIONS)]
+    mock_ollama_client.embed.side_effect = lambda model, input: {"embeddings": [fake_embedding for _ in input]}
     monkeypatch.setattr("ucr_chatbot.api.embedding.embedding.client", mock_ollama_client)
 
     data = {"file": (io.BytesIO(b"Test file for CS009A"), "test_file_delete.txt")}
@@ -157,6 +158,44 @@ def test_file_delete(client: FlaskClient, monkeypatch, app):
             assert document is not None
             assert not document.is_active
 
+def test_file_upload_job_status(client: FlaskClient, monkeypatch, app):
+    with app.app_context():
+        add_new_user("testjob@ucr.edu", "John", "Doe")
+        add_user_to_course("testjob@ucr.edu", "John", "Doe", 1, "instructor")
+
+    with client.session_transaction() as sess:
+        sess["_user_id"] = "testjob@ucr.edu"
+
+    mock_ollama_client = MagicMock()
+    fake_embedding = [i for i in range(Config.EMBEDDING_DIMENSIONS)]
+    mock_ollama_client.embed.side_effect = lambda model, input: {"embeddings": [fake_embedding for _ in input]}
+    monkeypatch.setattr("ucr_chatbot.api.embedding.embedding.client", mock_ollama_client)
+
+    data = {"file": (io.BytesIO(b"Test file for job status"), "test_file_job.txt")}
+    response = client.post(
+        "/course/1/documents",
+        data=data,
+        content_type="multipart/form-data",
+        headers={"Accept": "application/json"},
+    )
+    assert response.status_code == 202
+    status_url = response.get_json()["status_url"]
+
+    response = client.get(status_url)
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "queued"
+
+    while run_once():
+        pass
+
+    job = client.get(status_url).get_json()
+    assert job["status"] == "succeeded"
+    assert job["progress"] == {"parsed": 1, "embedded": 1, "stored": 1}
+    assert job["error"] is None
+
+    (Path(Config.FILE_STORAGE_PATH) / "1" / "test_file_job.txt").unlink()
+
+
 def test_chatroom_conversation_flow(client: FlaskClient, app):
     with app.app_context():
 
@@ -267,4 +306,36 @@ def test_generate_summary(client: FlaskClient, monkeypatch, app):
     assert "summary of course conversations" in llm_summary
 
     
-    
\ No newline at end of file
+    
+
+def test_reply_without_relevant_context_skips_llm(client: FlaskClient, monkeypatch, app):
+    with app.app_context():
+        add_new_user("testnocontext@ucr.edu", "Test", "User")
+        add_user_to_course("testnocontext@ucr.edu", "Test", "User", 1, "student")
+
+    with client.session_transaction() as sess:
+        sess["_user_id"] = "testnocontext@ucr.edu"
+
+    response = client.post(
+        "/conversation/new/1/chat",
+        json={"type": "create", "message": "What is the capital of France?"},
+        headers={"Accept": "application/json"}
+    )
+    conversation_id = response.get_json()["conversationId"]
+
+    get_response = MagicMock(return_value="Paris")
+    monkeypatch.setattr("ucr_chatbot.web_interface.conversation_routes.response_client.get_response", get_response)
+    monkeypatch.setattr(
+        "ucr_chatbot.web_interface.conversation_routes.retriever.get_segments_for",
+        MagicMock(return_value=[]),
+    )
+    monkeypatch.setattr(Config, "NO_CONTEXT_SKIP_LLM", True)
+
+    response = client.post(
+        f"/conversation/{conversation_id}",
+        json={"type": "reply", "message": "What is the capital of France?"},
+        headers={"Accept": "application/json"}
+    )
+    assert response.status_code == 200
+    assert response.get_json()["reply"] == "I cannot find any relevant course materials to help answer your question."
+    get_response.assert_not_called()
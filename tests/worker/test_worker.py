@@ -0,0 +1,118 @@
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from sqlalchemy import update
+
+from ucr_chatbot.api.file_parsing import ParsedSegment
+from ucr_chatbot.config import Config
+from ucr_chatbot.db.models import (
+    EmbeddingModelChangedError,
+    IngestionJobs,
+    JobStatus,
+    SegmentDiff,
+    add_new_document,
+    claim_ingestion_job,
+    enqueue_ingestion_job,
+    get_document_segment_hashes,
+    get_ingestion_job,
+    segment_hash,
+)
+from ucr_chatbot import worker
+from ucr_chatbot.worker import run_once
+
+
+def test_failed_job_records_error(db):
+    """Tests that a document that cannot be parsed fails its job with an error instead of stopping the worker."""
+    file_path = Path("1") / "broken.pdf"
+    (Config.FILE_STORAGE_PATH / "1").mkdir(parents=True, exist_ok=True)
+    (Config.FILE_STORAGE_PATH / file_path).write_bytes(b"not a pdf")
+    add_new_document(str(file_path), 1)
+    job_id = enqueue_ingestion_job(str(file_path), 1)
+
+    assert run_once()
+    job = get_ingestion_job(job_id)
+    assert job is not None
+    assert job["status"] == JobStatus.FAILED.value
+    assert job["error"]
+    assert job["attempts"] == 1
+
+    assert claim_ingestion_job() is None
+    (Config.FILE_STORAGE_PATH / file_path).unlink()
+
+
+def test_abandoned_job_fails_after_max_attempts(db):
+    """Tests that a job whose worker keeps dying is reclaimed until it reaches the attempt limit, then fails."""
+    add_new_document("1/crashes.pdf", 1)
+    job_id = enqueue_ingestion_job("1/crashes.pdf", 1)
+
+    def abandon():
+        db.execute(
+            update(IngestionJobs)
+            .where(IngestionJobs.id == job_id)
+            .values(updated_at=datetime.now(timezone.utc) - timedelta(hours=1))
+        )
+        db.commit()
+
+    for attempt in (1, 2):
+        job = claim_ingestion_job(stale_after=60, max_attempts=2)
+        assert job is not None and job.attempts == attempt
+        abandon()
+
+    assert claim_ingestion_job(stale_after=60, max_attempts=2) is None
+    job = get_ingestion_job(job_id)
+    assert job is not None
+    assert job["status"] == JobStatus.FAILED.value
+    assert job["attempts"] == 2
+    assert job["error"]
+
+
+def test_reupload_embeds_only_changed_segments(db, monkeypatch):
+    """Tests that ingesting a new version of a document embeds only its new segments
+    and retires the segments that were removed."""
+    file_path = "1/notes.txt"
+    add_new_document(file_path, 1)
+    versions = [["intro", "loops", "recursion"], ["intro", "loops, revised", "recursion"]]
+    embedded: list[str] = []
+
+    def fake_embed(texts, embed, model):
+        embedded.extend(texts)
+        return [[float(len(text))] * Config.EMBEDDING_DIMENSIONS for text in texts]
+
+    monkeypatch.setattr(
+        worker, "iter_document", lambda path: iter([ParsedSegment(text) for text in versions.pop(0)])
+    )
+    monkeypatch.setattr(worker, "embed_texts_cached", fake_embed)
+
+    for _ in range(2):
+        enqueue_ingestion_job(file_path, 1)
+        assert run_once()
+
+    assert embedded == ["intro", "loops", "recursion", "loops, revised"]
+    assert get_document_segment_hashes(file_path) == Counter(
+        segment_hash(text) for text in ["intro", "loops, revised", "recursion"]
+    )
+
+
+def test_job_reembeds_when_course_switches_model(db, monkeypatch):
+    """Tests that segments embedded with a model the course has since left are embedded again with the new one."""
+    file_path = "1/switched.txt"
+    add_new_document(file_path, 1)
+    stored_with: list[str] = []
+
+    def fake_sync(file_path, texts, embeddings, model, **kwargs):
+        stored_with.append(model)
+        if len(stored_with) == 1:
+            raise EmbeddingModelChangedError("new-model")
+        assert embeddings == {segment_hash("intro"): [1.0]}
+        return SegmentDiff(version=1, added=1, retired=0, reused=0, added_segments=[(1, segment_hash("intro"))])
+
+    monkeypatch.setattr(worker, "iter_document", lambda path: iter([ParsedSegment("intro")]))
+    monkeypatch.setattr(
+        worker, "embed_texts_cached", lambda texts, embed, model: [[1.0 if model == "new-model" else 0.0] for _ in texts]
+    )
+    monkeypatch.setattr(worker, "sync_document_segments", fake_sync)
+
+    enqueue_ingestion_job(file_path, 1)
+    assert run_once()
+    assert stored_with == [Config.EMBEDDING_MODEL, "new-model"]
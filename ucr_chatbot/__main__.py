@@ -1,6 +1,7 @@
 """Initialize and runs the UCR Chatbot application.
 
-This script initializes the database and launches the application.
+This script initializes the database and launches the application,
+along with a background worker that processes uploaded documents.
 If the environment variable `MOCK_DB` is set, the database will be initialized with mock data.
 """
 
@@ -11,7 +12,8 @@ import os
 
 """
 Initializes the application by creating the 'vector' extension in the database,
-installing dependencies, initializing the database, and then starting the Gunicorn web server.
+installing dependencies, initializing the database, and then starting the ingestion worker
+and the Gunicorn web server.
 """
 
 commands = [
@@ -29,6 +31,10 @@ for command in commands:
         print(e)
         exit(1)
 
+worker_command = ["uv", "run", "python", "-m", "ucr_chatbot.worker"]
+print(f"Starting ingestion worker: {' '.join(worker_command)}")
+subprocess.Popen(worker_command)
+
 gunicorn_command = "uv run gunicorn 'ucr_chatbot:create_app()' --bind 0.0.0.0:5000"
 print(f"Starting Gunicorn: {gunicorn_command}")
 try:
@@ -0,0 +1,279 @@
+from contextlib import contextmanager
+import os
+from pathlib import Path
+import re
+import tempfile
+from threading import Lock
+from typing import Generator, Iterable, Sequence, cast
+
+import numpy as np
+
+from ucr_chatbot.config import Config
+from ucr_chatbot.db.models import iter_course_embeddings
+
+
+def record_dtype(dimensions: int, dtype: str) -> np.dtype[np.void]:
+    """Gets the layout of one row of an index file: a segment id, the squared norm
+    of its vector, and the vector itself.
+
+    :param dimensions: The number of dimensions of the vectors.
+    :param dtype: The type in which vectors are stored, float32 or float16.
+    """
+    if dtype not in ("float32", "float16"):
+        raise ValueError(f"Invalid vector index dtype '{dtype}'")
+    return np.dtype(
+        [("id", np.int64), ("norm", np.float32), ("vector", dtype, (dimensions,))],
+        align=True,
+    )
+
+
+class MmapVectorIndex:
+    """Exact nearest neighbour search over per-course vector files that are memory-mapped.
+
+    Each course's active embeddings by a model are kept in one flat file of fixed-size
+    rows under directory. Searches map the file read-only, so every process on the
+    host shares its pages through the page cache, and score all rows with vectorized
+    NumPy. Ingestion appends rows in place; removing rows rewrites the file, which is
+    then swapped in atomically.
+    """
+
+    def __init__(
+        self,
+        directory: Path = Config.VECTOR_INDEX_PATH,
+        dtype: str = Config.VECTOR_INDEX_DTYPE,
+        block_rows: int = 65536,
+    ):
+        """Initializes an MmapVectorIndex.
+
+        :param directory: The directory that holds the index files.
+        :param dtype: The type in which vectors are stored, float32 or float16.
+        :param block_rows: The number of rows scored at once, which bounds the memory
+            used to convert float16 rows.
+        """
+        record_dtype(1, dtype)
+        self._directory = directory
+        self._dtype = dtype
+        self._block_rows = block_rows
+        self._lock = Lock()
+        self._maps: dict[Path, tuple[tuple[int, int], np.memmap]] = {}
+
+    def path(self, course_id: int, model: str, dimensions: int) -> Path:
+        """Gets the file holding a course's vectors by a model.
+
+        :param course_id: The id of the course.
+        :param model: The name of the embedding model.
+        :param dimensions: The number of dimensions of the model's vectors.
+        """
+        return (
+            self._directory / str(course_id) / f"{self._stem(model)}-{dimensions}.bin"
+        )
+
+    def _stem(self, model: str) -> str:
+        """Gets the part of a file name shared by a model's files of any dimension."""
+        slug = re.sub(r"[^a-z0-9]+", "_", model.lower()).strip("_")
+        return f"{slug}-{self._dtype}"
+
+    def search(
+        self, course_id: int, model: str, embedding: Sequence[float], k: int
+    ) -> list[tuple[int, float]]:
+        """Finds the segments of a course whose vectors are closest to embedding.
+        Builds the course's file first if it does not exist yet. A course without
+        vectors gets an empty file, so that it is not built again on every search.
+
+        :param course_id: The id of the course.
+        :param model: The name of the model that produced embedding.
+        :param embedding: The embedding of the prompt.
+        :param k: The number of segments to find.
+        :return: Pairs of segment id and Euclidean distance, closest first.
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        path = self.path(course_id, model, len(query))
+        if not path.exists():
+            self.build(course_id, model)
+            if not path.exists():
+                with self._exclusive(course_id):
+                    path.touch()
+        records = self._open(path, len(query))
+        if records is None or not len(records) or k < 1:
+            return []
+
+        # |v - q|^2 = |v|^2 - 2 v.q + |q|^2, where |q|^2 does not change the order.
+        scores = np.empty(len(records), dtype=np.float32)
+        for start in range(0, len(records), self._block_rows):
+            block = records[start : start + self._block_rows]
+            vectors = np.ascontiguousarray(block["vector"], dtype=np.float32)
+            scores[start : start + len(block)] = block["norm"] - 2 * (vectors @ query)
+
+        k = min(k, len(scores))
+        top = np.argpartition(scores, k - 1)[:k]
+        top = top[np.argsort(scores[top])]
+        distances = np.sqrt(np.maximum(scores[top] + query @ query, 0))
+        return [
+            (int(segment_id), float(distance))
+            for segment_id, distance in zip(records["id"][top], distances)
+        ]
+
+    def build(self, course_id: int, model: str):
+        """Writes a course's file from the database, replacing any previous one.
+
+        :param course_id: The id of the course.
+        :param model: The name of the embedding model.
+        """
+        self.write(course_id, model, iter_course_embeddings(course_id, model))
+
+    def mark_stale(self, course_id: int, model: str):
+        """Records that a course's file holds segments that are no longer active, so that
+        a worker rebuilds it with rebuild_stale. Searches keep using the file meanwhile.
+
+        :param course_id: The id of the course.
+        :param model: The name of the embedding model.
+        """
+        directory = self._directory / str(course_id)
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / f"{self._stem(model)}.stale").write_text(model)
+
+    def rebuild_stale(self) -> int:
+        """Rebuilds the files of every course marked stale.
+        Each mark is removed before its file is rebuilt, so a course marked again during
+        the rebuild is rebuilt once more, and a mark taken by another worker is skipped.
+
+        :return: The number of files rebuilt.
+        """
+        rebuilt = 0
+        for marker in sorted(self._directory.glob("*/*.stale")):
+            try:
+                model = marker.read_text()
+                marker.unlink()
+            except FileNotFoundError:
+                continue
+            self.build(int(marker.parent.name), model)
+            rebuilt += 1
+        return rebuilt
+
+    def write(
+        self,
+        course_id: int,
+        model: str,
+        batches: Iterable[tuple[Sequence[int], Sequence[Sequence[float]]]],
+    ):
+        """Writes a course's file, replacing any previous one.
+
+        :param course_id: The id of the course.
+        :param model: The name of the model that produced the vectors.
+        :param batches: Batches of segment ids and their embeddings.
+        """
+        with self._exclusive(course_id):
+            descriptor, temporary = tempfile.mkstemp(
+                dir=self._directory / str(course_id), suffix=".tmp"
+            )
+            dimensions = 0
+            try:
+                with os.fdopen(descriptor, "wb") as handle:
+                    for segment_ids, vectors in batches:
+                        dimensions = len(vectors[0])
+                        rows = self._records(segment_ids, vectors, dimensions)
+                        handle.write(rows.tobytes())
+                if dimensions:
+                    os.replace(temporary, self.path(course_id, model, dimensions))
+                else:
+                    # The course has no vectors left, so no search may read the old ones.
+                    directory = self._directory / str(course_id)
+                    for stale in directory.glob(f"{self._stem(model)}-*.bin"):
+                        stale.unlink()
+            finally:
+                if os.path.exists(temporary):
+                    os.unlink(temporary)
+
+    def append(
+        self,
+        course_id: int,
+        model: str,
+        segment_ids: Sequence[int],
+        vectors: Sequence[Sequence[float]],
+    ):
+        """Adds newly stored segments to a course's file.
+        Segments that the file already holds are skipped. If the file does not exist
+        yet, it is built from the database instead.
+
+        :param course_id: The id of the course.
+        :param model: The name of the model that produced vectors.
+        :param segment_ids: The ids of the new segments.
+        :param vectors: The embedding of each new segment.
+        """
+        if not segment_ids:
+            return
+        dimensions = len(vectors[0])
+        path = self.path(course_id, model, dimensions)
+        if not path.exists():
+            self.build(course_id, model)
+            return
+        with self._exclusive(course_id):
+            records = self._open(path, dimensions)
+            stored: set[int] = set()
+            if records is not None:
+                stored = set(cast(list[int], records["id"].tolist()))
+            new = [
+                i
+                for i, segment_id in enumerate(segment_ids)
+                if segment_id not in stored
+            ]
+            if not new:
+                return
+            rows = self._records(
+                [segment_ids[i] for i in new], [vectors[i] for i in new], dimensions
+            )
+            with path.open("ab") as handle:
+                handle.write(rows.tobytes())
+
+    def _records(
+        self,
+        segment_ids: Sequence[int],
+        vectors: Sequence[Sequence[float]],
+        dimensions: int,
+    ) -> np.ndarray:
+        """Packs segments into rows of an index file."""
+        matrix = np.asarray(vectors, dtype=np.float32)
+        records = np.zeros(
+            len(segment_ids), dtype=record_dtype(dimensions, self._dtype)
+        )
+        records["id"] = segment_ids
+        records["vector"] = matrix
+        stored = records["vector"].astype(np.float32)
+        records["norm"] = np.einsum("ij,ij->i", stored, stored)
+        return records
+
+    def _open(self, path: Path, dimensions: int) -> np.memmap | None:
+        """Maps a file read-only, reusing the mapping while the file is unchanged."""
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        key = (stat.st_ino, stat.st_size)
+        with self._lock:
+            cached = self._maps.get(path)
+            if cached is not None and cached[0] == key:
+                return cached[1]
+            dtype = record_dtype(dimensions, self._dtype)
+            rows = stat.st_size // dtype.itemsize
+            if rows == 0:
+                return None
+            records = np.memmap(path, dtype=dtype, mode="r", shape=(rows,))
+            self._maps[path] = (key, records)
+            return records
+
+    @contextmanager
+    def _exclusive(self, course_id: int) -> Generator[None, None, None]:
+        """Holds a lock on a course's files that also excludes other processes.
+
+        fcntl is imported here so that the module can be imported on hosts without it.
+        """
+        import fcntl
+
+        directory = self._directory / str(course_id)
+        directory.mkdir(parents=True, exist_ok=True)
+        with (directory / ".lock").open("w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
@@ -0,0 +1,102 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Callable, Sequence
+import time
+
+from ucr_chatbot.config import Config
+from ..embedding.cache import normalize_text
+from ..embedding.embedding import embed_text
+
+
+@dataclass
+class QueryCacheStats:
+    """A snapshot of the query embedding cache's counters."""
+
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of lookups that were served from the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class QueryEmbeddingCache:
+    """An in-process, size-bounded LRU cache of prompt embeddings with expiry.
+
+    Prompts are keyed by the embedding model and their normalized text, so
+    students pasting the same question with different spacing share an entry.
+    """
+
+    def __init__(
+        self,
+        max_size: int = Config.QUERY_EMBEDDING_CACHE_SIZE,
+        ttl: float = Config.QUERY_EMBEDDING_CACHE_TTL,
+        embed: Callable[[str, str], Sequence[float]] = embed_text,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Initializes an empty cache.
+
+        :param max_size: The maximal number of cached prompts. Zero disables caching.
+        :param ttl: The number of seconds an entry stays valid.
+        :param embed: The function used to embed prompts that are not cached, given the prompt and model name.
+        :param clock: The time source used for expiry.
+        """
+        self._max_size = max_size
+        self._ttl = ttl
+        self._embed = embed
+        self._clock = clock
+        self._entries: OrderedDict[tuple[str, str], tuple[float, Sequence[float]]] = (
+            OrderedDict()
+        )
+        self._lock = Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, prompt: str, model: str = Config.EMBEDDING_MODEL) -> Sequence[float]:
+        """Returns the embedding of a prompt by the given model, embedding it only on a cache miss."""
+        key = (model, normalize_text(prompt))
+        now = self._clock()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+                self._evictions += 1
+            self._misses += 1
+
+        embedding = self._embed(prompt, model)
+
+        if self._max_size > 0:
+            with self._lock:
+                self._entries[key] = (now + self._ttl, embedding)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self._max_size:
+                    self._entries.popitem(last=False)
+                    self._evictions += 1
+
+        return embedding
+
+    def stats(self) -> QueryCacheStats:
+        """Returns a snapshot of the cache's counters."""
+        with self._lock:
+            return QueryCacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                size=len(self._entries),
+            )
+
+    def clear(self):
+        """Removes every entry from the cache."""
+        with self._lock:
+            self._entries.clear()
@@ -1,24 +1,178 @@
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import Row, Select, and_, func, or_, select, text
+from sqlalchemy.orm import Session, aliased
+from typing import Any, List, Mapping, Sequence, cast
 from dataclasses import dataclass
+import re
+
+import numpy as np
 
 # --- Import from your other project files ---
 # Import the engine and table classes from your database file
-from ...db.models import engine, Segments, Embeddings, Documents
+from ...db.models import (
+    engine,
+    Segments,
+    Embeddings,
+    TEXT_SEARCH_CONFIG,
+    compact_distance,
+    get_course_embedding_model,
+    vector_distance,
+)
+from ucr_chatbot.config import Config, RetrievalMode, VectorBackend, VectorStorage
 
-# Import your embedding function
-from ..embedding.embedding import embed_text
+# Import the cache that embeds prompts
+from .query_cache import QueryEmbeddingCache, QueryCacheStats
+from .mmap_index import MmapVectorIndex
 
 # --- Data Structure for a Segment ---
 
 
 @dataclass
 class RetrievedSegment:
-    """A dataclass to hold the retrieved segment's data."""
+    """A dataclass to hold the retrieved segment's data.
+
+    similarity is the cosine similarity of the segment's embedding to the prompt's,
+    or None if the prompt was not embedded, as in lexical mode. When hits are expanded
+    to their neighbours, text spans every segment of the expanded range.
+    """
 
     id: int
     text: str
     document_id: str
+    similarity: float | None = None
+    page: int | None = None
+    section: str | None = None
+
+
+def reciprocal_rank_fusion[T](
+    rankings: Sequence[Sequence[T]], weights: Sequence[float], k: int = Config.RRF_K
+) -> list[T]:
+    """Merges several rankings of the same kind of items into one.
+
+    Each item scores weight / (k + rank) in every ranking it appears in, with ranks
+    starting at 1, and items are ordered by their total score. Ties keep the order
+    in which the items were first seen.
+
+    :param rankings: The rankings to merge, best item first.
+    :param weights: The weight of each ranking.
+    :param k: Damps the advantage of the top ranks; larger values flatten the scores.
+    :return: Every ranked item, best first.
+    """
+    scores: dict[T, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, item in enumerate(ranking, 1):
+            scores[item] = scores.get(item, 0.0) + weight / (k + rank)
+    return sorted(scores, key=lambda item: scores[item], reverse=True)
+
+
+def cosine_similarities(
+    query: Sequence[float], vectors: Sequence[Sequence[float]]
+) -> list[float]:
+    """Computes the cosine similarity of each vector to query.
+
+    :param query: The embedding of the query.
+    :param vectors: The embeddings to compare with query.
+    :return: The similarity of each vector, from -1 to 1.
+    """
+    if not len(vectors):
+        return []
+    matrix = np.asarray(vectors, dtype=np.float32)
+    query_vector = np.asarray(query, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_vector)
+    return cast(
+        list[float], ((matrix @ query_vector) / np.maximum(norms, 1e-12)).tolist()
+    )
+
+
+def above_cutoff(
+    similarities: Sequence[float],
+    min_similarity: float = Config.RETRIEVAL_MIN_SIMILARITY,
+    max_drop: float = Config.RETRIEVAL_MAX_SIMILARITY_DROP,
+) -> list[int]:
+    """Finds the similarities that are high enough for their segments to be used as context.
+
+    :param similarities: The similarity of each segment to the prompt.
+    :param min_similarity: The lowest similarity kept.
+    :param max_drop: How far below the highest similarity a similarity may be and still be kept.
+    :return: The indices of the similarities kept, in order.
+    """
+    if not similarities:
+        return []
+    floor = max(min_similarity, max(similarities) - max_drop)
+    return [i for i, similarity in enumerate(similarities) if similarity >= floor]
+
+
+def maximal_marginal_relevance(
+    query: Sequence[float],
+    candidates: Sequence[Sequence[float]],
+    k: int,
+    mmr_lambda: float = Config.MMR_LAMBDA,
+) -> list[int]:
+    """Picks candidates that are close to a query but not to each other.
+
+    Candidates are picked one at a time, each time taking the one with the highest
+    mmr_lambda * sim(query, c) - (1 - mmr_lambda) * max sim(c, picked), where sim is
+    the cosine similarity.
+
+    :param query: The embedding of the query.
+    :param candidates: The embeddings of the candidates.
+    :param k: The number of candidates to pick.
+    :param mmr_lambda: Trades relevance, at 1, for diversity, at 0.
+    :return: The indices of the picked candidates, in the order they were picked.
+    """
+    if not len(candidates) or k < 1:
+        return []
+    matrix = np.asarray(candidates, dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    query_vector = np.asarray(query, dtype=np.float32)
+    query_vector /= max(float(np.linalg.norm(query_vector)), 1e-12)
+
+    relevance = mmr_lambda * (matrix @ query_vector)
+    redundancy = np.zeros(len(matrix), dtype=np.float32)
+    available = np.ones(len(matrix), dtype=bool)
+    picked: list[int] = []
+    while len(picked) < min(k, len(matrix)):
+        scores = relevance - (1 - mmr_lambda) * redundancy
+        best = int(np.argmax(np.where(available, scores, -np.inf)))
+        picked.append(best)
+        available[best] = False
+        similarity = matrix @ matrix[best]
+        redundancy = (
+            similarity if len(picked) == 1 else np.maximum(redundancy, similarity)
+        )
+    return picked
+
+
+def _with_vectors(
+    rows: Sequence[Row[Segments, Any]], vectors: dict[int, Sequence[float]]
+) -> list[Segments]:
+    """Splits rows of a segment and its embedding, recording each embedding by segment id."""
+    segments: list[Segments] = []
+    for segment, vector in cast(Sequence[tuple[Segments, Sequence[float]]], rows):
+        vectors[int(getattr(segment, "id"))] = vector
+        segments.append(segment)
+    return segments
+
+
+STOP_WORDS = frozenset(
+    """a about above after again against all am an and any are as at be because been
+    before being below between both but by can could did do does doing down during each
+    few for from further had has have having he her here hers herself him himself his how
+    i if in into is it its itself just me more most my myself no nor not now of off on once
+    only or other our ours ourselves out over own same she should so some such than that
+    the their theirs them themselves then there these they this those through to too under
+    until up very was we were what when where which while who whom why will with would you
+    your yours yourself yourselves""".split()
+)
+"""Words too common to tell segments apart in full-text search."""
+
+
+def _is_identifier(word: str) -> bool:
+    """Returns whether a word looks like a code identifier or error code, not prose."""
+    return (
+        "_" in word
+        or any(character.isdigit() for character in word)
+        or word[1:] != word[1:].lower()
+    )
 
 
 # --- Retriever Implementation ---
@@ -26,9 +180,73 @@ class RetrievedSegment:
 
 class Retriever:
     """
-    Retrieves relevant text segments from the database using vector search.
+    Retrieves relevant text segments from the database using vector search,
+    full-text search, or both merged by reciprocal rank fusion, then re-ranks them
+    by maximal marginal relevance so that near-duplicates do not crowd out other context.
     """
 
+    def __init__(
+        self,
+        query_cache: QueryEmbeddingCache | None = None,
+        storage: VectorStorage = Config.VECTOR_STORAGE,
+        candidate_factor: int = Config.RERANK_CANDIDATE_FACTOR,
+        mode: RetrievalMode = Config.RETRIEVAL_MODE,
+        vector_weight: float = Config.HYBRID_VECTOR_WEIGHT,
+        lexical_weight: float = Config.HYBRID_LEXICAL_WEIGHT,
+        hybrid_candidate_factor: int = Config.HYBRID_CANDIDATE_FACTOR,
+        backend: VectorBackend = Config.VECTOR_BACKEND,
+        vector_index: MmapVectorIndex | None = None,
+        mmr_lambda: float = Config.MMR_LAMBDA,
+        mmr_candidate_pool: int = Config.MMR_CANDIDATE_POOL,
+        min_similarity: float = Config.RETRIEVAL_MIN_SIMILARITY,
+        max_similarity_drop: float = Config.RETRIEVAL_MAX_SIMILARITY_DROP,
+        neighbours: int = Config.NEIGHBOUR_EXPANSION,
+    ):
+        """Initializes a Retriever.
+
+        :param query_cache: The cache through which prompts are embedded, or None for a new cache.
+        :param storage: The representation in which the embedding index holds vectors.
+        :param candidate_factor: With a compact storage, how many candidates per requested
+            segment are fetched from the index before they are re-ranked exactly.
+        :param mode: Whether segments are found by vector search, full-text search, or both.
+        :param vector_weight: In hybrid mode, the weight of the vector search ranking.
+        :param lexical_weight: In hybrid mode, the weight of the full-text search ranking.
+        :param hybrid_candidate_factor: In hybrid mode, how many segments per requested
+            segment each search ranks before the rankings are merged.
+        :param backend: Whether the vector search runs in Postgres or over memory-mapped files.
+        :param vector_index: With the mmap backend, the index searched, or None for a new one.
+        :param mmr_lambda: Trades relevance, at 1, for diversity, at 0, when the retrieved
+            segments are re-ranked by maximal marginal relevance. At 1 they are not re-ranked,
+            nor are they in lexical mode, where the prompt is not embedded.
+        :param mmr_candidate_pool: How many of the best segments are re-ranked.
+        :param min_similarity: Segments whose cosine similarity to the prompt is lower are
+            not returned. Not applied in lexical mode.
+        :param max_similarity_drop: Segments whose similarity is lower than the best
+            segment's by more than this are not returned. Not applied in lexical mode.
+        :param neighbours: How many segments before and after each retrieved segment in its
+            document are returned with it. Retrieved segments whose ranges overlap or touch
+            are merged.
+        """
+        self._query_cache = query_cache or QueryEmbeddingCache()
+        self._storage = storage
+        self._candidate_factor = candidate_factor
+        self._mode = mode
+        self._weights = (vector_weight, lexical_weight)
+        self._hybrid_candidate_factor = hybrid_candidate_factor
+        self._backend = backend
+        self._vector_index = vector_index
+        self._mmr_lambda = mmr_lambda
+        self._mmr_candidate_pool = mmr_candidate_pool
+        self._min_similarity = min_similarity
+        self._max_similarity_drop = max_similarity_drop
+        self._neighbours = neighbours
+        if backend == VectorBackend.MMAP and vector_index is None:
+            self._vector_index = MmapVectorIndex()
+
+    def query_cache_stats(self) -> QueryCacheStats:
+        """Returns the hit and miss counts of this Retriever's prompt embedding cache."""
+        return self._query_cache.stats()
+
     def get_segments_for(
         self,
         prompt: str,
@@ -36,41 +254,335 @@ class Retriever:
         num_segments: int = 3,
     ) -> List[RetrievedSegment]:
         """
-        Gets relevant segments from the database by performing a vector similarity search.
+        Gets relevant segments from the database by performing a vector similarity search,
+        a full-text search, or both, depending on the Retriever's mode. Unless the mode is
+        lexical, candidates that are not similar enough to the prompt are dropped, so fewer
+        than num_segments may be returned, and the rest are re-ranked by maximal marginal
+        relevance.
 
         :param prompt: The user's prompt for which to find context.
         :param num_segments: The number of segments to retrieve.
-        :return: A list of RetrievedSegment objects.
+        :return: A list of RetrievedSegment objects, most relevant first.
         """
-        # 1. Embed the user's prompt into a vector.
-        prompt_embedding = embed_text(prompt)
+        model = get_course_embedding_model(course_id)
+        diversify = self._mode != RetrievalMode.LEXICAL and self._mmr_lambda < 1
+        pool = (
+            max(num_segments, self._mmr_candidate_pool) if diversify else num_segments
+        )
+        depth = pool
+        if self._mode == RetrievalMode.HYBRID:
+            depth *= self._hybrid_candidate_factor
 
-        # 2. Use a SQLAlchemy session to query the database.
+        # 1. Use a SQLAlchemy session to query the database.
         with Session(engine) as session:
-            # 3. Build the query using the ORM.
-            # This query joins Segments and Embeddings, orders the results by how
-            # close their vectors are to the prompt's vector, and takes the top results.
-            results = (
-                session.query(Segments)
-                .join(Embeddings)
-                .join(Documents)
-                .filter(Documents.course_id == course_id)
-                .order_by(Embeddings.vector.l2_distance(prompt_embedding))
-                .limit(num_segments)
-                .all()
+            rankings: list[list[Segments]] = []
+            vectors: dict[int, Sequence[float]] = {}
+            prompt_embedding: Sequence[float] = []
+            if self._mode != RetrievalMode.LEXICAL:
+                # 2. Embed the user's prompt into a vector with the model that embedded the
+                # course's documents, reusing a cached embedding for repeated prompts.
+                prompt_embedding = self._query_cache.get(prompt, model)
+
+                if self._vector_index is not None:
+                    rows: Sequence[Row[Segments, Any]] = self._search_vector_index(
+                        session, prompt_embedding, course_id, model, depth
+                    )
+                else:
+                    # 3. Let the index return enough candidates for the re-ranking stage.
+                    if self._storage != VectorStorage.FLOAT32:
+                        session.execute(
+                            text(
+                                "SELECT set_config('hnsw.ef_search', greatest(coalesce("
+                                "current_setting('hnsw.ef_search', true), '0')::int, :n)::text, true)"
+                            ),
+                            {"n": depth * self._candidate_factor},
+                        )
+                    rows = session.execute(
+                        self.search_query(prompt_embedding, course_id, model, depth)
+                    ).all()
+                rankings.append(_with_vectors(rows, vectors))
+            if self._mode != RetrievalMode.VECTOR:
+                lexical_query = self.lexical_query(prompt, course_id, model, depth)
+                rows = (
+                    session.execute(lexical_query).all()
+                    if lexical_query is not None
+                    else []
+                )
+                rankings.append(_with_vectors(rows, vectors))
+
+            # The session's identity map gives a segment found by both searches one object.
+            if self._mode == RetrievalMode.HYBRID:
+                candidates = reciprocal_rank_fusion(rankings, self._weights)[:pool]
+            else:
+                candidates = rankings[0]
+
+            # 4. Drop the candidates that are not similar enough to the prompt to help.
+            similarities: dict[int, float] = {}
+            if self._mode != RetrievalMode.LEXICAL:
+                candidate_ids = [int(getattr(segment, "id")) for segment in candidates]
+                similarities = dict(
+                    zip(
+                        candidate_ids,
+                        cosine_similarities(
+                            prompt_embedding, [vectors[i] for i in candidate_ids]
+                        ),
+                    )
+                )
+                kept = above_cutoff(
+                    [similarities[i] for i in candidate_ids],
+                    self._min_similarity,
+                    self._max_similarity_drop,
+                )
+                candidates = [candidates[i] for i in kept]
+
+            # 5. Pass over candidates that mostly repeat better ones, such as the overlapping
+            # neighbours of a chunk, using the vectors the searches already fetched.
+            if diversify:
+                picked = maximal_marginal_relevance(
+                    prompt_embedding,
+                    [vectors[int(getattr(segment, "id"))] for segment in candidates],
+                    num_segments,
+                    self._mmr_lambda,
+                )
+                results = [candidates[i] for i in picked]
+            else:
+                results = candidates[:num_segments]
+
+            # 6. Format the SQLAlchemy objects into simple data objects, widening each
+            # to its neighbours if asked to.
+            if self._neighbours > 0:
+                retrieved_segments = self._expand_neighbours(
+                    session, results, similarities
+                )
+            else:
+                retrieved_segments = [
+                    RetrievedSegment(
+                        id=segment.id,  # type: ignore
+                        text=segment.text,  # type: ignore
+                        document_id=segment.document_id,  # type: ignore
+                        similarity=similarities.get(int(getattr(segment, "id"))),
+                        page=segment.page,  # type: ignore
+                        section=segment.section,  # type: ignore
+                    )
+                    for segment in results
+                ]
+
+        return retrieved_segments
+
+    def _expand_neighbours(
+        self,
+        session: Session,
+        hits: Sequence[Segments],
+        similarities: Mapping[int, float],
+    ) -> list[RetrievedSegment]:
+        """Widens each hit to the segments around it in its document with one indexed query.
+        Hits whose ranges overlap or touch become one segment, which keeps the id, similarity,
+        and rank of the best of them.
+        """
+        # Each span is [document_id, first ordinal, last ordinal, best hit], in rank order.
+        spans: list[list[Any]] = []
+        for hit in hits:
+            ordinal = cast(int | None, getattr(hit, "ordinal"))
+            if ordinal is None:
+                spans.append([hit.document_id, None, None, hit])
+                continue
+            span = [
+                hit.document_id,
+                ordinal - self._neighbours,
+                ordinal + self._neighbours,
+                hit,
+            ]
+            touching = [
+                other
+                for other in spans
+                if other[0] == span[0]
+                and other[1] is not None
+                and other[1] <= span[2] + 1
+                and span[1] <= other[2] + 1
+            ]
+            if not touching:
+                spans.append(span)
+                continue
+            # The first touching span ranks best, so the others are merged into it.
+            kept = touching[0]
+            for other in touching:
+                kept[1] = min(kept[1], other[1], span[1])
+                kept[2] = max(kept[2], other[2], span[2])
+            spans = [
+                other
+                for other in spans
+                if other is kept or all(other is not merged for merged in touching)
+            ]
+
+        ranges = [
+            and_(
+                Segments.document_id == document_id,
+                Segments.ordinal.between(first, last),
             )
+            for document_id, first, last, _ in spans
+            if first is not None
+        ]
+        neighbours: dict[str, list[Segments]] = {}
+        if ranges:
+            for segment in session.scalars(
+                select(Segments)
+                .where(Segments.is_active)
+                .where(or_(*ranges))
+                .order_by(Segments.document_id, Segments.ordinal)
+            ):
+                neighbours.setdefault(str(segment.document_id), []).append(segment)
 
-            # 4. Format the SQLAlchemy objects into simple data objects.
-            retrieved_segments = [
+        expanded: list[RetrievedSegment] = []
+        for document_id, first, last, hit in spans:
+            hit_id = int(getattr(hit, "id"))
+            around = [
+                segment
+                for segment in neighbours.get(document_id, [])
+                if first is not None and first <= getattr(segment, "ordinal") <= last
+            ] or [hit]
+            expanded.append(
                 RetrievedSegment(
-                    id=segment.id,  # type: ignore
-                    text=segment.text,  # type: ignore
-                    document_id=segment.document_id,  # type: ignore
+                    id=hit_id,
+                    text="\n".join(str(segment.text) for segment in around),
+                    document_id=document_id,
+                    similarity=similarities.get(hit_id),
+                    page=getattr(around[0], "page"),
+                    section=getattr(around[0], "section"),
                 )
-                for segment in results
-            ]
+            )
+        return expanded
 
-        return retrieved_segments
+    def _search_vector_index(
+        self,
+        session: Session,
+        embedding: Sequence[float],
+        course_id: int,
+        model: str,
+        num_segments: int,
+    ) -> list[Row[Segments, Any]]:
+        """Finds the closest segments in the memory-mapped index, then loads them and their
+        vectors by primary key. Segments deactivated since the course's file was written
+        are dropped.
+        """
+        assert self._vector_index is not None
+        segment_ids = [
+            segment_id
+            for segment_id, _ in self._vector_index.search(
+                course_id, model, embedding, num_segments
+            )
+        ]
+        rows = {
+            int(getattr(row[0], "id")): row
+            for row in session.execute(
+                select(Segments, Embeddings.vector)
+                .join(Embeddings)
+                .where(Segments.id.in_(segment_ids))
+                .where(Embeddings.model == model)
+                .where(Embeddings.is_active)
+            )
+        }
+        return [rows[i] for i in segment_ids if i in rows]
+
+    def search_query(
+        self,
+        embedding: Sequence[float],
+        course_id: int,
+        model: str,
+        num_segments: int,
+    ) -> Select[Segments, Any]:
+        """
+        Builds the query for the segments of a course whose embeddings by model are closest to embedding.
+
+        With float32 storage the index is searched directly. With a compact storage the
+        index returns num_segments * candidate_factor candidates, which are then re-ranked
+        by their exact distance to embedding.
+
+        :param embedding: The embedding of the prompt.
+        :param course_id: The id of the course whose segments are searched.
+        :param model: The name of the model that produced embedding.
+        :param num_segments: The number of segments to retrieve.
+        :return: A query selecting Segments and their embeddings, closest first.
+        """
+        # This query joins Segments and the course model's Embeddings, orders the results
+        # by how close their vectors are to the prompt's vector, and takes the top results.
+        # The course and active filters read columns of Embeddings itself, so that the
+        # planner can apply them inside the index scan instead of after it.
+        course_segments = (
+            select(Segments, Embeddings.vector)
+            .join(Embeddings)
+            .where(Embeddings.course_id == course_id)
+            .where(Embeddings.is_active)
+            .where(Embeddings.model == model)
+        )
+        if self._storage == VectorStorage.FLOAT32:
+            return course_segments.order_by(vector_distance(embedding)).limit(
+                num_segments
+            )
+
+        candidates = (
+            course_segments.order_by(compact_distance(embedding, self._storage))
+            .limit(num_segments * self._candidate_factor)
+            .subquery()
+        )
+        candidate_segment = aliased(Segments, candidates)
+        return (
+            select(candidate_segment, candidates.c.vector)
+            .order_by(candidates.c.vector.op("<->")(embedding))
+            .limit(num_segments)
+        )
+
+    def lexical_query(
+        self,
+        prompt: str,
+        course_id: int,
+        model: str,
+        num_segments: int,
+    ) -> Select[Segments, Any] | None:
+        """
+        Builds the full-text query for the segments of a course that share words with prompt.
+
+        Stop words are dropped, since nearly every segment contains them. If the prompt
+        has identifier-like words (with an underscore, a digit, or an inner capital, as in
+        my_func, errno2 or getValue), only segments containing all of them match;
+        otherwise segments containing any word match. Matches are ranked by ts_rank_cd over
+        all the remaining words, so that exact identifiers and error strings are found even
+        when their embeddings are not close. Only segments with an embedding by model are
+        searched, as in search_query.
+
+        :param prompt: The user's prompt.
+        :param course_id: The id of the course whose segments are searched.
+        :param model: The name of the embedding model serving the course.
+        :param num_segments: The number of segments to retrieve.
+        :return: A query selecting Segments and their embeddings, best match first, or None
+            if prompt has no words but stop words.
+        """
+        words = [
+            word
+            for word in re.findall(r"\w+", prompt)
+            if word.lower() not in STOP_WORDS
+        ]
+        if not words:
+            return None
+        identifiers = dict.fromkeys(
+            word.lower() for word in words if _is_identifier(word)
+        )
+        terms = dict.fromkeys(word.lower() for word in words)
+        rank_query = func.to_tsquery(TEXT_SEARCH_CONFIG, " | ".join(terms))
+        match_query = (
+            func.to_tsquery(TEXT_SEARCH_CONFIG, " & ".join(identifiers))
+            if identifiers
+            else rank_query
+        )
+        return (
+            select(Segments, Embeddings.vector)
+            .join(Embeddings)
+            .where(Embeddings.course_id == course_id)
+            .where(Embeddings.is_active)
+            .where(Embeddings.model == model)
+            .where(Segments.search_vector.bool_op("@@")(match_query))
+            .order_by(func.ts_rank_cd(Segments.search_vector, rank_query).desc())
+            .limit(num_segments)
+        )
 
 
 # Create a single, global instance for the rest of the app to use
@@ -1,5 +1,6 @@
 "Functionality for embedding text as a vector"
 
-__all__ = ["embed_text"]
+__all__ = ["embed_text", "embed_texts", "embed_texts_cached"]
 
-from .embedding import embed_text
+from .embedding import embed_text, embed_texts
+from .cache import embed_texts_cached
@@ -0,0 +1,91 @@
+from dataclasses import dataclass
+from hashlib import sha256
+from threading import Lock
+from typing import Callable, Sequence
+import unicodedata
+
+from ucr_chatbot.config import Config
+from ucr_chatbot.db.models import (
+    get_cached_embeddings,
+    store_cached_embeddings,
+    evict_embedding_cache,
+)
+from .embedding import embed_texts
+
+
+@dataclass
+class EmbeddingCacheStats:
+    """Counts of embedding cache lookups made by this process."""
+
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of lookups that were served from the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+_stats = EmbeddingCacheStats()
+_stats_lock = Lock()
+
+
+def normalize_text(text: str) -> str:
+    """Normalizes text so that trivially different copies share a cache entry.
+
+    Applies Unicode NFC normalization and collapses all runs of whitespace.
+
+    :param text: The text to normalize.
+    :return: The normalized text.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def text_hash(text: str) -> str:
+    """Computes the SHA-256 hex digest of the normalized text."""
+    return sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def cache_stats() -> EmbeddingCacheStats:
+    """Returns a snapshot of this process's embedding cache counters."""
+    with _stats_lock:
+        return EmbeddingCacheStats(hits=_stats.hits, misses=_stats.misses)
+
+
+def embed_texts_cached(
+    texts: Sequence[str],
+    embed: Callable[[Sequence[str]], list[Sequence[float]]] = embed_texts,
+    model: str = Config.EMBEDDING_MODEL,
+) -> list[Sequence[float]]:
+    """Embeds texts, reusing any embedding already stored in the embedding cache.
+
+    Only texts missing from the cache are passed to ``embed``, each distinct
+    text once. New embeddings are written back to the cache, after which the
+    cache is trimmed to ``EMBEDDING_CACHE_MAX_ROWS`` entries.
+
+    :param texts: The texts to be embedded.
+    :param embed: The function used to embed texts that are not cached.
+    :param model: The name of the model whose embeddings are looked up.
+    :return: One embedding per input text, in the same order as ``texts``.
+    """
+    hashes = [text_hash(text) for text in texts]
+    found = get_cached_embeddings(model, list(set(hashes)))
+
+    missing: dict[str, str] = {}
+    for text, hashed in zip(texts, hashes):
+        if hashed not in found and hashed not in missing:
+            missing[hashed] = text
+
+    misses = sum(1 for hashed in hashes if hashed not in found)
+    with _stats_lock:
+        _stats.hits += len(hashes) - misses
+        _stats.misses += misses
+
+    if missing:
+        new_embeddings = dict(zip(missing, embed(list(missing.values()))))
+        store_cached_embeddings(model, new_embeddings)
+        evict_embedding_cache(Config.EMBEDDING_CACHE_MAX_ROWS)
+        found.update(new_embeddings)
+
+    return [found[hashed] for hashed in hashes]
@@ -1,31 +1,100 @@
 from typing import Sequence
-from ollama import Client
-from ucr_chatbot.config import Config, LLMMode
+from ollama import ResponseError
+from ucr_chatbot.config import Config, EmbeddingBackend, hashing_model_dimensions
+from ..ollama_transport import ollama_client
+from .hashing import hashing_embed
 
-if Config.LLM_MODE == LLMMode.TESTING:
+if Config.EMBEDDING_BACKEND == EmbeddingBackend.HASHING:
     client = None
 else:
     try:
-        client = Client(host=Config.OLLAMA_URL)
+        client = ollama_client(Config.OLLAMA_EMBED_TIMEOUT)
     except Exception as e:
         raise ConnectionError(
             f"Could not connect to Ollama at {Config.OLLAMA_URL}"
         ) from e
 
 
-def embed_text(text: str) -> Sequence[float]:
+def embed_text(text: str, model: str = Config.EMBEDDING_MODEL) -> Sequence[float]:
     """Embeds a string of text into a vector representation.
 
     :param text: The text to be embedded.
+    :param model: The name of the Ollama embedding model to use.
     :return: A list of floats representing the vector embedding.
     """
-    global client
+    return embed_texts([text], model=model)[0]
 
+
+def embed_texts(
+    texts: Sequence[str],
+    batch_size: int = Config.EMBEDDING_BATCH_SIZE,
+    max_batch_chars: int = Config.EMBEDDING_BATCH_MAX_CHARS,
+    model: str = Config.EMBEDDING_MODEL,
+) -> list[Sequence[float]]:
+    """Embeds many strings of text, sending them to Ollama in batches.
+
+    A batch is closed once it holds ``batch_size`` texts or once adding another
+    text would push it past ``max_batch_chars`` characters. Batches that Ollama
+    still rejects are split in half and retried.
+
+    :param texts: The texts to be embedded.
+    :param batch_size: The maximal number of texts sent in a single request.
+    :param max_batch_chars: The maximal total number of characters sent in a single request.
+    :param model: The name of the Ollama embedding model to use.
+    :return: One embedding per input text, in the same order as ``texts``.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1.")
+
+    embeddings: list[Sequence[float]] = []
+    batch: list[str] = []
+    batch_chars = 0
+    for text in texts:
+        if batch and (
+            len(batch) >= batch_size or batch_chars + len(text) > max_batch_chars
+        ):
+            embeddings.extend(_embed_batch(batch, model))
+            batch = []
+            batch_chars = 0
+        batch.append(text)
+        batch_chars += len(text)
+    if batch:
+        embeddings.extend(_embed_batch(batch, model))
+
+    return embeddings
+
+
+def _embed_batch(batch: list[str], model: str) -> list[Sequence[float]]:
+    """Embeds a single batch with one request, halving the batch if Ollama rejects it as
+    too long or too large. Other errors are raised for the caller to retry.
+
+    :param batch: The texts to be embedded together.
+    :param model: The name of the Ollama embedding model to use.
+    :return: One embedding per text in ``batch``, in order.
+    :raises ValueError: If the hashing backend is asked for another model's embeddings.
+    """
     if client is None:
-        return [0.1, 0.2, 0.3, 0.4, 0.5] * 20
+        dimensions = hashing_model_dimensions(model)
+        if dimensions is None:
+            raise ValueError(
+                f"The hashing embedding backend cannot embed with model '{model}'."
+            )
+        return [hashing_embed(text, dimensions) for text in batch]
 
-    response = client.embeddings(model="nomic-embed-text", prompt=text)  # type: ignore
-    embedding = response["embedding"]
-    embed = list(embedding)
+    try:
+        response = client.embed(model=model, input=batch)
+    except ResponseError as e:
+        # 400 is a context length error and 413 a payload that is too large.
+        if len(batch) == 1 or e.status_code not in (400, 413):
+            raise
+        middle = len(batch) // 2
+        return _embed_batch(batch[:middle], model) + _embed_batch(batch[middle:], model)
 
-    return embed
+    embeddings: list[Sequence[float]] = [
+        list(embedding) for embedding in response["embeddings"]
+    ]
+    if len(embeddings) != len(batch):
+        raise ValueError(
+            f"Expected {len(batch)} embeddings from Ollama but received {len(embeddings)}."
+        )
+    return embeddings
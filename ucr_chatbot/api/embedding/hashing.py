@@ -0,0 +1,53 @@
+from collections import Counter
+from hashlib import blake2b
+import math
+import re
+
+from ucr_chatbot.config import Config
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+
+_STOP_WORDS = frozenset(
+    """a an and are as at be by can do for from has have how i if in is it its of
+    on or so that the their then there these this to was we what when where which
+    who why will with you your""".split()
+)
+
+_BIGRAM_WEIGHT = 0.5
+
+
+def hashing_embed(
+    text: str, dimensions: int = Config.EMBEDDING_DIMENSIONS
+) -> list[float]:
+    """Embeds text locally by hashing its word unigrams and bigrams into a fixed-size vector.
+
+    Each feature is hashed to one coordinate with a pseudo-random sign, weighted
+    by a sublinear term frequency, and the result is scaled to unit length.
+    Texts sharing vocabulary therefore end up close together, the output is
+    identical across processes and machines, and no network is needed.
+
+    :param text: The text to be embedded.
+    :param dimensions: The length of the returned vector.
+    :return: A unit-length vector, or the zero vector if text has no words.
+    """
+    tokens = _TOKEN_PATTERN.findall(text.lower())
+
+    features: Counter[tuple[str, float]] = Counter()
+    for token in tokens:
+        if token not in _STOP_WORDS:
+            features[(token, 1.0)] += 1
+    for first, second in zip(tokens, tokens[1:]):
+        features[(f"{first} {second}", _BIGRAM_WEIGHT)] += 1
+
+    vector = [0.0] * dimensions
+    for (feature, weight), count in features.items():
+        value = int.from_bytes(
+            blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little"
+        )
+        sign = 1.0 if value >> 63 else -1.0
+        vector[value % dimensions] += sign * weight * (1.0 + math.log(count))
+
+    norm = math.sqrt(sum(component * component for component in vector))
+    if norm == 0.0:
+        return vector
+    return [component / norm for component in vector]
@@ -0,0 +1,101 @@
+from functools import partial
+from typing import Callable, Sequence
+
+from ucr_chatbot.config import Config
+from ucr_chatbot.db.models import (
+    delete_course_embeddings,
+    get_segments_missing_embedding,
+    store_embeddings,
+    switch_course_embedding_model,
+)
+from .cache import embed_texts_cached
+from .embedding import embed_texts
+
+
+def backfill_course_embeddings(
+    course_id: int,
+    model: str,
+    batch_size: int = Config.EMBEDDING_BATCH_SIZE,
+    embed: Callable[[Sequence[str]], list[Sequence[float]]] | None = None,
+    on_progress: Callable[[int], None] | None = None,
+) -> int:
+    """Embeds every segment of a course that has no embedding by model yet.
+
+    Segments are taken in id order, one batch at a time, and each batch is
+    stored with one multi-row INSERT and committed before the next is fetched. An interrupted backfill therefore
+    resumes where it stopped when run again.
+
+    :param course_id: The id of the course.
+    :param model: The name of the embedding model.
+    :param batch_size: The number of segments embedded and stored per batch.
+    :param embed: The function used to embed texts that are not cached yet.
+    :param on_progress: Called with the running total after each batch.
+    :return: The number of segments embedded.
+    """
+    embed = embed or partial(embed_texts, model=model)
+    embedded = 0
+    while batch := get_segments_missing_embedding(course_id, model, batch_size):
+        segment_ids = [segment_id for segment_id, _ in batch]
+        vectors = embed_texts_cached([text for _, text in batch], embed, model)
+        store_embeddings(segment_ids, vectors, model)
+        embedded += len(batch)
+        if on_progress is not None:
+            on_progress(embedded)
+    return embedded
+
+
+def reembed_course(
+    course_id: int,
+    model: str,
+    batch_size: int = Config.EMBEDDING_BATCH_SIZE,
+    keep_old: bool = False,
+    embed: Callable[[Sequence[str]], list[Sequence[float]]] | None = None,
+    before_cutover: Callable[[], None] | None = None,
+    on_progress: Callable[[int], None] | None = None,
+) -> int:
+    """Moves a course's retrieval to a new embedding model without downtime.
+
+    The new vectors are written next to the old ones while queries keep using
+    the old model. Segments uploaded meanwhile are caught up, and the last ones
+    are embedded in the same transaction that switches the course to the new
+    model, with ingestion into the course held off, so that no segment is left
+    without a new vector once queries use it. The old vectors are then deleted
+    unless keep_old is set.
+
+    :param course_id: The id of the course.
+    :param model: The name of the embedding model to move to.
+    :param batch_size: The number of segments embedded and stored per batch.
+    :param keep_old: If True, the embeddings by previous models are kept.
+    :param embed: The function used to embed texts that are not cached yet.
+    :param before_cutover: Called after the backfill and before the switch, e.g. to build the model's index.
+    :param on_progress: Called with the running total after each batch.
+    :return: The number of segments embedded.
+    """
+    embedded = backfill_course_embeddings(
+        course_id, model, batch_size, embed, on_progress
+    )
+    if before_cutover is not None:
+        before_cutover()
+
+    # Catching up outside the switch leaves it few segments to embed while it holds the lock.
+    caught_up = embedded
+    embedded += backfill_course_embeddings(
+        course_id,
+        model,
+        batch_size,
+        embed,
+        None if on_progress is None else lambda count: on_progress(caught_up + count),
+    )
+    embed = embed or partial(embed_texts, model=model)
+    switched = switch_course_embedding_model(
+        course_id,
+        model,
+        partial(embed_texts_cached, embed=embed, model=model),
+    )
+    if switched:
+        embedded += switched
+        if on_progress is not None:
+            on_progress(embedded)
+    if not keep_old:
+        delete_course_embeddings(course_id, keep_model=model)
+    return embedded
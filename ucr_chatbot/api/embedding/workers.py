@@ -0,0 +1,120 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import BoundedSemaphore, Event
+from typing import Callable, Iterable, Sequence
+import time
+
+import httpx
+from ollama import ResponseError
+
+from ucr_chatbot.config import Config
+from .embedding import embed_texts
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Decides whether a failed embedding request is worth retrying.
+
+    Network failures, timeouts, rate limiting, and server-side errors are
+    transient. Anything else, such as an unknown model, is not.
+    """
+    if isinstance(error, ResponseError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError))
+
+
+class EmbeddingWorkerPool:
+    """Embeds texts with a bounded number of concurrent requests.
+
+    Texts are grouped into batches, and each batch is embedded on a worker
+    thread. At most ``max_in_flight`` batches may be queued or running at once;
+    once that limit is reached, reading further texts blocks until a batch
+    finishes, so a slow embedding server throttles the producer instead of
+    letting work pile up in memory.
+    """
+
+    def __init__(
+        self,
+        workers: int = Config.EMBEDDING_WORKERS,
+        max_in_flight: int = Config.EMBEDDING_MAX_IN_FLIGHT,
+        retries: int = Config.EMBEDDING_RETRIES,
+        batch_size: int = Config.EMBEDDING_BATCH_SIZE,
+        embed: Callable[[Sequence[str]], list[Sequence[float]]] = embed_texts,
+        backoff: float = 0.5,
+    ):
+        """Initializes the pool.
+
+        :param workers: The number of threads sending embedding requests.
+        :param max_in_flight: The maximal number of batches queued or running at once.
+        :param retries: How many times a batch is retried after a transient error.
+        :param batch_size: The number of texts embedded per batch.
+        :param embed: The function used to embed a single batch.
+        :param backoff: The delay in seconds before the first retry, doubled on each later retry.
+        """
+        if workers < 1 or max_in_flight < 1 or batch_size < 1:
+            raise ValueError(
+                "workers, max_in_flight, and batch_size must be at least 1."
+            )
+        self._workers = workers
+        self._max_in_flight = max_in_flight
+        self._retries = retries
+        self._batch_size = batch_size
+        self._embed = embed
+        self._backoff = backoff
+
+    def embed(self, texts: Iterable[str]) -> list[Sequence[float]]:
+        """Embeds texts concurrently.
+
+        :param texts: The texts to be embedded. May be a lazy iterable, which is consumed as capacity frees up.
+        :raises Exception: The error of the first batch that could not be embedded.
+        :return: One embedding per input text, in the same order as ``texts``.
+        """
+        in_flight = BoundedSemaphore(self._max_in_flight)
+        failed = Event()
+        futures: list[Future[list[Sequence[float]]]] = []
+
+        def on_done(future: Future[list[Sequence[float]]]):
+            in_flight.release()
+            if not future.cancelled() and future.exception() is not None:
+                failed.set()
+
+        embeddings: list[Sequence[float]] = []
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            try:
+                for batch in self._batches(texts):
+                    if failed.is_set():
+                        break
+                    in_flight.acquire()
+                    future = executor.submit(self._embed_with_retries, batch)
+                    future.add_done_callback(on_done)
+                    futures.append(future)
+
+                for future in futures:
+                    embeddings.extend(future.result())
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+        return embeddings
+
+    def _batches(self, texts: Iterable[str]) -> Iterable[list[str]]:
+        """Groups texts into lists of at most batch_size texts."""
+        batch: list[str] = []
+        for text in texts:
+            batch.append(text)
+            if len(batch) >= self._batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _embed_with_retries(self, batch: list[str]) -> list[Sequence[float]]:
+        """Embeds one batch, retrying transient failures with exponential backoff."""
+        attempt = 0
+        while True:
+            try:
+                return self._embed(batch)
+            except Exception as e:
+                if attempt >= self._retries or not is_transient_error(e):
+                    raise
+                time.sleep(self._backoff * 2**attempt)
+                attempt += 1
@@ -1,4 +1,16 @@
 """Contains functions for converting files into plain text."""
 
-__all__ = ["parse_file"]
-from .file_parsing import parse_file
+__all__ = [
+    "ParsedSegment",
+    "iter_document",
+    "iter_file",
+    "parse_document",
+    "parse_file",
+]
+from .file_parsing import (
+    ParsedSegment,
+    iter_document,
+    iter_file,
+    parse_document,
+    parse_file,
+)
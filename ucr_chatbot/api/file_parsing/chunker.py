@@ -0,0 +1,183 @@
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+import re
+
+SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+|\n[^\S\n]*\n\s*")
+"""Matches the end of a sentence, with the whitespace after it, or a blank line."""
+
+_WORD = re.compile(r"\S+\s*|\s+")
+
+
+@dataclass
+class Sentence:
+    """A sentence of a text and the offset in the text at which it starts."""
+
+    text: str
+    start: int
+
+
+@dataclass
+class Chunk:
+    """A run of whole sentences of a text and the offset in the text at which it starts."""
+
+    text: str
+    start: int
+
+
+class Chunker:
+    """Splits text into sentences and packs them into chunks of a bounded size.
+
+    Each chunk holds as many whole sentences as fit in max_size, and starts with the
+    last overlap sentences of the chunk before it where they fit. A sentence larger
+    than max_size is cut between words, or within a word longer than max_size.
+    Every step looks at each character a constant number of times, so chunking takes
+    time linear in the length of the text, and only the sentences of the chunk being
+    filled are held in memory.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        overlap: int = 0,
+        measure: Callable[[str], int] = len,
+        boundary: re.Pattern[str] = SENTENCE_END,
+    ):
+        """Initializes a Chunker.
+
+        :param max_size: The largest size of a chunk, as given by measure.
+        :param overlap: The number of sentences that a chunk repeats from the one before it.
+        :param measure: Gets the size of a text, such as its characters or tokens. The
+            size of a text is taken to be the sum of the sizes of its words, and to be
+            at most its number of characters.
+        :param boundary: Matches the text that ends a sentence.
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be positive")
+        self._max_size = max_size
+        self._overlap = max(0, overlap)
+        self._measure = measure
+        self._boundary = boundary
+
+    def chunk(self, blocks: Iterable[str]) -> Iterator[Chunk]:
+        """Chunks a text that is given in consecutive blocks.
+
+        :param blocks: The text, in pieces of any length, such as pages or file reads.
+        :return: The chunks, in order, without surrounding whitespace.
+        """
+        return self.pack(self.split(blocks))
+
+    def split(self, blocks: Iterable[str]) -> Iterator[Sentence]:
+        """Splits a text that is given in consecutive blocks into sentences.
+        Each sentence keeps the whitespace that follows it, so the sentences put
+        together are the text. A run of text without a sentence end that grows past
+        max_size is given out in pieces without waiting for the end.
+
+        :param blocks: The text, in pieces of any length.
+        :return: The sentences, in order.
+        """
+        buffer = ""  # The text after the last complete sentence
+        start = 0
+        for block in blocks:
+            buffer += block
+            end = 0
+            for match in self._boundary.finditer(buffer):
+                # More whitespace of this sentence end may be in the next block.
+                if match.end() == len(buffer):
+                    break
+                yield Sentence(buffer[end : match.end()], start + end)
+                end = match.end()
+            buffer = buffer[end:]
+            start += end
+            if self._measure(buffer) > self._max_size:
+                pieces = list(self._cut(buffer, start))
+                for piece in pieces[:-1]:
+                    yield piece
+                buffer = pieces[-1].text
+                start = pieces[-1].start
+        if buffer:
+            yield Sentence(buffer, start)
+
+    def pack(self, sentences: Iterable[Sentence]) -> Iterator[Chunk]:
+        """Packs sentences into chunks.
+
+        :param sentences: The sentences of a text, in order.
+        :return: The chunks, in order, without surrounding whitespace.
+        """
+        # The sentences of the chunk being filled, with their sizes
+        window: list[tuple[Sentence, int]] = []
+        size = 0
+        for whole in sentences:
+            whole_size = self._measure(whole.text)
+            if whole_size <= self._max_size:
+                pieces = [(whole, whole_size)]
+            else:
+                pieces = [
+                    (piece, self._measure(piece.text))
+                    for piece in self._cut(whole.text, whole.start)
+                ]
+            for sentence, sentence_size in pieces:
+                if window and size + sentence_size > self._max_size:
+                    chunk = self._join(window)
+                    if chunk is not None:
+                        yield chunk
+                    window = window[-self._overlap :] if self._overlap else []
+                    size = sum(s for _, s in window)
+                    while window and size + sentence_size > self._max_size:
+                        size -= window.pop(0)[1]
+                window.append((sentence, sentence_size))
+                size += sentence_size
+        chunk = self._join(window)
+        if chunk is not None:
+            yield chunk
+
+    def _cut(self, text: str, start: int) -> Iterator[Sentence]:
+        """Cuts text into pieces of at most max_size, between words where possible."""
+        if self._measure is len:
+            yield from self._cut_characters(text, start)
+            return
+        piece_start = 0
+        size = 0
+        for match in _WORD.finditer(text):
+            word_size = self._measure(match.group())
+            if size and size + word_size > self._max_size:
+                yield Sentence(text[piece_start : match.start()], start + piece_start)
+                piece_start = match.start()
+                size = 0
+            if word_size > self._max_size:
+                # Only a word longer than max_size itself is cut inside.
+                while match.end() - piece_start > self._max_size:
+                    yield Sentence(
+                        text[piece_start : piece_start + self._max_size],
+                        start + piece_start,
+                    )
+                    piece_start += self._max_size
+                size = self._measure(text[piece_start : match.end()])
+            else:
+                size += word_size
+        if piece_start < len(text):
+            yield Sentence(text[piece_start:], start + piece_start)
+
+    def _cut_characters(self, text: str, start: int) -> Iterator[Sentence]:
+        """Cuts text as _cut does when sizes are characters, finding each cut with
+        a search back from max_size rather than by measuring every word."""
+        piece_start = 0
+        while len(text) - piece_start > self._max_size:
+            limit = piece_start + self._max_size
+            cut = 1 + max(
+                text.rfind(" ", piece_start, limit),
+                text.rfind("\n", piece_start, limit),
+            )
+            if cut <= piece_start:
+                cut = limit
+            yield Sentence(text[piece_start:cut], start + piece_start)
+            piece_start = cut
+        if piece_start < len(text):
+            yield Sentence(text[piece_start:], start + piece_start)
+
+    def _join(self, window: list[tuple[Sentence, int]]) -> Chunk | None:
+        """Puts the sentences of a chunk together, or gets None if they are blank."""
+        text = "".join(sentence.text for sentence, _ in window)
+        stripped = text.lstrip()
+        if not stripped:
+            return None
+        return Chunk(stripped.rstrip(), window[0][0].start + len(text) - len(stripped))
@@ -1,15 +1,24 @@
 # type: ignore
 
+from bisect import bisect_right
+import codecs
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from io import BufferedIOBase
-from io import BytesIO
+from itertools import islice
 import speech_recognition as sr
 from pydub import AudioSegment
 from pydub.silence import split_on_silence
 import tempfile
-from typing import List
+from typing import Iterator, List
 from pypdf import PdfReader
 from pathlib import Path
 
+from ucr_chatbot.config import Config, SegmentSizeUnit
+from .chunker import Chunker
+from .markdown import SECTION_SEPARATOR, chunk_markdown
+
 
 class FileParsingError(ValueError):
     """File cannot be parsed."""
@@ -24,6 +33,21 @@ class InvalidFileExtensionError(FileParsingError):
         super().__init__(f'Cannot interpret file with extension "{extension}"')
 
 
+SUPPORTED_EXTENSIONS = ("txt", "wav", "mp3", "md", "pdf")
+
+
+@dataclass
+class ParsedSegment:
+    """A segment of a parsed file and where in the file it starts."""
+
+    text: str
+    page: int | None = None
+    """The page on which the segment starts, from 1, for files with pages."""
+    section: str | None = None
+    """The headings of the section the segment is in, outermost first and joined by
+    " > ", for files with headings."""
+
+
 def parse_file(path: str) -> list[str]:
     """Parses a file into text.
 
@@ -31,65 +55,151 @@ def parse_file(path: str) -> list[str]:
     :raises InvalidFileExtension: If the input path has an invalid file extension at the end.
     :return: A textual representation of the file.
     """
+    return list(iter_file(path))
+
+
+def iter_file(path: str) -> Iterator[str]:
+    """Parses a file into text, yielding each segment as soon as it is finished.
+
+    :param path: A file path to the file to be parsed.
+    :raises InvalidFileExtension: If the input path has an invalid file extension at the end.
+    :return: The segment texts of the file, in document order.
+    """
+    return (segment.text for segment in iter_document(path))
+
+
+def parse_document(path: str) -> list[ParsedSegment]:
+    """Parses a file into segments, recording the page each starts on for PDFs.
+
+    :param path: A file path to the file to be parsed.
+    :raises InvalidFileExtension: If the input path has an invalid file extension at the end.
+    :return: The segments of the file, in document order.
+    """
+    return list(iter_document(path))
+
+
+def iter_document(path: str) -> Iterator[ParsedSegment]:
+    """Parses a file into segments, yielding each as soon as it is finished.
+    PDFs are read a page at a time and text and markdown files a block at a time, so
+    the first segments of a long file are ready before its end is read; audio files
+    are transcribed whole and then yielded.
+    The file is open until the segments are exhausted or the iterator is closed.
+
+    :param path: A file path to the file to be parsed.
+    :raises InvalidFileExtension: If the input path has an invalid file extension at the end.
+    :return: The segments of the file, in document order.
+    """
     extension = Path(path).suffix[1:]
+    if extension not in SUPPORTED_EXTENSIONS:
+        raise InvalidFileExtensionError(extension)
+    return _iter_document(path, extension)
+
+
+def _iter_document(path: str, extension: str) -> Iterator[ParsedSegment]:
+    """Parses a file with a supported extension into segments."""
+    chunker = segment_chunker()
     with open(path, "rb") as f:
+        if extension == "pdf":
+            yield from _iter_pdf(
+                f,
+                chunker,
+                workers=Config.PDF_EXTRACTION_WORKERS,
+                min_pages=Config.PDF_PARALLEL_MIN_PAGES,
+            )
+            return
         if extension == "txt":
-            return _parse_txt(f, lenseg=1000)
-        elif extension == "wav":
-            return _parse_audio(path, segments=True)
-        elif extension == "mp3":
-            return _parse_audio(path, segments=True)
-        elif extension == "md":
-            return _parse_md(f, 1000)
-        elif extension == "pdf":
-            return _parse_pdf(f, chars_per_seg=1000, overlap=2)
-        else:
-            raise InvalidFileExtensionError(extension)
+            for text in _iter_txt(f, chunker):
+                yield ParsedSegment(text)
+            return
+        if extension == "md":
+            yield from _iter_md(f, chunker)
+            return
+        phrases = _parse_audio(path, segments=True)
+        texts = [chunk.text for chunk in chunker.chunk([". ".join(phrases)])]
+    for text in texts:
+        yield ParsedSegment(text)
+
+
+def segment_chunker() -> Chunker:
+    """Builds the Chunker that splits files into segments, as configured by
+    SEGMENT_SIZE, SEGMENT_OVERLAP, and SEGMENT_SIZE_UNIT.
+    """
+    measure = len
+    if Config.SEGMENT_SIZE_UNIT == SegmentSizeUnit.TOKENS:
+        # Imported here since the language model package pulls in the database.
+        from ucr_chatbot.api.language_model.prompt_packing import ApproximateTokenizer
 
+        measure = ApproximateTokenizer().count
+    return Chunker(Config.SEGMENT_SIZE, Config.SEGMENT_OVERLAP, measure)
 
-def _parse_txt(txt_file: BufferedIOBase, lenseg=None) -> List[str]:
-    """Parses a text file and removes whitespace. The function either returns
-    a list of strings or a string
+
+def _iter_txt(
+    txt_file: BufferedIOBase, chunker: Chunker, block_size: int = 65536
+) -> Iterator[str]:
+    """Parses a text file into segments of whole sentences, reading it a block at a time.
+    Only the block being read and the sentences of the segment being filled are held in
+    memory, however large the file is.
 
     :param txt_file: text file to be parsed
-    :type txt_file: .txt
+    :param chunker: splits the text into segments
+    :param block_size: the number of bytes to read at a time
+    :return: the segments of the text file, in order
+    """
+    for chunk in chunker.chunk(_decode_blocks(txt_file, block_size)):
+        yield chunk.text
 
-    :param lenseg: for segmenting the text, maximum desired length in characters of the segment,
-    defaults to None. Also an indicator if the user wants to segment the file
-    :type lenseg: int
 
-    :return: string of all the text in the document or list of strings, where each item in the
-    list is a segment of the text file
-    :rtype: List[str] or str
+def _decode_blocks(binary_file: BufferedIOBase, block_size: int) -> Iterator[str]:
+    """Reads a file a block at a time and decodes it in the encoding that its first
+    block is detected to be in. A character split between blocks is decoded whole, and
+    bytes that are invalid in the encoding are replaced rather than failing the file.
     """
-
-    if lenseg is not None:
-        l = []
-        content = ""  # full file content
-        bigline = ""  # for segmenting purposes
-
-        count = 0  # working character count
-        tempstr = str(txt_file.read())
-        new = tempstr.replace("\\n", "\n")[2:-1]
-        for line in new:
-            count = count + len(line)
-            bigline = bigline + line.strip() + ""
-
-            if count > lenseg or bigline.endswith("."):
-                l.append(bigline)
-                # resetting
-                count = 0
-                bigline = ""
-        if len(bigline) > 0:
-            l.append(bigline)
-        return l
-    else:
-        content = ""  # Full file content
-        tempstr = str(txt_file.read())
-        new = tempstr.replace("\\n", "\n")[2:-1]
-        for line in new:
-            content = content + line.strip() + ""
-        return [content]
+    block = binary_file.read(block_size)
+    decoder = codecs.getincrementaldecoder(detect_encoding(block))(errors="replace")
+    while block:
+        text = decoder.decode(block)
+        if text:
+            yield text
+        block = binary_file.read(block_size)
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+def detect_encoding(sample: bytes) -> str:
+    """Guesses the encoding of a text file from the bytes it starts with.
+
+    A byte order mark decides the encoding. Otherwise, text with NUL in every other
+    byte is taken to be UTF-16 without a mark, text that is valid UTF-8 to be UTF-8,
+    and anything else to be Windows-1252, which maps nearly every byte to a character.
+
+    :param sample: the first bytes of the file, such as its first few kilobytes
+    :return: the name of a codec that decodes the file
+    """
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
+    pairs = len(sample) // 2
+    if pairs:
+        if sample[1::2].count(0) > pairs * 0.4 and not sample[::2].count(0):
+            return "utf-16-le"
+        if sample[::2].count(0) > pairs * 0.4 and not sample[1::2].count(0):
+            return "utf-16-be"
+    try:
+        # A character cut off at the end of the sample is not an error.
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return "cp1252"
+    return "utf-8"
 
 
 def _parse_audio(audio_file: str, time=None, segments=False) -> List[str]:
@@ -200,104 +310,120 @@ def _parse_audio(audio_file: str, time=None, segments=False) -> List[str]:
         return [transcript]  # type: ignore
 
 
-def _parse_pdf(pdf_file: BufferedIOBase, chars_per_seg: int, overlap: int) -> list[str]:
-    """Parses a pdf file into text
+_worker_reader: PdfReader | None = None
 
-    :param path: A file path to the file to be parsed.
-    :param chars_per_seg: approximate amount of max characters per segment, with a bit of overlap between
-    :param overlap: how many sentences should overlap per section
-    :return: A list of segments of the textural representation of the pdf file.
-    """
-    reader = PdfReader(BytesIO(pdf_file.read()))
-    all_text = []
-    for page in reader.pages:
-        page_text = page.extract_text()
-        if page_text:
-            all_text.append(page_text)
-    text = "\n".join(all_text)
-
-    # Do not strip first character, preserve newlines
-    text = text.replace("  ", " ")
-    total_text = text.rstrip()
-
-    # Initial split of text by sentences
-    sentences = total_text.split(".")
-    if sentences and sentences[-1] == "":
-        sentences.pop(-1)
-    for i in range(len(sentences)):
-        sentences[i] += "."
-
-    # Making sure no sentence is too long or document doesn't use proper sentences (like a slide deck)
-    i = 0
-    while i < len(sentences):
-        sentence = sentences[i]
-        if len(sentence) > (chars_per_seg / 2):
-            temp_sentence = sentence
-            sentences.pop(i)
-            for j in range(0, len(temp_sentence), chars_per_seg):
-                sentences.insert(i, temp_sentence[j : j + chars_per_seg])
-                i += 1
-        else:
-            i += 1
-
-    # Combining into larger sections, about chars_per_split
-    segments: list[str] = []
-    curr_segment = ""
-    for i, sentence in enumerate(sentences):
-        if (len(curr_segment) + len(sentence)) < chars_per_seg:
-            curr_segment += sentence
-        else:
-            segments.append(curr_segment)
-            curr_segment = ""
-            for k in range(overlap, 0, -1):
-                if i - k >= 0:
-                    curr_segment += sentences[i - k]
-    if curr_segment:
-        segments.append(curr_segment)
 
-    return segments
+def _open_worker_reader(path: str):
+    """Opens the pdf file that an extraction worker process reads its pages from."""
+    global _worker_reader
+    _worker_reader = PdfReader(path)
 
 
-def _parse_md(md_file: BufferedIOBase, chars_per_seg: int) -> list[str]:
-    """Parses a markdown file into text
+def _extract_page_range(start: int, stop: int) -> list[str]:
+    """Extracts the text of the pages from start up to stop in a worker process."""
+    return [_worker_reader.pages[i].extract_text() for i in range(start, stop)]
 
-    :param path: A file path to the file to be parsed.
-    :param chars_per_seg: approximate amount of max characters per segment, with a bit of overlap between
-    :return: A list of segments of the textual representation of the markdown file.
-    """
-    raw_string = str(md_file.read())
-    new_string = raw_string.replace("\\r\\n", "\n")
-    new_string = new_string.replace("\\'", "'")
-
-    total_text = new_string[2:-1]
-
-    # Split by sections in markdown
-    sections = total_text.split("#")
-    for i, section in enumerate(sections):
-        if section == "":
-            sections.pop(i)
-
-    # Making sure no sentence is too long or document doesn't us proper sentences (like a slide deck)
-    for i, section in enumerate(sections):
-        if len(section) > chars_per_seg:
-            temp_section = section
-            sections.pop(i)
-            for j in range(0, len(temp_section), chars_per_seg):
-                sections.append(temp_section[j : j + chars_per_seg])
-
-    # Combining into larger sections, about chars_per_split
-    segments: list[str] = []
-    curr_segment = ""
-    for i, section in enumerate(sections):
-        if (len(curr_segment) + len(section)) < chars_per_seg:
-            curr_segment += section
-        else:
-            segments.append(curr_segment)
-            curr_segment = sections[i - 1]
-    segments.append(curr_segment)
 
-    # for segment in segments:
-    #     print(segment)
-    #     print("------------------------------------")
+def _extract_pages(
+    pdf_file: BufferedIOBase, workers: int, min_pages: int, shard_pages: int = 16
+) -> Iterator[str]:
+    """Extracts the text of each page of a pdf file, in page order.
+    Files with at least min_pages pages are sharded into ranges of shard_pages pages
+    that a pool of worker processes extracts at once. Only one shard per worker is
+    submitted or held at a time, so memory does not grow with the page count. Smaller
+    files, and file objects without a path that a worker could open, are extracted in
+    this process.
 
-    return segments
+    :param pdf_file: The open pdf file.
+    :param workers: The most processes to extract pages with.
+    :param min_pages: The fewest pages a file must have to be extracted in parallel.
+    :param shard_pages: The number of pages that a worker extracts at a time.
+    :return: The text of each page, in page order.
+    """
+    reader = PdfReader(pdf_file)
+    path = getattr(pdf_file, "name", None)
+    page_count = len(reader.pages)
+    if workers <= 1 or page_count < min_pages or not isinstance(path, str):
+        for page in reader.pages:
+            yield page.extract_text()
+        return
+
+    executor = ProcessPoolExecutor(
+        max_workers=workers, initializer=_open_worker_reader, initargs=(path,)
+    )
+    try:
+        shards = (
+            (start, min(start + shard_pages, page_count))
+            for start in range(0, page_count, shard_pages)
+        )
+        pending = deque(
+            executor.submit(_extract_page_range, start, stop)
+            for start, stop in islice(shards, workers)
+        )
+        while pending:
+            texts = pending.popleft().result()
+            # Refill the window before yielding, so the workers stay busy meanwhile.
+            for start, stop in islice(shards, 1):
+                pending.append(executor.submit(_extract_page_range, start, stop))
+            yield from texts
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def _iter_pdf(
+    pdf_file: BufferedIOBase,
+    chunker: Chunker,
+    workers: int = 1,
+    min_pages: int = Config.PDF_PARALLEL_MIN_PAGES,
+) -> Iterator[ParsedSegment]:
+    """Parses a pdf file into segments a page at a time.
+    The pages' texts are chunked as one text joined by newlines, so segments run
+    across page breaks.
+
+    :param pdf_file: The open pdf file, which is read in place.
+    :param chunker: splits the text into segments
+    :param workers: The most processes to extract pages with.
+    :param min_pages: The fewest pages a file must have for its pages to be extracted
+        by more than one process.
+    :return: The segments of the textual representation of the pdf file, each with
+        the page its first sentence is on.
+    """
+    # Offsets at which each page's text starts in the joined text
+    page_starts: list[int] = []
+    page_numbers: list[int] = []
+
+    def blocks() -> Iterator[str]:
+        offset = 0
+        pages = _extract_pages(pdf_file, workers, min_pages)
+        for number, page_text in enumerate(pages, 1):
+            if not page_text:
+                continue
+            if page_numbers:
+                yield "\n"
+                offset += 1
+            page_starts.append(offset)
+            page_numbers.append(number)
+            page_text = page_text.replace("  ", " ")
+            offset += len(page_text)
+            yield page_text
+
+    for chunk in chunker.chunk(blocks()):
+        page = page_numbers[max(0, bisect_right(page_starts, chunk.start) - 1)]
+        yield ParsedSegment(chunk.text, page)
+
+
+def _iter_md(
+    md_file: BufferedIOBase, chunker: Chunker, block_size: int = 65536
+) -> Iterator[ParsedSegment]:
+    """Parses a markdown file into segments within its sections, reading it a block
+    at a time.
+
+    :param md_file: The open markdown file.
+    :param chunker: splits the text of each section into segments
+    :param block_size: the number of bytes to read at a time
+    :return: The segments of the markdown file, each with the headings above it.
+    """
+    for chunk in chunk_markdown(_decode_blocks(md_file, block_size), chunker):
+        yield ParsedSegment(
+            chunk.text, section=SECTION_SEPARATOR.join(chunk.section) or None
+        )
@@ -0,0 +1,119 @@
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+import re
+
+from .chunker import Chunker, Sentence
+
+_HEADING = re.compile(r" {0,3}(#{1,6})(?:[ \t]+(.*?))??(?:[ \t]+#+)?[ \t]*\r?\n?")
+_FENCE = re.compile(r" {0,3}(`{3,}|~{3,})")
+
+SECTION_SEPARATOR = " > "
+"""Joins the headings of a section path, outermost first."""
+
+
+@dataclass
+class MarkdownChunk:
+    """A chunk of a markdown file and the headings of the section it is in."""
+
+    text: str
+    start: int
+    section: tuple[str, ...]
+    """The titles of the headings above the chunk, outermost first."""
+
+
+def chunk_markdown(blocks: Iterable[str], chunker: Chunker) -> Iterator[MarkdownChunk]:
+    """Chunks a markdown text within its sections.
+
+    The text is read a line at a time. ATX headings (# to ######) start a new section,
+    and the chunks of a section never run into the next one. A fenced code block is
+    kept whole in one chunk if it fits, so that neither its lines nor a full stop
+    inside it split it, and a # inside it or anywhere but the start of a line is
+    never taken for a heading. Headings are not repeated in the chunks' text, but
+    given as their section.
+
+    :param blocks: The markdown text, in pieces of any length.
+    :param chunker: Packs the sentences and code blocks of each section into chunks.
+    :return: The chunks, in document order.
+    """
+    path: list[tuple[int, str]] = []  # The level and title of each enclosing heading
+    items: list[Sentence | list[str]] = []  # Code blocks, and lines of prose
+    items_start = 0
+    fence = ""  # The fence of the open code block, if any
+    code: list[str] = []
+    code_start = 0
+    offset = 0
+
+    def flush() -> Iterator[MarkdownChunk]:
+        section = tuple(title for _, title in path)
+        for chunk in chunker.pack(_sentences(items, items_start, chunker)):
+            yield MarkdownChunk(chunk.text, chunk.start, section)
+        items.clear()
+
+    for line in _lines(blocks):
+        line_start = offset
+        offset += len(line)
+        if fence:
+            code.append(line)
+            stripped = line.strip()
+            if stripped.startswith(fence) and not stripped.strip(fence[0]):
+                items.append(Sentence("".join(code), code_start))
+                fence = ""
+            continue
+
+        opening = _FENCE.match(line)
+        if opening:
+            fence = opening.group(1)
+            code = [line]
+            code_start = line_start
+            if not items:
+                items_start = line_start
+            continue
+
+        heading = _HEADING.fullmatch(line)
+        if heading:
+            yield from flush()
+            level = len(heading.group(1))
+            while path and path[-1][0] >= level:
+                path.pop()
+            path.append((level, (heading.group(2) or "").strip()))
+            items_start = offset
+            continue
+
+        if not items:
+            items_start = line_start
+        if items and isinstance(items[-1], list):
+            items[-1].append(line)
+        else:
+            items.append([line])
+
+    if fence:
+        # An unclosed fence runs to the end of the file.
+        items.append(Sentence("".join(code), code_start))
+    yield from flush()
+
+
+def _sentences(
+    items: list[Sentence | list[str]], start: int, chunker: Chunker
+) -> Iterator[Sentence]:
+    """Splits the prose of a section into sentences, keeping its code blocks whole."""
+    offset = start
+    for item in items:
+        if isinstance(item, Sentence):
+            yield item
+            offset = item.start + len(item.text)
+            continue
+        for sentence in chunker.split(item):
+            yield Sentence(sentence.text, offset + sentence.start)
+        offset += sum(len(line) for line in item)
+
+
+def _lines(blocks: Iterable[str]) -> Iterator[str]:
+    """Splits text given in blocks into lines, each with its line ending."""
+    rest = ""
+    for block in blocks:
+        lines = (rest + block).splitlines(keepends=True)
+        # The last line may go on in the next block, as may a \r\n cut after \r.
+        rest = lines.pop() if lines and not lines[-1].endswith("\n") else ""
+        yield from lines
+    if rest:
+        yield rest
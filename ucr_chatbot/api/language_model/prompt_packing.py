@@ -0,0 +1,264 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from math import ceil
+import re
+from threading import Lock
+from typing import Sequence
+
+from ucr_chatbot.config import Config
+from ..context_retrieval.retriever import RetrievedSegment
+
+
+class Tokenizer(ABC):
+    """Counts the tokens that a language model would read for a text."""
+
+    @abstractmethod
+    def count(self, text: str) -> int:
+        """Counts the tokens of text.
+
+        :param text: The text to count.
+        :return: The number of tokens.
+        """
+        pass
+
+
+class ApproximateTokenizer(Tokenizer):
+    """Estimates token counts without a model's vocabulary.
+
+    Each punctuation mark is a token and each word is a token per chars_per_token
+    characters, rounded up. Subword tokenizers split common words less, so the
+    estimate errs on the side of a prompt fitting its budget.
+    """
+
+    def __init__(self, chars_per_token: int = 4):
+        """Initializes an ApproximateTokenizer.
+
+        :param chars_per_token: The number of word characters that make up one token.
+        """
+        self._chars_per_token = chars_per_token
+
+    def count(self, text: str) -> int:
+        """Estimates the tokens of text.
+
+        :param text: The text to count.
+        :return: The estimated number of tokens.
+        """
+        return sum(
+            ceil(len(piece) / self._chars_per_token) if piece[0].isalnum() else 1
+            for piece in re.findall(r"\w+|[^\w\s]", text)
+        )
+
+
+@dataclass
+class HistoryMessage:
+    """A message of a conversation, as it is shown to the language model."""
+
+    sender: str
+    body: str
+
+
+@dataclass
+class PackingStats:
+    """The tokens that one packed prompt spends on each of its parts."""
+
+    budget: int
+    template_tokens: int
+    context_tokens: int
+    history_tokens: int
+    segments_used: int
+    segments_truncated: int
+    segments_dropped: int
+    messages_used: int
+    messages_dropped: int
+
+    @property
+    def total_tokens(self) -> int:
+        """The tokens of the whole prompt."""
+        return self.template_tokens + self.context_tokens + self.history_tokens
+
+
+@dataclass
+class PackedPrompt:
+    """A prompt whose context and history fit a token budget."""
+
+    prompt: str
+    segments: list[RetrievedSegment]
+    stats: PackingStats
+
+
+@dataclass
+class PackingTotals:
+    """A snapshot of the token counts of every prompt packed by this process."""
+
+    prompts: int
+    prompt_tokens: int
+    context_tokens: int
+    history_tokens: int
+    segments_truncated: int
+    segments_dropped: int
+    messages_dropped: int
+
+
+_totals_lock = Lock()
+_totals = PackingTotals(0, 0, 0, 0, 0, 0, 0)
+
+
+def packing_totals() -> PackingTotals:
+    """Returns a snapshot of the token counts of the prompts packed so far."""
+    with _totals_lock:
+        return PackingTotals(**vars(_totals))
+
+
+def reset_packing_totals():
+    """Sets every packing counter back to zero."""
+    global _totals
+    with _totals_lock:
+        _totals = PackingTotals(0, 0, 0, 0, 0, 0, 0)
+
+
+def _record(stats: PackingStats):
+    """Adds the token counts of a packed prompt to the totals."""
+    with _totals_lock:
+        _totals.prompts += 1
+        _totals.prompt_tokens += stats.total_tokens
+        _totals.context_tokens += stats.context_tokens
+        _totals.history_tokens += stats.history_tokens
+        _totals.segments_truncated += stats.segments_truncated
+        _totals.segments_dropped += stats.segments_dropped
+        _totals.messages_dropped += stats.messages_dropped
+
+
+def truncate_at_sentence(text: str, max_tokens: int, tokenizer: Tokenizer) -> str:
+    """Cuts text after its last whole sentence that fits within max_tokens.
+
+    If not even the first sentence fits, it is cut after its last whole word that
+    fits instead, so that a long sentence still gives some context.
+
+    :param text: The text to cut.
+    :param max_tokens: The most tokens that the cut text may have.
+    :param tokenizer: Counts the tokens.
+    :return: The longest run of leading sentences that fits, else the longest run of
+        leading words, or an empty string if not even the first word fits.
+    """
+    if tokenizer.count(text) <= max_tokens:
+        return text
+    kept = ""
+    for match in re.finditer(r".+?(?:[.!?](?=\s|$)|$)\s*", text, re.DOTALL):
+        candidate = kept + match.group()
+        if tokenizer.count(candidate) > max_tokens:
+            if not kept:
+                return _truncate_at_word(match.group(), max_tokens, tokenizer)
+            break
+        kept = candidate
+    return kept.rstrip()
+
+
+def _truncate_at_word(text: str, max_tokens: int, tokenizer: Tokenizer) -> str:
+    """Cuts text after its last whole word that fits within max_tokens.
+
+    The cut is found by bisecting the word ends, so a long text is counted only
+    a logarithmic number of times.
+    """
+    ends = [match.end() for match in re.finditer(r"\S+", text)]
+    low, high = 0, len(ends)  # ends[:low] fit, ends[high:] do not
+    while low < high:
+        middle = (low + high + 1) // 2
+        if tokenizer.count(text[: ends[middle - 1]]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[: ends[low - 1]] if low else ""
+
+
+def pack_prompt(
+    template: str,
+    question: str,
+    segments: Sequence[RetrievedSegment],
+    history: Sequence[HistoryMessage],
+    budget: int = Config.PROMPT_TOKEN_BUDGET,
+    tokenizer: Tokenizer | None = None,
+    history_share: float = Config.PROMPT_HISTORY_SHARE,
+    max_segment_tokens: int = Config.PROMPT_MAX_SEGMENT_TOKENS,
+    no_context: str = "",
+) -> PackedPrompt:
+    """Fills a prompt template with as much context and history as a token budget allows.
+
+    The question and template are always kept. Up to history_share of the tokens left
+    go to the most recent messages, whole or not at all. Segments then fill the rest in
+    the order given, each cut at a sentence boundary to at most max_segment_tokens, or
+    to whatever is left of the budget. Tokens that the segments leave unused go to older
+    messages. The counts are added to packing_totals.
+
+    :param template: The prompt, with {context}, {history}, and {question} placeholders.
+    :param question: The user's question.
+    :param segments: The retrieved segments, most valuable first.
+    :param history: The messages of the conversation, oldest first.
+    :param budget: The most tokens that the prompt may have.
+    :param tokenizer: Counts the tokens, or None for an ApproximateTokenizer.
+    :param history_share: The share of the tokens left after the template that is
+        first offered to the history.
+    :param max_segment_tokens: The most tokens that one segment may take.
+    :param no_context: The context given when no segment fits.
+    :return: The prompt, the segments it contains, and its token counts.
+    """
+    tokenizer = tokenizer or ApproximateTokenizer()
+    template_tokens = tokenizer.count(
+        template.format(context="", history="", question=question)
+    )
+    available = max(0, budget - template_tokens)
+
+    lines = [f"{message.sender}: {message.body}" for message in reversed(history)]
+    kept_lines: list[str] = []
+    history_tokens = 0
+
+    def add_history(limit: int):
+        """Adds the most recent messages not added yet while they fit within limit."""
+        nonlocal history_tokens
+        while len(kept_lines) < len(lines):
+            tokens = tokenizer.count(lines[len(kept_lines)] + "\n")
+            if history_tokens + tokens > limit:
+                break
+            kept_lines.append(lines[len(kept_lines)])
+            history_tokens += tokens
+
+    add_history(int(available * history_share))
+
+    used: list[RetrievedSegment] = []
+    context_lines: list[str] = []
+    context_tokens = 0
+    truncated = 0
+    for segment in segments:
+        prefix = f"Reference number: {segment.id}, text: "
+        room = available - history_tokens - context_tokens
+        limit = min(max_segment_tokens, room - tokenizer.count(prefix + "\n"))
+        text = truncate_at_sentence(segment.text, limit, tokenizer)
+        if not text:
+            continue
+        if text != segment.text:
+            truncated += 1
+        used.append(segment)
+        context_lines.append(prefix + text)
+        context_tokens += tokenizer.count(prefix + text + "\n")
+
+    if not context_lines:
+        context_tokens = tokenizer.count(no_context)
+    add_history(available - context_tokens)
+
+    stats = PackingStats(
+        budget=budget,
+        template_tokens=template_tokens,
+        context_tokens=context_tokens,
+        history_tokens=history_tokens,
+        segments_used=len(used),
+        segments_truncated=truncated,
+        segments_dropped=len(segments) - len(used),
+        messages_used=len(kept_lines),
+        messages_dropped=len(lines) - len(kept_lines),
+    )
+    _record(stats)
+    prompt = template.format(
+        context="\n".join(context_lines) if context_lines else no_context,
+        history="\n".join(reversed(kept_lines)),
+        question=question,
+    )
+    return PackedPrompt(prompt=prompt, segments=used, stats=stats)
@@ -1,8 +1,8 @@
 import google.generativeai as genai
-import ollama
 from typing import Generator, List, Any
 from abc import ABC, abstractmethod
 from ucr_chatbot.config import Config, LLMMode
+from ..ollama_transport import ollama_client
 
 
 class LanguageModelClient(ABC):
@@ -233,7 +233,7 @@ class Ollama(LanguageModelClient):
         self.temp = 0.7
         self.stop_sequences = None
         try:
-            self.client = ollama.Client(host=host)
+            self.client = ollama_client(Config.OLLAMA_GENERATE_TIMEOUT, host=host)
             self.client.list()
         except Exception:
             raise ConnectionError(
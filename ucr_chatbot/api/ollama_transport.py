@@ -0,0 +1,124 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from threading import Lock
+import time
+
+import httpx
+import ollama
+
+from ucr_chatbot.config import Config
+
+
+@dataclass
+class EndpointStats:
+    """A snapshot of the traffic counters of one Ollama endpoint."""
+
+    requests: int
+    errors: int
+    total_seconds: float
+
+    @property
+    def mean_seconds(self) -> float:
+        """The mean time until the response headers arrived."""
+        return self.total_seconds / self.requests if self.requests else 0.0
+
+
+_stats_lock = Lock()
+_requests: defaultdict[str, int] = defaultdict(int)
+_errors: defaultdict[str, int] = defaultdict(int)
+_seconds: defaultdict[str, float] = defaultdict(float)
+
+_transport_lock = Lock()
+_transport: httpx.BaseTransport | None = None
+
+
+def transport_stats() -> dict[str, EndpointStats]:
+    """Returns a snapshot of the traffic counters, keyed by endpoint path."""
+    with _stats_lock:
+        return {
+            path: EndpointStats(
+                requests=_requests[path],
+                errors=_errors[path],
+                total_seconds=_seconds[path],
+            )
+            for path in _requests
+        }
+
+
+def reset_transport_stats():
+    """Sets every traffic counter back to zero."""
+    with _stats_lock:
+        _requests.clear()
+        _errors.clear()
+        _seconds.clear()
+
+
+class _CountingTransport(httpx.BaseTransport):
+    """Sends requests through another transport and counts their latency and outcome.
+
+    Counting here rather than in response hooks also counts the requests that never
+    get a response, such as connection errors and timeouts.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport):
+        self._transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        """Sends a request and records the time until its response headers arrived."""
+        started = time.perf_counter()
+        failed = True
+        try:
+            response = self._transport.handle_request(request)
+            failed = response.is_error
+            return response
+        finally:
+            path = request.url.path
+            with _stats_lock:
+                _requests[path] += 1
+                _seconds[path] += time.perf_counter() - started
+                if failed:
+                    _errors[path] += 1
+
+    def close(self):
+        """Closes the wrapped transport."""
+        self._transport.close()
+
+
+def shared_transport() -> httpx.BaseTransport:
+    """Gets the connection pool that carries all Ollama traffic, creating it on first use.
+
+    Keeping one pool for the process lets embedding and generation requests
+    from every thread reuse the same keep-alive connections.
+    """
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = _CountingTransport(
+                httpx.HTTPTransport(
+                    limits=httpx.Limits(
+                        max_connections=Config.OLLAMA_MAX_CONNECTIONS,
+                        max_keepalive_connections=Config.OLLAMA_MAX_KEEPALIVE,
+                        keepalive_expiry=Config.OLLAMA_KEEPALIVE_EXPIRY,
+                    )
+                )
+            )
+        return _transport
+
+
+def ollama_client(
+    timeout: float,
+    host: str = Config.OLLAMA_URL,
+    transport: httpx.BaseTransport | None = None,
+) -> ollama.Client:
+    """Creates an Ollama client that sends its requests through the shared connection pool.
+
+    :param timeout: The number of seconds to wait for each read and write of a request.
+    :param host: The URL of the Ollama server.
+    :param transport: The transport to send requests through, or None for the shared pool.
+    :return: A client whose traffic is counted in transport_stats.
+    """
+    return ollama.Client(
+        host=host,
+        transport=_CountingTransport(transport) if transport else shared_transport(),
+        timeout=httpx.Timeout(timeout, connect=Config.OLLAMA_CONNECT_TIMEOUT),
+    )
@@ -14,6 +14,60 @@ def get_non_empty_env[T](var_name: str, default: str | T = None) -> str | T:
     return value
 
 
+KNOWN_EMBEDDING_DIMENSIONS = {
+    "nomic-embed-text": 768,
+    "mxbai-embed-large": 1024,
+    "snowflake-arctic-embed": 1024,
+    "bge-m3": 1024,
+    "all-minilm": 384,
+}
+
+
+HASHING_MODEL_PREFIX = "hashing-"
+"""Starts the model name of feature-hashed embeddings, which ends with their dimensions."""
+
+
+def hashing_model_name(dimensions: int) -> str:
+    """Names the feature-hashing embedding model that produces vectors of a given length.
+
+    Hashed vectors are stored and cached under this name, so that they are never
+    mistaken for the vectors of an Ollama model.
+
+    :param dimensions: The length of the hashed vectors.
+    """
+    return f"{HASHING_MODEL_PREFIX}{dimensions}"
+
+
+def hashing_model_dimensions(model: str) -> int | None:
+    """Gets the vector length of a feature-hashing model from its name.
+
+    :param model: The name of an embedding model.
+    :return: The length of the model's vectors, or None if it is not a feature-hashing model.
+    """
+    dimensions = model.removeprefix(HASHING_MODEL_PREFIX)
+    if dimensions == model or not dimensions.isdigit():
+        return None
+    return int(dimensions)
+
+
+def embedding_dimensions_for(model: str) -> int:
+    """Gets the vector length produced by a known embedding model.
+
+    :param model: The Ollama name of the model, optionally with a tag, or the name of
+        a feature-hashing model.
+    :raises ValueError: If the model is not listed in KNOWN_EMBEDDING_DIMENSIONS.
+    """
+    hashing_dimensions = hashing_model_dimensions(model)
+    if hashing_dimensions is not None:
+        return hashing_dimensions
+    base_name = model.split(":")[0]
+    if base_name not in KNOWN_EMBEDDING_DIMENSIONS:
+        raise ValueError(
+            f"Unknown dimensions for embedding model '{model}'; set EMBEDDING_DIMENSIONS."
+        )
+    return KNOWN_EMBEDDING_DIMENSIONS[base_name]
+
+
 class LLMMode(Enum):
     """The mode in which the LLM is to run."""
 
@@ -35,6 +89,102 @@ class LLMMode(Enum):
                 raise ValueError(f"Invalid LLM mode '{invalid_name}'")
 
 
+class EmbeddingBackend(Enum):
+    """The backend used to embed text as vectors."""
+
+    OLLAMA = 1
+    HASHING = 2
+
+    @staticmethod
+    def from_str(enum_name: str) -> "EmbeddingBackend":
+        """Creates an EmbeddingBackend from a string."""
+        match enum_name.lower():
+            case "ollama":
+                return EmbeddingBackend.OLLAMA
+            case "hashing":
+                return EmbeddingBackend.HASHING
+            case invalid_name:
+                raise ValueError(f"Invalid embedding backend '{invalid_name}'")
+
+
+class VectorStorage(Enum):
+    """The representation in which embeddings are indexed for nearest neighbour search."""
+
+    FLOAT32 = 1
+    HALFVEC = 2
+    BINARY = 3
+
+    @staticmethod
+    def from_str(enum_name: str) -> "VectorStorage":
+        """Creates a VectorStorage from a string."""
+        match enum_name.lower():
+            case "float32":
+                return VectorStorage.FLOAT32
+            case "halfvec":
+                return VectorStorage.HALFVEC
+            case "binary":
+                return VectorStorage.BINARY
+            case invalid_name:
+                raise ValueError(f"Invalid vector storage '{invalid_name}'")
+
+
+class VectorBackend(Enum):
+    """Where the Retriever's nearest neighbour search runs."""
+
+    PGVECTOR = 1
+    MMAP = 2
+
+    @staticmethod
+    def from_str(enum_name: str) -> "VectorBackend":
+        """Creates a VectorBackend from a string."""
+        match enum_name.lower():
+            case "pgvector":
+                return VectorBackend.PGVECTOR
+            case "mmap":
+                return VectorBackend.MMAP
+            case invalid_name:
+                raise ValueError(f"Invalid vector backend '{invalid_name}'")
+
+
+class SegmentSizeUnit(Enum):
+    """The unit in which the size of a file's segments is measured."""
+
+    CHARACTERS = 1
+    TOKENS = 2
+
+    @staticmethod
+    def from_str(enum_name: str) -> "SegmentSizeUnit":
+        """Creates a SegmentSizeUnit from a string."""
+        match enum_name.lower():
+            case "characters":
+                return SegmentSizeUnit.CHARACTERS
+            case "tokens":
+                return SegmentSizeUnit.TOKENS
+            case invalid_name:
+                raise ValueError(f"Invalid segment size unit '{invalid_name}'")
+
+
+class RetrievalMode(Enum):
+    """How the Retriever finds the segments relevant to a prompt."""
+
+    VECTOR = 1
+    LEXICAL = 2
+    HYBRID = 3
+
+    @staticmethod
+    def from_str(enum_name: str) -> "RetrievalMode":
+        """Creates a RetrievalMode from a string."""
+        match enum_name.lower():
+            case "vector":
+                return RetrievalMode.VECTOR
+            case "lexical":
+                return RetrievalMode.LEXICAL
+            case "hybrid":
+                return RetrievalMode.HYBRID
+            case invalid_name:
+                raise ValueError(f"Invalid retrieval mode '{invalid_name}'")
+
+
 class Config:
     """The global configuration for the UCR Chatbot."""
 
@@ -49,9 +199,100 @@ class Config:
     GOOGLE_SECRET = get_non_empty_env("GOOGLE_SECRET")
 
     OLLAMA_URL = get_non_empty_env("OLLAMA_URL", "http://localhost:11434")
+    OLLAMA_MAX_CONNECTIONS = int(get_non_empty_env("OLLAMA_MAX_CONNECTIONS", "32"))
+    OLLAMA_MAX_KEEPALIVE = int(get_non_empty_env("OLLAMA_MAX_KEEPALIVE", "16"))
+    OLLAMA_KEEPALIVE_EXPIRY = float(get_non_empty_env("OLLAMA_KEEPALIVE_EXPIRY", "60"))
+    OLLAMA_CONNECT_TIMEOUT = float(get_non_empty_env("OLLAMA_CONNECT_TIMEOUT", "5"))
+    OLLAMA_EMBED_TIMEOUT = float(get_non_empty_env("OLLAMA_EMBED_TIMEOUT", "60"))
+    OLLAMA_GENERATE_TIMEOUT = float(get_non_empty_env("OLLAMA_GENERATE_TIMEOUT", "300"))
     GEMINI_API_KEY = get_non_empty_env("GEMINI_API_KEY")
     LLM_MODE = LLMMode.from_str(get_non_empty_env("LLM_MODE", "testing"))
 
+    EMBEDDING_BACKEND = EmbeddingBackend.from_str(
+        get_non_empty_env(
+            "EMBEDDING_BACKEND",
+            "hashing" if LLM_MODE == LLMMode.TESTING else "ollama",
+        )
+    )
+    EMBEDDING_MODEL = get_non_empty_env(
+        "EMBEDDING_MODEL",
+        hashing_model_name(int(get_non_empty_env("EMBEDDING_DIMENSIONS", "768")))
+        if EMBEDDING_BACKEND == EmbeddingBackend.HASHING
+        else "nomic-embed-text",
+    )
+    EMBEDDING_DIMENSIONS = int(
+        get_non_empty_env("EMBEDDING_DIMENSIONS")
+        or embedding_dimensions_for(EMBEDDING_MODEL)
+    )
+    EMBEDDING_BATCH_SIZE = int(get_non_empty_env("EMBEDDING_BATCH_SIZE", "64"))
+    EMBEDDING_BATCH_MAX_CHARS = int(
+        get_non_empty_env("EMBEDDING_BATCH_MAX_CHARS", "64000")
+    )
+    EMBEDDING_WORKERS = int(get_non_empty_env("EMBEDDING_WORKERS", "4"))
+    EMBEDDING_MAX_IN_FLIGHT = int(get_non_empty_env("EMBEDDING_MAX_IN_FLIGHT", "8"))
+    EMBEDDING_RETRIES = int(get_non_empty_env("EMBEDDING_RETRIES", "3"))
+    EMBEDDING_CACHE_MAX_ROWS = int(
+        get_non_empty_env("EMBEDDING_CACHE_MAX_ROWS", "500000")
+    )
+    HNSW_M = int(get_non_empty_env("HNSW_M", "16"))
+    HNSW_EF_CONSTRUCTION = int(get_non_empty_env("HNSW_EF_CONSTRUCTION", "64"))
+    HNSW_ITERATIVE_SCAN = get_non_empty_env("HNSW_ITERATIVE_SCAN", "strict_order")
+    VECTOR_STORAGE = VectorStorage.from_str(
+        get_non_empty_env("VECTOR_STORAGE", "float32")
+    )
+    RERANK_CANDIDATE_FACTOR = int(get_non_empty_env("RERANK_CANDIDATE_FACTOR", "4"))
+    VECTOR_BACKEND = VectorBackend.from_str(
+        get_non_empty_env("VECTOR_BACKEND", "pgvector")
+    )
+    VECTOR_INDEX_DTYPE = get_non_empty_env("VECTOR_INDEX_DTYPE", "float32")
+    RETRIEVAL_MODE = RetrievalMode.from_str(
+        get_non_empty_env("RETRIEVAL_MODE", "vector")
+    )
+    HYBRID_VECTOR_WEIGHT = float(get_non_empty_env("HYBRID_VECTOR_WEIGHT", "1.0"))
+    HYBRID_LEXICAL_WEIGHT = float(get_non_empty_env("HYBRID_LEXICAL_WEIGHT", "1.0"))
+    HYBRID_CANDIDATE_FACTOR = int(get_non_empty_env("HYBRID_CANDIDATE_FACTOR", "4"))
+    RRF_K = int(get_non_empty_env("RRF_K", "60"))
+    MMR_LAMBDA = float(get_non_empty_env("MMR_LAMBDA", "0.7"))
+    MMR_CANDIDATE_POOL = int(get_non_empty_env("MMR_CANDIDATE_POOL", "20"))
+    RETRIEVAL_MIN_SIMILARITY = float(
+        get_non_empty_env("RETRIEVAL_MIN_SIMILARITY", "-1.0")
+    )
+    RETRIEVAL_MAX_SIMILARITY_DROP = float(
+        get_non_empty_env("RETRIEVAL_MAX_SIMILARITY_DROP", "2.0")
+    )
+    PROMPT_TOKEN_BUDGET = int(get_non_empty_env("PROMPT_TOKEN_BUDGET", "4000"))
+    PROMPT_HISTORY_SHARE = float(get_non_empty_env("PROMPT_HISTORY_SHARE", "0.25"))
+    PROMPT_MAX_SEGMENT_TOKENS = int(
+        get_non_empty_env("PROMPT_MAX_SEGMENT_TOKENS", "512")
+    )
+    NO_CONTEXT_SKIP_LLM = (
+        get_non_empty_env("NO_CONTEXT_SKIP_LLM", "false").lower() == "true"
+    )
+    SEGMENT_SIZE = int(get_non_empty_env("SEGMENT_SIZE", "1000"))
+    SEGMENT_OVERLAP = int(get_non_empty_env("SEGMENT_OVERLAP", "2"))
+    SEGMENT_SIZE_UNIT = SegmentSizeUnit.from_str(
+        get_non_empty_env("SEGMENT_SIZE_UNIT", "characters")
+    )
+    PDF_EXTRACTION_WORKERS = int(get_non_empty_env("PDF_EXTRACTION_WORKERS", "4"))
+    PDF_PARALLEL_MIN_PAGES = int(get_non_empty_env("PDF_PARALLEL_MIN_PAGES", "64"))
+    NEIGHBOUR_EXPANSION = int(get_non_empty_env("NEIGHBOUR_EXPANSION", "0"))
+    INGESTION_CHUNK_SIZE = int(get_non_empty_env("INGESTION_CHUNK_SIZE", "256"))
+    INGESTION_POLL_INTERVAL = float(get_non_empty_env("INGESTION_POLL_INTERVAL", "2"))
+    INGESTION_JOB_TIMEOUT = float(get_non_empty_env("INGESTION_JOB_TIMEOUT", "1800"))
+    INGESTION_MAX_ATTEMPTS = int(get_non_empty_env("INGESTION_MAX_ATTEMPTS", "3"))
+    COMPACTION_BATCH_SIZE = int(get_non_empty_env("COMPACTION_BATCH_SIZE", "1000"))
+    QUERY_EMBEDDING_CACHE_SIZE = int(
+        get_non_empty_env("QUERY_EMBEDDING_CACHE_SIZE", "1024")
+    )
+    QUERY_EMBEDDING_CACHE_TTL = float(
+        get_non_empty_env("QUERY_EMBEDDING_CACHE_TTL", "3600")
+    )
+
     FILE_STORAGE_PATH = Path(
         get_non_empty_env("FILE_STORAGE_PATH", Path(__file__).parent / "db" / "uploads")
     )
+    VECTOR_INDEX_PATH = Path(
+        get_non_empty_env(
+            "VECTOR_INDEX_PATH", Path(__file__).parent / "db" / "vector_index"
+        )
+    )
@@ -7,6 +7,11 @@ It also allows the user to add mock data to the database for demonstration purpo
 Usage (assuming running from project root):
   uv run ucr_chatbot/db/cli.py initialize [--force]
   uv run ucr_chatbot/db/cli.py mock
+  uv run ucr_chatbot/db/cli.py build-index [--model NAME] [--storage S] [--m M] [--ef-construction N]
+  uv run ucr_chatbot/db/cli.py rebuild-index [--model NAME] [--storage S] [--m M] [--ef-construction N]
+  uv run ucr_chatbot/db/cli.py tune-index [--model NAME] [--storage S] [--ef-search N] [--m M] [--ef-construction N]
+  uv run ucr_chatbot/db/cli.py reembed --course ID --model NAME [--batch-size N] [--keep-old]
+  uv run ucr_chatbot/db/cli.py compact [--batch-size N] [--reindex] [--every SECONDS]
 
 
 This file contains the following functions:
@@ -21,14 +26,44 @@ This file contains the following functions:
       - test002@ucr.edu (student access)
       - test003@ucr.edu (assistant access)
 
+    * migrate_embeddings() - Adds the embedding model columns to an existing database and
+      lets Embeddings.vector hold vectors of any dimension.
+
+    * migrate_segments() - Adds the document version, segment content hash, and full-text
+      search columns to an existing database and fills in the hashes of stored segments.
+
+    * build_index(m: int, ef_construction: int, model: str, storage: VectorStorage) - Builds the
+      HNSW index over one model's embeddings without blocking writes, if it does not exist yet.
+      The index holds float32, halfvec, or binary-quantized vectors depending on storage.
+
+    * rebuild_index(m: int, ef_construction: int, model: str, storage: VectorStorage) - Builds a
+      replacement HNSW index concurrently, then swaps it in for the old one.
+
+    * tune_index(ef_search: int | None, m: int | None, ef_construction: int | None, model: str,
+      storage: VectorStorage) - Sets the database-wide hnsw.ef_search and rebuilds the index if
+      m or ef_construction changed.
+
+    * reembed(course_id: int, model: str, batch_size: int, keep_old: bool) - Embeds a course's
+      segments with another model in resumable batches, builds that model's index, switches
+      the course over, and deletes the old embeddings unless --keep-old is passed.
+
+    * compact(batch_size: int, reindex: bool) - Deletes the embeddings and segments of inactive
+      documents and retired segments in batches, keeping the segments that References point at,
+      deletes the documents and uploaded files left empty, and vacuums the tables. With --reindex
+      the tables' indexes are also rebuilt to return their space. With --every the compaction
+      runs again after each interval until interrupted.
+
     * main() - Initializes the argument parser, parses the CLI arguments,
       and calls the corresponding functions.
 
 """
 
 import argparse
+import time
 from sqlalchemy import inspect, text
 
+from ucr_chatbot.config import VectorStorage, embedding_dimensions_for
+
 try:
     from ucr_chatbot.db.models import (
         engine,
@@ -40,6 +75,12 @@ try:
         add_user_to_course,
         Session,
         delete_uploads_folder,
+        vector_index_name,
+        VECTOR_OPERATOR_CLASSES,
+        TEXT_SEARCH_CONFIG,
+        compact_segments,
+        delete_inactive_documents,
+        Config,
     )
 except ModuleNotFoundError:
     from models import (
@@ -52,6 +93,12 @@ except ModuleNotFoundError:
         add_user_to_course,
         Session,
         delete_uploads_folder,
+        vector_index_name,
+        VECTOR_OPERATOR_CLASSES,
+        TEXT_SEARCH_CONFIG,
+        compact_segments,
+        delete_inactive_documents,
+        Config,
     )
 
 inspector = inspect(engine)
@@ -85,6 +132,9 @@ def initialize(force: bool):
         base.metadata.create_all(engine)
         print("Database cleared and initialized.")
     else:
+        migrate_embeddings()
+        migrate_segments()
+        base.metadata.create_all(engine)
         print("Database already initialized.")
 
 
@@ -122,12 +172,387 @@ def mock():
             print("Mock data not added, database already has data.")
 
 
+LEGACY_VECTOR_INDEX_NAME = "ix_embeddings_vector_hnsw"
+
+
+def migrate_embeddings():
+    """Brings the Embeddings and Courses tables of an existing database up to date.
+    Adds the columns that record which model produced each vector and which model
+    serves each course, and lets Embeddings.vector hold vectors of any dimension so
+    that several models can coexist. Each model is indexed through its own partial index.
+    Also copies each embedding's course and active flag from its document, so that
+    vector search can filter on them without joins.
+    """
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                f'ALTER TABLE "Embeddings" ADD COLUMN IF NOT EXISTS model VARCHAR '
+                f"NOT NULL DEFAULT {_sql_literal(Config.EMBEDDING_MODEL)}"
+            )
+        )
+        connection.execute(
+            text(
+                'ALTER TABLE "Courses" ADD COLUMN IF NOT EXISTS embedding_model VARCHAR'
+            )
+        )
+        connection.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_embeddings_segment_id_model "
+                'ON "Embeddings" (segment_id, model)'
+            )
+        )
+        connection.execute(
+            text(
+                'ALTER TABLE "Embeddings" ADD COLUMN IF NOT EXISTS course_id INTEGER '
+                'REFERENCES "Courses" (id)'
+            )
+        )
+        connection.execute(
+            text(
+                'ALTER TABLE "Embeddings" ADD COLUMN IF NOT EXISTS is_active BOOLEAN '
+                "NOT NULL DEFAULT true"
+            )
+        )
+        result = connection.execute(
+            text(
+                """UPDATE "Embeddings" AS e
+                SET course_id = d.course_id, is_active = d.is_active
+                FROM "Segments" AS s JOIN "Documents" AS d ON d.file_path = s.document_id
+                WHERE s.id = e.segment_id AND e.course_id IS NULL"""
+            )
+        )
+        if result.rowcount:
+            print(
+                f"Copied the course and active flag onto {result.rowcount} embeddings."
+            )
+        connection.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_embeddings_model_course_id "
+                'ON "Embeddings" (model, course_id) WHERE is_active'
+            )
+        )
+        dimensions = connection.execute(
+            text(
+                """SELECT atttypmod FROM pg_attribute
+                WHERE attrelid = '"Embeddings"'::regclass AND attname = 'vector'"""
+            )
+        ).scalar_one()
+        if dimensions != -1:
+            connection.execute(text(f"DROP INDEX IF EXISTS {LEGACY_VECTOR_INDEX_NAME}"))
+            connection.execute(
+                text('ALTER TABLE "Embeddings" ALTER COLUMN vector TYPE vector')
+            )
+            print("Embeddings.vector no longer fixed to one dimension.")
+
+
+def migrate_segments():
+    """Brings the Documents and Segments tables of an existing database up to date.
+    Adds the columns that let a re-uploaded document reuse its unchanged segments,
+    and computes the content hash of every segment stored before they existed.
+    Also adds the full-text search column of Segments and its GIN index, and the
+    position of each segment within its document, numbering the active segments
+    stored before it existed in the order they were inserted, with its page and section.
+    """
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                'ALTER TABLE "Documents" ADD COLUMN IF NOT EXISTS version INTEGER '
+                "NOT NULL DEFAULT 1"
+            )
+        )
+        connection.execute(
+            text(
+                'ALTER TABLE "Segments" ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)'
+            )
+        )
+        connection.execute(
+            text(
+                'ALTER TABLE "Segments" ADD COLUMN IF NOT EXISTS is_active BOOLEAN '
+                "NOT NULL DEFAULT true"
+            )
+        )
+        connection.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_segments_document_id_active "
+                'ON "Segments" (document_id, is_active)'
+            )
+        )
+        connection.execute(
+            text(
+                'ALTER TABLE "Segments" ADD COLUMN IF NOT EXISTS search_vector tsvector '
+                f"GENERATED ALWAYS AS (to_tsvector('{TEXT_SEARCH_CONFIG}', "
+                "coalesce(text, ''))) STORED"
+            )
+        )
+        connection.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_segments_search_vector "
+                'ON "Segments" USING gin (search_vector)'
+            )
+        )
+        connection.execute(
+            text('ALTER TABLE "Segments" ADD COLUMN IF NOT EXISTS ordinal INTEGER')
+        )
+        connection.execute(
+            text('ALTER TABLE "Segments" ADD COLUMN IF NOT EXISTS page INTEGER')
+        )
+        connection.execute(
+            text('ALTER TABLE "Segments" ADD COLUMN IF NOT EXISTS section VARCHAR')
+        )
+        connection.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_segments_document_id_ordinal "
+                'ON "Segments" (document_id, ordinal) WHERE is_active'
+            )
+        )
+        result = connection.execute(
+            text(
+                """UPDATE "Segments" AS s
+                SET ordinal = numbered.ordinal
+                FROM (
+                    SELECT id, row_number() OVER (PARTITION BY document_id ORDER BY id) - 1 AS ordinal
+                    FROM "Segments"
+                    WHERE is_active
+                ) AS numbered
+                WHERE s.id = numbered.id AND s.ordinal IS NULL"""
+            )
+        )
+        if result.rowcount:
+            print(f"Numbered {result.rowcount} segments.")
+        result = connection.execute(
+            text(
+                """UPDATE "Segments"
+                SET content_hash = encode(sha256(convert_to(coalesce(text, ''), 'UTF8')), 'hex')
+                WHERE content_hash IS NULL"""
+            )
+        )
+        if result.rowcount:
+            print(f"Hashed {result.rowcount} segments.")
+
+
+def _sql_literal(value: str) -> str:
+    """Quotes a string for use as a literal in a DDL statement."""
+    return "'" + value.replace("'", "''") + "'"
+
+
+def model_dimensions(model: str) -> int:
+    """Gets the number of dimensions of a model's embeddings.
+    Uses a stored embedding if there is one, and the configured dimensions otherwise.
+    :param model: The name of the embedding model.
+    """
+    with engine.connect() as connection:
+        dimensions = connection.execute(
+            text(
+                'SELECT vector_dims(vector) FROM "Embeddings" WHERE model = :model LIMIT 1'
+            ),
+            {"model": model},
+        ).scalar_one_or_none()
+    if dimensions is not None:
+        return int(dimensions)
+    if model == Config.EMBEDDING_MODEL:
+        return Config.EMBEDDING_DIMENSIONS
+    return embedding_dimensions_for(model)
+
+
+def _vector_index_element(dimensions: int, storage: VectorStorage) -> str:
+    """Gets the indexed expression and operator class of an HNSW index, as in compact_vector.
+    :param dimensions: The number of dimensions of the vectors.
+    :param storage: The representation of the vectors in the index.
+    """
+    match storage:
+        case VectorStorage.FLOAT32:
+            expression = f"CAST(vector AS vector({dimensions}))"
+        case VectorStorage.HALFVEC:
+            expression = f"CAST(vector AS halfvec({dimensions}))"
+        case VectorStorage.BINARY:
+            expression = f"CAST(binary_quantize(vector) AS bit({dimensions}))"
+    return f"{expression} {VECTOR_OPERATOR_CLASSES[storage]}"
+
+
+def _create_vector_index(
+    name: str, model: str, storage: VectorStorage, m: int, ef_construction: int
+):
+    """Creates an HNSW index on one model's embeddings without blocking writes.
+    :param name: The name of the index to create.
+    :param model: The name of the embedding model whose vectors are indexed.
+    :param storage: The representation of the vectors in the index.
+    :param m: The maximal number of connections per node in each graph layer.
+    :param ef_construction: The size of the candidate list used while building the graph.
+    """
+    element = _vector_index_element(model_dimensions(model), storage)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(
+            text(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON "Embeddings" '
+                f"USING hnsw ({element}) "
+                f"WITH (m = {int(m)}, ef_construction = {int(ef_construction)}) "
+                f"WHERE model = {_sql_literal(model)}"
+            )
+        )
+
+
+def build_index(
+    m: int,
+    ef_construction: int,
+    model: str = Config.EMBEDDING_MODEL,
+    storage: VectorStorage = Config.VECTOR_STORAGE,
+):
+    """Builds the approximate nearest neighbour index on a model's embeddings if it does not already exist.
+    :param m: The maximal number of connections per node in each graph layer.
+    :param ef_construction: The size of the candidate list used while building the graph.
+    :param model: The name of the embedding model whose vectors are indexed.
+    :param storage: The representation of the vectors in the index.
+    """
+    migrate_embeddings()
+    name = vector_index_name(model, storage)
+    _create_vector_index(name, model, storage, m, ef_construction)
+    print(f"Index {name} built (m={m}, ef_construction={ef_construction}).")
+
+
+def rebuild_index(
+    m: int,
+    ef_construction: int,
+    model: str = Config.EMBEDDING_MODEL,
+    storage: VectorStorage = Config.VECTOR_STORAGE,
+):
+    """Builds a new approximate nearest neighbour index next to the current one and swaps it in.
+    Queries keep using the old index until the new one is complete.
+    :param m: The maximal number of connections per node in each graph layer.
+    :param ef_construction: The size of the candidate list used while building the graph.
+    :param model: The name of the embedding model whose vectors are indexed.
+    :param storage: The representation of the vectors in the index.
+    """
+    migrate_embeddings()
+    name = vector_index_name(model, storage)
+    replacement = f"{name}_new"
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {replacement}"))
+    _create_vector_index(replacement, model, storage, m, ef_construction)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        connection.execute(text(f"ALTER INDEX {replacement} RENAME TO {name}"))
+    print(f"Index {name} rebuilt (m={m}, ef_construction={ef_construction}).")
+
+
+def tune_index(
+    ef_search: int | None,
+    m: int | None,
+    ef_construction: int | None,
+    model: str = Config.EMBEDDING_MODEL,
+    storage: VectorStorage = Config.VECTOR_STORAGE,
+):
+    """Tunes the approximate nearest neighbour index.
+    :param ef_search: If given, the size of the candidate list used by queries, set as the database default.
+    :param m: If given, rebuilds the index with this many connections per node.
+    :param ef_construction: If given, rebuilds the index with this candidate list size.
+    :param model: The name of the embedding model whose index is rebuilt.
+    :param storage: The representation of the vectors in the rebuilt index.
+    """
+    if ef_search is not None:
+        with engine.connect().execution_options(
+            isolation_level="AUTOCOMMIT"
+        ) as connection:
+            connection.execute(
+                text(
+                    f'ALTER DATABASE "{Config.DB_NAME}" SET hnsw.ef_search = {int(ef_search)}'
+                )
+            )
+        print(f"hnsw.ef_search set to {ef_search} for new connections.")
+    if m is not None or ef_construction is not None:
+        rebuild_index(
+            m or Config.HNSW_M,
+            ef_construction or Config.HNSW_EF_CONSTRUCTION,
+            model,
+            storage,
+        )
+
+
+def reembed(course_id: int, model: str, batch_size: int, keep_old: bool):
+    """Re-embeds a course's segments with another model and switches the course over to it.
+    Safe to interrupt and run again: segments that already have an embedding by
+    the model are skipped.
+    :param course_id: The id of the course.
+    :param model: The name of the embedding model to move to.
+    :param batch_size: The number of segments embedded and stored per batch.
+    :param keep_old: If True, the embeddings by previous models are kept.
+    """
+    from ucr_chatbot.api.embedding.reembedding import reembed_course
+
+    migrate_embeddings()
+    embedded = reembed_course(
+        course_id,
+        model,
+        batch_size,
+        keep_old,
+        before_cutover=lambda: build_index(
+            Config.HNSW_M, Config.HNSW_EF_CONSTRUCTION, model
+        ),
+        on_progress=lambda count: print(f"{count} segments embedded with {model}."),
+    )
+    print(f"Course {course_id} now uses {model} ({embedded} segments embedded).")
+
+
+def _table_bytes() -> int:
+    """Gets the on-disk size of the Segments and Embeddings tables, including their indexes."""
+    with engine.connect() as connection:
+        return int(
+            connection.execute(
+                text(
+                    """SELECT pg_total_relation_size('"Segments"')
+                    + pg_total_relation_size('"Embeddings"')"""
+                )
+            ).scalar_one()
+        )
+
+
+def compact(batch_size: int, reindex: bool):
+    """Removes the segments and embeddings that retrieval no longer uses and reclaims their space.
+    Each batch is its own transaction, so compaction can run next to the server and the
+    ingestion worker. A plain VACUUM makes the freed pages reusable but rarely shrinks
+    the files; pass reindex to also rebuild the indexes without blocking writes.
+    The schema is not migrated here, so run initialize after upgrading first.
+    :param batch_size: The number of segments removed per transaction.
+    :param reindex: If True, rebuilds the indexes of Segments and Embeddings concurrently.
+    """
+    bytes_before = _table_bytes()
+
+    embeddings = segments = 0
+    while True:
+        deleted_embeddings, deleted_segments = compact_segments(batch_size)
+        if not deleted_embeddings and not deleted_segments:
+            break
+        embeddings += deleted_embeddings
+        segments += deleted_segments
+        print(f"{embeddings} embeddings and {segments} segments deleted.")
+
+    documents = delete_inactive_documents()
+    file_bytes = sum(documents.values())
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        for table in ("Segments", "Embeddings"):
+            connection.execute(text(f'VACUUM (ANALYZE) "{table}"'))
+            if reindex:
+                connection.execute(text(f'REINDEX TABLE CONCURRENTLY "{table}"'))
+
+    freed = bytes_before - _table_bytes()
+    print(
+        f"Compacted {embeddings} embeddings, {segments} segments, and {len(documents)} "
+        f"documents: {freed / 2**20:.1f} MiB freed in the database "
+        f"and {file_bytes / 2**20:.1f} MiB of uploads."
+    )
+
+
 def main(arg_list: list[str] | None = None):
     """Initializes the argument parser and gets the arguments passed in through the CLI
 
     Usage:
       uv run ucr_chatbot/db/cli.py initialize [--force]
       uv run ucr_chatbot/db/cli.py mock
+      uv run ucr_chatbot/db/cli.py build-index [--model NAME] [--storage S] [--m M] [--ef-construction N]
+      uv run ucr_chatbot/db/cli.py rebuild-index [--model NAME] [--storage S] [--m M] [--ef-construction N]
+      uv run ucr_chatbot/db/cli.py tune-index [--model NAME] [--storage S] [--ef-search N] [--m M] [--ef-construction N]
+      uv run ucr_chatbot/db/cli.py reembed --course ID --model NAME [--batch-size N] [--keep-old]
+      uv run ucr_chatbot/db/cli.py compact [--batch-size N] [--reindex] [--every SECONDS]
     """
     parser = argparse.ArgumentParser(
         description=__doc__,
@@ -137,8 +562,19 @@ def main(arg_list: list[str] | None = None):
     parser.add_argument(
         "action",
         type=str,
-        choices=["initialize", "mock"],
-        help="use 'initialize' to set up database tables or 'mock' to add mock data",
+        choices=[
+            "initialize",
+            "mock",
+            "build-index",
+            "rebuild-index",
+            "tune-index",
+            "reembed",
+            "compact",
+        ],
+        help="use 'initialize' to set up database tables, 'mock' to add mock data, "
+        "'*-index' to manage the vector search index, "
+        "'reembed' to move a course to another embedding model, "
+        "or 'compact' to remove the segments of deleted documents",
     )
     parser.add_argument(
         "--force",
@@ -147,12 +583,109 @@ def main(arg_list: list[str] | None = None):
         help="use with 'initialize' to forcefully clear and recreate all tables",
     )
 
+    parser.add_argument(
+        "--m",
+        type=int,
+        default=None,
+        help="use with '*-index' to set the HNSW connections per node",
+    )
+    parser.add_argument(
+        "--ef-construction",
+        type=int,
+        default=None,
+        help="use with '*-index' to set the HNSW build candidate list size",
+    )
+    parser.add_argument(
+        "--ef-search",
+        type=int,
+        default=None,
+        help="use with 'tune-index' to set the HNSW query candidate list size",
+    )
+    parser.add_argument(
+        "--model",
+        type=str,
+        default=Config.EMBEDDING_MODEL,
+        help="use with '*-index' or 'reembed' to choose the embedding model",
+    )
+    parser.add_argument(
+        "--storage",
+        type=VectorStorage.from_str,
+        default=Config.VECTOR_STORAGE,
+        help="use with '*-index' to index float32, halfvec, or binary vectors",
+    )
+    parser.add_argument(
+        "--course",
+        type=int,
+        default=None,
+        help="use with 'reembed' to choose the course to re-embed",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=None,
+        help="use with 'reembed' or 'compact' to set the number of segments handled per batch",
+    )
+    parser.add_argument(
+        "--keep-old",
+        action="store_true",
+        default=False,
+        help="use with 'reembed' to keep the embeddings by the previous model",
+    )
+    parser.add_argument(
+        "--reindex",
+        action="store_true",
+        default=False,
+        help="use with 'compact' to rebuild the indexes and return their freed space",
+    )
+    parser.add_argument(
+        "--every",
+        type=float,
+        default=None,
+        help="use with 'compact' to compact again every this many seconds until interrupted",
+    )
+
     args = parser.parse_args(arg_list)
 
     if args.action == "initialize":
         initialize(args.force)
     elif args.action == "mock":
         mock()
+    elif args.action == "build-index":
+        build_index(
+            args.m or Config.HNSW_M,
+            args.ef_construction or Config.HNSW_EF_CONSTRUCTION,
+            args.model,
+            args.storage,
+        )
+    elif args.action == "rebuild-index":
+        rebuild_index(
+            args.m or Config.HNSW_M,
+            args.ef_construction or Config.HNSW_EF_CONSTRUCTION,
+            args.model,
+            args.storage,
+        )
+    elif args.action == "tune-index":
+        tune_index(
+            args.ef_search, args.m, args.ef_construction, args.model, args.storage
+        )
+    elif args.action == "reembed":
+        if args.course is None:
+            parser.error("'reembed' requires --course")
+        reembed(
+            args.course,
+            args.model,
+            args.batch_size or Config.EMBEDDING_BATCH_SIZE,
+            args.keep_old,
+        )
+    elif args.action == "compact":
+        try:
+            while True:
+                compact(args.batch_size or Config.COMPACTION_BATCH_SIZE, args.reindex)
+                if args.every is None:
+                    break
+                time.sleep(args.every)
+        except KeyboardInterrupt:
+            pass
 
 
 if __name__ == "__main__":
@@ -8,15 +8,35 @@ from sqlalchemy import (
     Text,
     Enum,
     Boolean,
+    Computed,
+    Float,
+    Index,
+    insert,
+    select,
+    update,
+    delete,
+    func,
+    or_,
+    tuple_,
+    table,
+    column,
 )
+from sqlalchemy.dialects.postgresql import TSVECTOR, insert as pg_insert
+from sqlalchemy.sql.elements import ColumnElement
 from sqlalchemy.orm import declarative_base, mapped_column, relationship, Session
+from collections import Counter
+from dataclasses import dataclass
 import enum
-from pgvector.sqlalchemy import Vector  # type: ignore
-from datetime import datetime, timezone
+from hashlib import sha256
+from itertools import batched
+import re
+from pgvector.sqlalchemy import BIT, HALFVEC, Vector  # type: ignore
+from datetime import datetime, timedelta, timezone
 from sqlalchemy.exc import SQLAlchemyError
 import pandas as pd
 from typing import cast
 import secrets
+import time
 import string
 import shutil
 from pathlib import Path
@@ -25,18 +45,24 @@ from pathlib import Path
 from flask_login import UserMixin  # type: ignore
 from werkzeug.security import generate_password_hash, check_password_hash
 
-from typing import Sequence
+from typing import Any, Callable, Iterable, Iterator, Mapping, Sequence
 
 
-from ucr_chatbot.config import Config
+from ucr_chatbot.config import Config, VectorStorage
 
 
 engine = create_engine(
-    f"""postgresql+psycopg2://{Config.DB_USER}:{Config.DB_PASSWORD}@{Config.DB_URL}/{Config.DB_NAME}"""
+    f"""postgresql+psycopg2://{Config.DB_USER}:{Config.DB_PASSWORD}@{Config.DB_URL}/{Config.DB_NAME}""",
+    # Lets filtered HNSW scans (pgvector 0.8+) keep searching until enough rows pass the filter.
+    connect_args={"options": f"-c hnsw.iterative_scan={Config.HNSW_ITERATIVE_SCAN}"},
 )
 
 base = declarative_base()
 
+# The 'simple' configuration neither stems words nor drops stop words, so that
+# identifiers such as the LC-3 opcodes AND and NOT remain searchable.
+TEXT_SEARCH_CONFIG = "simple"
+
 
 class MessageType(enum.Enum):
     """Manditory choices for Message type"""
@@ -125,6 +151,7 @@ class Courses(base):
     __tablename__ = "Courses"
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String)
+    embedding_model = Column(String, nullable=True)
 
     conversations = relationship("Conversations", back_populates="course", uselist=True)
     documents = relationship("Documents", back_populates="course", uselist=True)
@@ -138,6 +165,7 @@ class Documents(base):
     file_path = Column(String, primary_key=True)
     course_id = Column(Integer, ForeignKey("Courses.id"), nullable=False)
     is_active = Column(Boolean, default=True, nullable=False)
+    version = Column(Integer, default=1, nullable=False)
 
     course = relationship("Courses", back_populates="documents")
     segments = relationship("Segments", back_populates="document", uselist=True)
@@ -150,10 +178,61 @@ class Segments(base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     text = Column(String)
     document_id = Column(String, ForeignKey("Documents.file_path"), nullable=False)
+    content_hash = Column(String(64))
+    is_active = Column(Boolean, default=True, nullable=False)
+    ordinal = Column(Integer)
+    """The position of the segment among the active segments of its document, from 0."""
+    page = Column(Integer)
+    """The page of the document on which the segment starts, from 1, if it has pages."""
+    section = Column(String)
+    """The headings of the section of the document that the segment is in, if it has headings."""
+    search_vector = mapped_column(
+        TSVECTOR,
+        Computed(
+            f"to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(text, ''))", persisted=True
+        ),
+        deferred=True,
+    )
 
     document = relationship("Documents", back_populates="segments")
     embeddings = relationship("Embeddings", back_populates="segment", uselist=True)
 
+    __table_args__ = (
+        Index("ix_segments_document_id_active", document_id, is_active),
+        Index(
+            "ix_segments_document_id_ordinal",
+            document_id,
+            ordinal,
+            postgresql_where=is_active,
+        ),
+        Index("ix_segments_search_vector", search_vector, postgresql_using="gin"),
+    )
+
+
+def segment_hash(text: str) -> str:
+    """Computes the SHA-256 hex digest of a segment's exact text."""
+    return sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class SegmentDiff:
+    """How a new version of a document's segments was reconciled with the stored ones."""
+
+    version: int
+    added: int
+    retired: int
+    reused: int
+    added_segments: list[tuple[int, str]]
+    """The id and content hash of each added segment."""
+
+
+class EmbeddingModelChangedError(Exception):
+    """A document's segments were embedded by a model that its course no longer uses."""
+
+    def __init__(self, model: str):
+        super().__init__(f"The course now uses the embedding model '{model}'")
+        self.model = model
+
 
 class Messages(base):
     """Represents a specific message between a user and LLM"""
@@ -170,6 +249,68 @@ class Messages(base):
     user = relationship("Users", back_populates="messages")
 
 
+VECTOR_OPERATOR_CLASSES = {
+    VectorStorage.FLOAT32: "vector_l2_ops",
+    VectorStorage.HALFVEC: "halfvec_l2_ops",
+    VectorStorage.BINARY: "bit_hamming_ops",
+}
+
+
+def vector_index_name(
+    model: str, storage: VectorStorage = Config.VECTOR_STORAGE
+) -> str:
+    """Gets the name of the approximate nearest neighbour index over one model's embeddings.
+    :param model: The name of the embedding model.
+    :param storage: The representation of the vectors in the index.
+    """
+    name = "ix_embeddings_hnsw_" + re.sub(r"[^a-z0-9]+", "_", model.lower()).strip("_")
+    if storage != VectorStorage.FLOAT32:
+        name += "_" + storage.name.lower()
+    return name
+
+
+def compact_vector(
+    dimensions: int, storage: VectorStorage = Config.VECTOR_STORAGE
+) -> ColumnElement[Any]:
+    """Converts Embeddings.vector to the representation that storage indexes.
+
+    float32 keeps the full vectors, halfvec rounds each component to 16 bits,
+    and binary keeps only the sign of each component.
+
+    :param dimensions: The number of dimensions of the vectors.
+    :param storage: The representation to convert to.
+    """
+    match storage:
+        case VectorStorage.FLOAT32:
+            return Embeddings.vector.cast(Vector(dimensions))
+        case VectorStorage.HALFVEC:
+            return Embeddings.vector.cast(HALFVEC(dimensions))
+        case VectorStorage.BINARY:
+            return func.binary_quantize(Embeddings.vector).cast(BIT(dimensions))
+
+
+def compact_distance(
+    embedding: Sequence[float], storage: VectorStorage = Config.VECTOR_STORAGE
+) -> ColumnElement[float]:
+    """Builds the distance between the compact representation of Embeddings.vector and embedding.
+    The expression matches that of the model's HNSW index so that the index can be used.
+    :param embedding: The vector to measure the distance to.
+    :param storage: The representation in which to compare the vectors.
+    """
+    compact = compact_vector(len(embedding), storage)
+    if storage == VectorStorage.BINARY:
+        bits = "".join("1" if component > 0 else "0" for component in embedding)
+        return compact.op("<~>", return_type=Float[float]())(bits)
+    return compact.op("<->", return_type=Float[float]())(embedding)
+
+
+def vector_distance(embedding: Sequence[float]) -> ColumnElement[float]:
+    """Builds the exact L2 distance between Embeddings.vector and embedding.
+    :param embedding: The vector to measure the distance to.
+    """
+    return compact_distance(embedding, VectorStorage.FLOAT32)
+
+
 class Embeddings(base):
     """Represents the embedding of a segment"""
 
@@ -177,9 +318,49 @@ class Embeddings(base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     vector = mapped_column(Vector)
     segment_id = Column(Integer, ForeignKey("Segments.id"), nullable=False)
+    model = Column(String, nullable=False, default=Config.EMBEDDING_MODEL)
+    # Copied from the segment's document so that vector search filters without joins.
+    course_id = Column(Integer, ForeignKey("Courses.id"))
+    is_active = Column(Boolean, default=True, nullable=False)
 
     segment = relationship("Segments", back_populates="embeddings")
 
+    __table_args__ = (
+        Index("ix_embeddings_segment_id_model", segment_id, model),
+        Index(
+            "ix_embeddings_model_course_id",
+            model,
+            course_id,
+            postgresql_where=is_active,
+        ),
+    )
+
+
+Index(
+    vector_index_name(Config.EMBEDDING_MODEL),
+    compact_vector(Config.EMBEDDING_DIMENSIONS).label("vector"),
+    postgresql_using="hnsw",
+    postgresql_with={
+        "m": Config.HNSW_M,
+        "ef_construction": Config.HNSW_EF_CONSTRUCTION,
+    },
+    postgresql_ops={"vector": VECTOR_OPERATOR_CLASSES[Config.VECTOR_STORAGE]},
+    postgresql_where=Embeddings.model == Config.EMBEDDING_MODEL,
+)
+
+
+class EmbeddingCache(base):
+    """Represents a previously computed embedding, keyed by model and text hash"""
+
+    __tablename__ = "EmbeddingCache"
+    model = Column(String, primary_key=True)
+    text_hash = Column(String(64), primary_key=True)
+    vector = mapped_column(Vector, nullable=False)
+    hits = Column(Integer, default=0, nullable=False)
+    last_used = Column(
+        DateTime, default=lambda: datetime.now(timezone.utc), nullable=False, index=True
+    )
+
 
 class References(base):
     """Represents the relationship between a message and referenced segments"""
@@ -189,6 +370,39 @@ class References(base):
     segment = Column(Integer, ForeignKey("Segments.id"), primary_key=True)
 
 
+class JobStatus(enum.Enum):
+    """The states an ingestion job moves through"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class IngestionJobs(base):
+    """Represents an uploaded document waiting for, or going through, parsing, embedding, and storage"""
+
+    __tablename__ = "IngestionJobs"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    document_id = Column(String, ForeignKey("Documents.file_path"), nullable=False)
+    course_id = Column(Integer, ForeignKey("Courses.id"), nullable=False)
+    status = Column(Enum(JobStatus), default=JobStatus.QUEUED, nullable=False)
+    segments_parsed = Column(Integer)
+    segments_embedded = Column(Integer, default=0, nullable=False)
+    segments_stored = Column(Integer, default=0, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    error = Column(Text)
+    created_at = Column(
+        DateTime, default=lambda: datetime.now(timezone.utc), nullable=False
+    )
+    updated_at = Column(
+        DateTime, default=lambda: datetime.now(timezone.utc), nullable=False
+    )
+    finished_at = Column(DateTime)
+
+    __table_args__ = (Index("ix_ingestionjobs_status_id", status, id),)
+
+
 # base.metadata.drop_all(engine)
 # base.metadata.create_all(engine)
 
@@ -322,6 +536,7 @@ def set_document_inactive(file_path: str):
         document = session.query(Documents).filter_by(file_path=file_path).first()
         if document:
             document.is_active = False  # type: ignore
+            _set_embeddings_active(session, file_path, False)
             session.commit()
 
 
@@ -350,6 +565,7 @@ def store_segment(segment_text: str, file_path: str) -> int:
         new_segment = Segments(
             text=segment_text,
             document_id=file_path,
+            content_hash=segment_hash(segment_text),
         )
         session.add(new_segment)
         session.flush()
@@ -359,17 +575,25 @@ def store_segment(segment_text: str, file_path: str) -> int:
         return segment_id
 
 
-def store_embedding(embedding: Sequence[float], segment_id: int):
+def store_embedding(
+    embedding: Sequence[float], segment_id: int, model: str = Config.EMBEDDING_MODEL
+):
     """Creates new Embeddings instance and stores it into Embeddings table.
     :param embedding: List of floats representing the vector embedding.
     :param segment_id: ID for the segment the vector embedding represents.
+    :param model: The name of the model that produced the embedding.
     """
     with Session(engine) as session:
-        # segment = session.query(Segments).filter_by(id=segment_id).first()
+        document = (
+            session.query(Documents).join(Segments).filter(Segments.id == segment_id)
+        )
         try:
             new_embedding = Embeddings(
                 vector=embedding,
                 segment_id=segment_id,
+                model=model,
+                course_id=document.with_entities(Documents.course_id).scalar_subquery(),
+                is_active=document.with_entities(Documents.is_active).scalar_subquery(),
             )
             session.add(new_embedding)
             session.commit()
@@ -377,6 +601,840 @@ def store_embedding(embedding: Sequence[float], segment_id: int):
             session.rollback()
 
 
+def store_embeddings(
+    segment_ids: Sequence[int],
+    embeddings: Sequence[Sequence[float]],
+    model: str = Config.EMBEDDING_MODEL,
+) -> int:
+    """Stores the embeddings of several segments with one multi-row INSERT.
+    Each embedding takes its course and active flag from its segment's document,
+    as in store_embedding. Segments that no longer exist are skipped.
+    :param segment_ids: The ids of the segments the embeddings represent.
+    :param embeddings: The embedding of each segment.
+    :param model: The name of the model that produced the embeddings.
+    :return: The number of embeddings stored.
+    """
+    with Session(engine) as session:
+        segments = cast(
+            list[tuple[int, int, bool]],
+            session.query(Segments.id, Documents.course_id, Documents.is_active)
+            .join(Documents)
+            .filter(Segments.id.in_(segment_ids))
+            .all(),
+        )
+        documents = {
+            segment_id: (course_id, is_active)
+            for segment_id, course_id, is_active in segments
+        }
+        rows: list[dict[str, Any]] = [
+            {
+                "vector": embedding,
+                "segment_id": segment_id,
+                "model": model,
+                "course_id": documents[segment_id][0],
+                "is_active": documents[segment_id][1],
+            }
+            for segment_id, embedding in zip(segment_ids, embeddings)
+            if segment_id in documents
+        ]
+        if rows:
+            session.execute(insert(Embeddings), rows)
+            session.commit()
+        return len(rows)
+
+
+def enqueue_ingestion_job(file_path: str, course_id: int) -> int:
+    """Queues a stored document to be parsed, embedded, and stored by a worker.
+    :param file_path: The file path of the document, relative to the file storage path.
+    :param course_id: The id of the course the document was uploaded to.
+    :return: The id of the new job.
+    """
+    with Session(engine) as session:
+        job = IngestionJobs(document_id=file_path, course_id=course_id)
+        session.add(job)
+        session.flush()
+        job_id = int(getattr(job, "id"))
+        session.commit()
+        return job_id
+
+
+def claim_ingestion_job(
+    stale_after: float = Config.INGESTION_JOB_TIMEOUT,
+    max_attempts: int = Config.INGESTION_MAX_ATTEMPTS,
+) -> IngestionJobs | None:
+    """Marks the oldest runnable ingestion job as running and returns it.
+
+    Runnable jobs are queued jobs and running jobs whose worker has not reported
+    progress for stale_after seconds. Rows locked by another worker are skipped,
+    so any number of workers can claim jobs concurrently. An abandoned job that
+    has already been claimed max_attempts times is marked as failed instead, so
+    that a document that keeps killing its worker is not retried forever.
+
+    :param stale_after: The number of seconds after which a running job is presumed abandoned.
+    :param max_attempts: The most times a job is claimed.
+    :return: The claimed job, or None if there is nothing to do.
+    """
+    now = datetime.now(timezone.utc)
+    abandoned = (IngestionJobs.status == JobStatus.RUNNING) & (
+        IngestionJobs.updated_at < now - timedelta(seconds=stale_after)
+    )
+    with Session(engine, expire_on_commit=False) as session:
+        session.execute(
+            update(IngestionJobs)
+            .where(abandoned)
+            .where(IngestionJobs.attempts >= max_attempts)
+            .values(
+                status=JobStatus.FAILED,
+                error=f"Abandoned by its worker {max_attempts} times",
+                finished_at=now,
+                updated_at=now,
+            )
+        )
+        job = (
+            session.query(IngestionJobs)
+            .filter(
+                (IngestionJobs.status == JobStatus.QUEUED)
+                | (abandoned & (IngestionJobs.attempts < max_attempts))
+            )
+            .order_by(IngestionJobs.id)
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+        if job is None:
+            session.commit()
+            return None
+        setattr(job, "status", JobStatus.RUNNING)
+        setattr(job, "attempts", job.attempts + 1)
+        setattr(job, "updated_at", now)
+        session.commit()
+        return job
+
+
+def set_ingestion_progress(
+    job_id: int, parsed: int | None = None, embedded: int | None = None
+):
+    """Records the progress of a running ingestion job.
+    :param job_id: The id of the job.
+    :param parsed: If given, the number of segments the document was parsed into.
+    :param embedded: If given, the number of segments embedded so far.
+    """
+    values: dict[str, Any] = {"updated_at": datetime.now(timezone.utc)}
+    if parsed is not None:
+        values["segments_parsed"] = parsed
+    if embedded is not None:
+        values["segments_embedded"] = embedded
+    with Session(engine) as session:
+        session.execute(
+            update(IngestionJobs).where(IngestionJobs.id == job_id).values(**values)
+        )
+        session.commit()
+
+
+def store_document_segments(
+    file_path: str,
+    texts: Sequence[str],
+    embeddings: Sequence[Sequence[float]],
+    model: str = Config.EMBEDDING_MODEL,
+    job_id: int | None = None,
+    pages: Sequence[int | None] | None = None,
+    sections: Sequence[str | None] | None = None,
+) -> list[int]:
+    """Stores all segments of a document with their embeddings in one transaction.
+
+    Segments are written with one multi-row INSERT ... RETURNING and embeddings
+    with one multi-row INSERT, instead of two transactions per segment. Either
+    every row is stored or, on error, none is.
+
+    :param file_path: The file path of the document the segments were parsed from.
+    :param texts: The segment texts.
+    :param embeddings: The embedding of each segment, in the same order as texts.
+    :param model: The name of the model that produced the embeddings.
+    :param job_id: If given, the ingestion job whose stored count is set in the same transaction.
+    :param pages: The page on which each segment starts, if the document has pages.
+    :param sections: The section that each segment is in, if the document has headings.
+    :raises ValueError: If texts and embeddings differ in length.
+    :return: The ids of the new segments, in the same order as texts.
+    """
+    if len(texts) != len(embeddings):
+        raise ValueError(
+            f"Got {len(embeddings)} embeddings for {len(texts)} segments of {file_path}"
+        )
+    if not texts:
+        return []
+
+    with Session(engine) as session, session.begin():
+        document = session.query(Documents).filter_by(file_path=file_path).first()
+        segment_ids = _insert_segments(
+            session,
+            file_path,
+            texts,
+            embeddings,
+            model,
+            course_id=getattr(document, "course_id", None),
+            is_active=bool(getattr(document, "is_active", True)),
+            ordinals=range(len(texts)),
+            pages=pages or [None] * len(texts),
+            sections=sections or [None] * len(texts),
+        )
+        if job_id is not None:
+            _set_stored_count(session, job_id, len(texts))
+        return segment_ids
+
+
+def get_document_segment_hashes(file_path: str) -> Counter[str]:
+    """Counts the content hashes of a document's active segments.
+    :param file_path: The file path of the document.
+    :return: How many active segments of the document have each hash.
+    """
+    with Session(engine) as session:
+        hashes = cast(
+            list[tuple[str]],
+            session.query(Segments.content_hash)
+            .filter(Segments.document_id == file_path, Segments.is_active)
+            .all(),
+        )
+        return Counter(content_hash for (content_hash,) in hashes)
+
+
+def sync_document_segments(
+    file_path: str,
+    texts: Sequence[str],
+    embeddings: Mapping[str, Sequence[float]],
+    model: str = Config.EMBEDDING_MODEL,
+    job_id: int | None = None,
+    pages: Sequence[int | None] | None = None,
+    sections: Sequence[str | None] | None = None,
+) -> SegmentDiff:
+    """Replaces a document's active segments with a new version of them in one transaction.
+
+    New segments are matched to stored ones by content hash. Matched rows are
+    kept along with their embeddings, stored rows left unmatched are retired,
+    and only the unmatched new texts are inserted. Retired segments keep their
+    rows, so that References to them stay valid, but lose their embeddings.
+    Kept segments are moved to their position, page, and section in the new version.
+
+    :param file_path: The file path of the document the segments were parsed from.
+    :param texts: The segment texts of the new version, in document order.
+    :param embeddings: The embedding of each text that is not stored yet, keyed by segment_hash.
+    :param model: The name of the model that produced the embeddings.
+    :param job_id: If given, the ingestion job whose stored count is set in the same transaction.
+    :param pages: The page on which each segment starts, if the document has pages.
+    :param sections: The section that each segment is in, if the document has headings.
+    :raises ValueError: If a text that is not stored yet has no embedding.
+    :raises EmbeddingModelChangedError: If the document's course no longer uses model.
+    :return: The new version number of the document and the number of segments added, retired, and reused.
+    """
+    with Session(engine) as session, session.begin():
+        # Locking the document serializes concurrent re-uploads of the same file.
+        document = (
+            session.query(Documents)
+            .filter_by(file_path=file_path)
+            .with_for_update()
+            .one()
+        )
+        # The share lock holds off switch_course_embedding_model until this commits.
+        course_model = (
+            session.query(Courses.embedding_model)
+            .filter(Courses.id == document.course_id)
+            .with_for_update(read=True)
+            .scalar()
+        )
+        course_model = str(course_model or Config.EMBEDDING_MODEL)
+        if course_model != model:
+            raise EmbeddingModelChangedError(course_model)
+        stored = cast(
+            list[tuple[int, str, int | None, int | None, str | None]],
+            session.query(
+                Segments.id,
+                Segments.content_hash,
+                Segments.ordinal,
+                Segments.page,
+                Segments.section,
+            )
+            .filter(Segments.document_id == file_path, Segments.is_active)
+            .order_by(Segments.id)
+            .all(),
+        )
+        positions = {
+            segment_id: (ordinal, page, section)
+            for segment_id, _, ordinal, page, section in stored
+        }
+        unmatched: dict[str, list[int]] = {}
+        for segment_id, content_hash, _, _, _ in stored:
+            unmatched.setdefault(content_hash, []).append(segment_id)
+
+        pages = pages or [None] * len(texts)
+        sections = sections or [None] * len(texts)
+        new_texts: list[str] = []
+        new_positions: list[tuple[int, int | None, str | None]] = []
+        moved: list[dict[str, Any]] = []
+        for ordinal, (text, page, section) in enumerate(zip(texts, pages, sections)):
+            matches = unmatched.get(segment_hash(text))
+            if matches:
+                segment_id = matches.pop(0)
+                if positions[segment_id] != (ordinal, page, section):
+                    moved.append(
+                        {
+                            "id": segment_id,
+                            "ordinal": ordinal,
+                            "page": page,
+                            "section": section,
+                        }
+                    )
+            else:
+                new_texts.append(text)
+                new_positions.append((ordinal, page, section))
+        retired_ids = [segment_id for ids in unmatched.values() for segment_id in ids]
+
+        missing = {segment_hash(text) for text in new_texts} - embeddings.keys()
+        if missing:
+            raise ValueError(
+                f"{len(missing)} new segments of {file_path} have no embedding"
+            )
+
+        if retired_ids:
+            session.execute(
+                delete(Embeddings).where(Embeddings.segment_id.in_(retired_ids))
+            )
+            session.execute(
+                update(Segments)
+                .where(Segments.id.in_(retired_ids))
+                .values(is_active=False)
+            )
+        if moved:
+            session.execute(update(Segments), moved)
+        added_ids = _insert_segments(
+            session,
+            file_path,
+            new_texts,
+            [embeddings[segment_hash(text)] for text in new_texts],
+            model,
+            course_id=int(getattr(document, "course_id")),
+            is_active=True,
+            ordinals=[ordinal for ordinal, _, _ in new_positions],
+            pages=[page for _, page, _ in new_positions],
+            sections=[section for _, _, section in new_positions],
+        )
+        if not getattr(document, "is_active"):
+            _set_embeddings_active(session, file_path, True)
+
+        version = int(getattr(document, "version"))
+        if stored:
+            version += 1
+        document.version = version  # type: ignore
+        document.is_active = True  # type: ignore
+        if job_id is not None:
+            _set_stored_count(session, job_id, len(texts))
+
+        return SegmentDiff(
+            version=version,
+            added=len(new_texts),
+            retired=len(retired_ids),
+            reused=len(texts) - len(new_texts),
+            added_segments=[
+                (segment_id, segment_hash(text))
+                for segment_id, text in zip(added_ids, new_texts)
+            ],
+        )
+
+
+def _insert_segments(
+    session: Session,
+    file_path: str,
+    texts: Sequence[str],
+    embeddings: Sequence[Sequence[float]],
+    model: str,
+    course_id: int | None,
+    is_active: bool,
+    ordinals: Sequence[int],
+    pages: Sequence[int | None],
+    sections: Sequence[str | None],
+) -> list[int]:
+    """Inserts segments and their embeddings with one multi-row INSERT each.
+    :param course_id: The id of the document's course, copied onto the embeddings.
+    :param is_active: Whether the document is active, copied onto the embeddings.
+    :param ordinals: The position of each segment within the document.
+    :param pages: The page on which each segment starts, or None.
+    :param sections: The section that each segment is in, or None.
+    :return: The ids of the new segments, in the same order as texts.
+    """
+    if not texts:
+        return []
+    segment_ids = cast(
+        list[int],
+        session.scalars(
+            insert(Segments).returning(
+                Segments.__table__.c.id, sort_by_parameter_order=True
+            ),
+            [
+                {
+                    "text": text,
+                    "document_id": file_path,
+                    "content_hash": segment_hash(text),
+                    "ordinal": ordinal,
+                    "page": page,
+                    "section": section,
+                }
+                for text, ordinal, page, section in zip(
+                    texts, ordinals, pages, sections
+                )
+            ],
+        ).all(),
+    )
+    session.execute(
+        insert(Embeddings),
+        [
+            {
+                "vector": embedding,
+                "segment_id": segment_id,
+                "model": model,
+                "course_id": course_id,
+                "is_active": is_active,
+            }
+            for segment_id, embedding in zip(segment_ids, embeddings)
+        ],
+    )
+    return segment_ids
+
+
+def _set_embeddings_active(session: Session, file_path: str, is_active: bool):
+    """Copies the active flag of a document onto the embeddings of its segments."""
+    session.execute(
+        update(Embeddings)
+        .where(
+            Embeddings.segment_id.in_(
+                session.query(Segments.id).filter(Segments.document_id == file_path)
+            )
+        )
+        .values(is_active=is_active)
+    )
+
+
+def _set_stored_count(session: Session, job_id: int, stored: int):
+    """Records how many segments an ingestion job has stored."""
+    session.execute(
+        update(IngestionJobs)
+        .where(IngestionJobs.id == job_id)
+        .values(segments_stored=stored, updated_at=datetime.now(timezone.utc))
+    )
+
+
+def finish_ingestion_job(job_id: int, error: str | None = None):
+    """Marks an ingestion job as succeeded, or as failed if an error is given.
+    :param job_id: The id of the job.
+    :param error: A description of what went wrong, if anything.
+    """
+    with Session(engine) as session:
+        session.execute(
+            update(IngestionJobs)
+            .where(IngestionJobs.id == job_id)
+            .values(
+                status=JobStatus.FAILED if error else JobStatus.SUCCEEDED,
+                error=error,
+                finished_at=datetime.now(timezone.utc),
+                updated_at=datetime.now(timezone.utc),
+            )
+        )
+        session.commit()
+
+
+def get_ingestion_job(job_id: int) -> dict[str, Any] | None:
+    """Gets the status and per-stage progress of an ingestion job.
+    :param job_id: The id of the job.
+    :return: A JSON-serializable description of the job, or None if it does not exist.
+    """
+    with Session(engine) as session:
+        job = session.query(IngestionJobs).filter_by(id=job_id).first()
+        if job is None:
+            return None
+        finished_at = getattr(job, "finished_at")
+        return {
+            "id": job_id,
+            "document": job.document_id,
+            "course_id": job.course_id,
+            "status": getattr(job, "status").value,
+            "progress": {
+                "parsed": job.segments_parsed,
+                "embedded": job.segments_embedded,
+                "stored": job.segments_stored,
+            },
+            "attempts": job.attempts,
+            "error": job.error,
+            "created_at": getattr(job, "created_at").isoformat(),
+            "finished_at": finished_at.isoformat() if finished_at else None,
+        }
+
+
+def get_course_embedding_model(course_id: int) -> str:
+    """Gets the embedding model whose vectors serve a course's queries.
+    :param course_id: The id of the course.
+    :return: The model recorded for the course, or the configured default if none is.
+    """
+    with Session(engine) as session:
+        course = session.query(Courses).filter_by(id=course_id).first()
+        model = getattr(course, "embedding_model", None)
+        return str(model) if model else Config.EMBEDDING_MODEL
+
+
+def set_course_embedding_model(course_id: int, model: str):
+    """Switches the embedding model whose vectors serve a course's queries.
+    :param course_id: The id of the course.
+    :param model: The name of the model to switch to.
+    """
+    with Session(engine) as session:
+        session.execute(
+            update(Courses).where(Courses.id == course_id).values(embedding_model=model)
+        )
+        session.commit()
+
+
+def get_segments_missing_embedding(
+    course_id: int, model: str, limit: int
+) -> list[tuple[int, str]]:
+    """Gets the segments of a course that have no embedding by the given model yet.
+    :param course_id: The id of the course.
+    :param model: The name of the embedding model.
+    :param limit: The maximal number of segments to return.
+    :return: Pairs of segment id and text, in ascending id order.
+    """
+    with Session(engine) as session:
+        segments = (
+            session.query(Segments)
+            .join(Documents)
+            .filter(Documents.course_id == course_id)
+            .filter(Segments.is_active)
+            .filter(
+                Segments.id.not_in(
+                    session.query(Embeddings.segment_id).filter(
+                        Embeddings.model == model
+                    )
+                )
+            )
+            .order_by(Segments.id)
+            .limit(limit)
+            .all()
+        )
+        return [
+            (int(getattr(segment, "id")), str(getattr(segment, "text")))
+            for segment in segments
+        ]
+
+
+def switch_course_embedding_model(
+    course_id: int,
+    model: str,
+    embed: Callable[[Sequence[str]], Sequence[Sequence[float]]],
+) -> int:
+    """Embeds a course's last segments without an embedding by model and switches the
+    course to model, in one transaction.
+
+    The course row is locked first, which holds off ingestion jobs from storing
+    segments in the course until the switch commits, so every active segment
+    has an embedding by model as soon as queries start using it.
+
+    :param course_id: The id of the course.
+    :param model: The name of the model to switch to.
+    :param embed: Embeds the texts of the segments that have no embedding by model yet.
+    :return: The number of segments embedded.
+    """
+    with Session(engine) as session, session.begin():
+        session.query(Courses.id).filter(
+            Courses.id == course_id
+        ).with_for_update().one()
+        missing = cast(
+            list[tuple[int, str, bool]],
+            session.query(Segments.id, Segments.text, Documents.is_active)
+            .join(Documents)
+            .filter(Documents.course_id == course_id)
+            .filter(Segments.is_active)
+            .filter(
+                Segments.id.not_in(
+                    session.query(Embeddings.segment_id).filter(
+                        Embeddings.model == model
+                    )
+                )
+            )
+            .all(),
+        )
+        if missing:
+            vectors = embed([text for _, text, _ in missing])
+            session.execute(
+                insert(Embeddings),
+                [
+                    {
+                        "vector": vector,
+                        "segment_id": segment_id,
+                        "model": model,
+                        "course_id": course_id,
+                        "is_active": is_active,
+                    }
+                    for (segment_id, _, is_active), vector in zip(missing, vectors)
+                ],
+            )
+        session.execute(
+            update(Courses).where(Courses.id == course_id).values(embedding_model=model)
+        )
+        return len(missing)
+
+
+def delete_course_embeddings(course_id: int, keep_model: str) -> int:
+    """Deletes the embeddings of a course's segments made by any model other than keep_model.
+    :param course_id: The id of the course.
+    :param keep_model: The name of the model whose embeddings are kept.
+    :return: The number of embeddings deleted.
+    """
+    with Session(engine) as session:
+        result = session.execute(
+            delete(Embeddings)
+            .where(
+                Embeddings.segment_id.in_(
+                    session.query(Segments.id)
+                    .join(Documents)
+                    .filter(Documents.course_id == course_id)
+                )
+            )
+            .where(Embeddings.model != keep_model)
+        )
+        session.commit()
+        return int(getattr(result, "rowcount", 0))
+
+
+def compact_segments(batch_size: int) -> tuple[int, int]:
+    """Removes one batch of tombstoned segments: those retired from an earlier version of
+    a document and those of inactive documents.
+
+    The batch's embeddings are deleted. Segments that References point at keep their
+    rows, retired, so that past messages can still cite them; the others are deleted.
+    Inactive documents that are locked, e.g. because they are being uploaded again, are skipped.
+
+    :param batch_size: The maximal number of segments to remove.
+    :return: The number of embeddings and of segments deleted, both zero once nothing is left.
+    """
+    with Session(engine) as session, session.begin():
+        inactive = cast(
+            list[tuple[str]],
+            session.query(Documents.file_path)
+            .filter(Documents.is_active.is_(False))
+            .with_for_update(skip_locked=True)
+            .all(),
+        )
+        batch = cast(
+            list[tuple[int]],
+            session.query(Segments.id)
+            .filter(
+                or_(
+                    Segments.document_id.in_([path for (path,) in inactive]),
+                    Segments.is_active.is_(False),
+                )
+            )
+            .filter(
+                or_(
+                    Segments.id.in_(session.query(Embeddings.segment_id)),
+                    Segments.id.not_in(session.query(References.segment)),
+                )
+            )
+            .order_by(Segments.id)
+            .limit(batch_size)
+            .all(),
+        )
+        segment_ids = [segment_id for (segment_id,) in batch]
+        if not segment_ids:
+            return 0, 0
+
+        embeddings = session.execute(
+            delete(Embeddings).where(Embeddings.segment_id.in_(segment_ids))
+        )
+        segments = session.execute(
+            delete(Segments)
+            .where(Segments.id.in_(segment_ids))
+            .where(Segments.id.not_in(session.query(References.segment)))
+        )
+        session.execute(
+            update(Segments).where(Segments.id.in_(segment_ids)).values(is_active=False)
+        )
+        return (
+            int(getattr(embeddings, "rowcount", 0)),
+            int(getattr(segments, "rowcount", 0)),
+        )
+
+
+def delete_inactive_documents() -> dict[str, int]:
+    """Deletes the inactive documents that have no segments left, along with their ingestion
+    jobs and uploaded files.
+    Documents with a queued or running ingestion job are kept, since the job still reads them.
+    The files are removed while the documents' rows are locked, before the deletion commits,
+    and a file written after the rows were locked is kept, since it belongs to a new upload
+    of the same path.
+    :return: The number of bytes of uploaded file removed for each deleted document, by file path.
+    """
+    with Session(engine) as session, session.begin():
+        documents = cast(
+            list[tuple[str]],
+            session.query(Documents.file_path)
+            .filter(Documents.is_active.is_(False))
+            .filter(Documents.file_path.not_in(session.query(Segments.document_id)))
+            .filter(
+                Documents.file_path.not_in(
+                    session.query(IngestionJobs.document_id).filter(
+                        IngestionJobs.status.in_([JobStatus.QUEUED, JobStatus.RUNNING])
+                    )
+                )
+            )
+            .with_for_update(skip_locked=True)
+            .all(),
+        )
+        locked_at = time.time()
+        file_paths = [file_path for (file_path,) in documents]
+        if file_paths:
+            session.execute(
+                delete(IngestionJobs).where(IngestionJobs.document_id.in_(file_paths))
+            )
+            session.execute(
+                delete(Documents).where(Documents.file_path.in_(file_paths))
+            )
+
+        removed: dict[str, int] = {}
+        for file_path in file_paths:
+            upload = Path(Config.FILE_STORAGE_PATH) / file_path
+            removed[file_path] = 0
+            if upload.is_file():
+                stat = upload.stat()
+                if stat.st_mtime < locked_at:
+                    upload.unlink()
+                    removed[file_path] = stat.st_size
+        return removed
+
+
+def iter_course_embeddings(
+    course_id: int, model: str, batch_size: int = 10000
+) -> Iterator[tuple[list[int], list[Sequence[float]]]]:
+    """Streams the embeddings by a model of a course's active segments.
+    :param course_id: The id of the course.
+    :param model: The name of the embedding model.
+    :param batch_size: The number of embeddings fetched per batch.
+    :return: Batches of segment ids and their embeddings, in ascending segment id order.
+    """
+    with Session(engine) as session:
+        rows = cast(
+            Iterable[tuple[int, Sequence[float]]],
+            session.query(Embeddings.segment_id, Embeddings.vector)
+            .filter(Embeddings.course_id == course_id)
+            .filter(Embeddings.is_active)
+            .filter(Embeddings.model == model)
+            .order_by(Embeddings.segment_id)
+            .yield_per(batch_size),
+        )
+        for batch in batched(rows, batch_size):
+            yield (
+                [segment_id for segment_id, _ in batch],
+                [vector for _, vector in batch],
+            )
+
+
+def get_cached_embeddings(
+    model: str, text_hashes: Sequence[str]
+) -> dict[str, Sequence[float]]:
+    """Looks up cached embeddings and marks every found entry as used.
+    :param model: The name of the model that produced the embeddings.
+    :param text_hashes: The hashes of the normalized texts to look up.
+    :return: A mapping from each found text hash to its embedding.
+    """
+    if not text_hashes:
+        return {}
+
+    with Session(engine) as session:
+        entries = (
+            session.query(EmbeddingCache)
+            .filter(
+                EmbeddingCache.model == model,
+                EmbeddingCache.text_hash.in_(text_hashes),
+            )
+            .all()
+        )
+        found: dict[str, Sequence[float]] = {
+            str(entry.text_hash): list(getattr(entry, "vector")) for entry in entries
+        }
+        if found:
+            session.execute(
+                update(EmbeddingCache)
+                .where(
+                    EmbeddingCache.model == model,
+                    EmbeddingCache.text_hash.in_(list(found)),
+                )
+                .values(
+                    hits=EmbeddingCache.hits + 1,
+                    last_used=datetime.now(timezone.utc),
+                )
+            )
+            session.commit()
+
+        return found
+
+
+def store_cached_embeddings(model: str, embeddings: Mapping[str, Sequence[float]]):
+    """Adds embeddings to the embedding cache, skipping entries that already exist.
+    :param model: The name of the model that produced the embeddings.
+    :param embeddings: A mapping from the hash of each normalized text to its embedding.
+    """
+    if not embeddings:
+        return
+
+    with Session(engine) as session:
+        try:
+            session.execute(
+                pg_insert(EmbeddingCache)
+                .values(
+                    [
+                        {"model": model, "text_hash": text_hash, "vector": vector}
+                        for text_hash, vector in embeddings.items()
+                    ]
+                )
+                .on_conflict_do_nothing()
+            )
+            session.commit()
+        except SQLAlchemyError:
+            session.rollback()
+
+
+def evict_embedding_cache(max_rows: int) -> int:
+    """Deletes the least recently used cache entries until at most max_rows remain.
+    The table is only counted once the planner's estimate of its rows, which costs
+    a catalog lookup rather than a scan, exceeds max_rows, or if there is no estimate yet.
+    :param max_rows: The number of entries to keep.
+    :return: The number of entries deleted.
+    """
+    pg_class = table("pg_class", column("oid"), column("reltuples"))
+    with Session(engine) as session:
+        estimate = session.execute(
+            select(pg_class.c.reltuples).where(
+                pg_class.c.oid == func.to_regclass(f'"{EmbeddingCache.__tablename__}"')
+            )
+        ).scalar()
+        if estimate is not None and 0 < estimate <= max_rows:
+            return 0
+
+        size = session.execute(
+            select(func.count()).select_from(EmbeddingCache)
+        ).scalar_one()
+        if size <= max_rows:
+            return 0
+
+        stale = cast(
+            list[tuple[str, str]],
+            session.query(EmbeddingCache.model, EmbeddingCache.text_hash)
+            .order_by(EmbeddingCache.last_used.asc())
+            .limit(size - max_rows)
+            .all(),
+        )
+        result = session.execute(
+            delete(EmbeddingCache).where(
+                tuple_(EmbeddingCache.model, EmbeddingCache.text_hash).in_(stale)
+            )
+        )
+        session.commit()
+        return int(getattr(result, "rowcount", 0))
+
+
 def delete_uploads_folder():
     """Deletes uploads folder and all files within it."""
     uploads_folder_path = Path(Config.FILE_STORAGE_PATH)
@@ -11,6 +11,8 @@ import json
 from flask_login import current_user, login_required  # type: ignore
 from ucr_chatbot.api.language_model.response import client as response_client
 from ucr_chatbot.api.context_retrieval.retriever import retriever
+from ucr_chatbot.api.language_model.prompt_packing import HistoryMessage, pack_prompt
+from ucr_chatbot.config import Config
 
 
 from ucr_chatbot.db.models import (
@@ -44,6 +46,11 @@ If the context is not relevant, or if it is not a follow up question, then you s
 {question}
 """
 
+NO_CONTEXT_REPLY = (
+    "I cannot find any relevant course materials to help answer your question."
+)
+NO_CONTEXT = "No course materials are relevant to this question."
+
 
 @bp.route("/conversation/new/<int:course_id>/chat", methods=["GET", "POST"])
 @login_required
@@ -292,12 +299,15 @@ def generate_response(
     max_tokens: int = 5000,
     stop_sequences: list[str] | None = None,
 ) -> FlaskResponse:
-    """Generates RAG assisted response for the reply in a user conversation
+    """Generates RAG assisted response for the reply in a user conversation.
+    If no course material is relevant to the prompt, the LLM is told so instead of
+    being given context, or, with NO_CONTEXT_SKIP_LLM set, is not called at all.
 
     :param prompt: The user defined query for the LLM
     :param conversation_id: The ID of the current conversation.
     :param stream: Single response or continuous conversation
-    :param history: The number of student/bot history responses included in the prompt
+    :param history: The most student/bot history responses included in the prompt; older
+        ones are left out first when the prompt would exceed PROMPT_TOKEN_BUDGET
     :param temperature: How creative the response is
     :param max_tokens: The maximum number of tokens that can be input to a single query
     :stop_sequences: A list of stop sequences for the prompt
@@ -325,21 +335,35 @@ def generate_response(
     course_id = course_id_row.course_id
 
     segments = retriever.get_segments_for(prompt, course_id=course_id, num_segments=10)  # type: ignore
-    context = "\n".join(
-        # Assuming each 's' object has 'segment_id' and 'text' attributes
-        map(lambda s: f"Reference number: {s.id}, text: {s.text}", segments)  # type: ignore
-    )
 
-    prompt_with_context = SYSTEM_PROMPT.format(
-        context=context,
-        question=prompt,
-        history=get_conv_messages(conversation_id).get_json()["messages"][
-            -(history * 2) :
-        ],
+    if not segments and Config.NO_CONTEXT_SKIP_LLM:
+        # Nothing in the course materials is relevant, so answer without the LLM.
+        if stream:
+            return FlaskResponse(
+                iter([f"data: {json.dumps({'text': NO_CONTEXT_REPLY})}\n\n"]),
+                mimetype="text/event-stream",
+            )
+        return jsonify(
+            {
+                "text": NO_CONTEXT_REPLY,
+                "sources": [],
+                "conversation_id": conversation_id,
+            }
+        )
+
+    messages = get_conv_messages(conversation_id).get_json()["messages"][
+        -(history * 2) :
+    ]
+    packed = pack_prompt(
+        SYSTEM_PROMPT,
+        prompt,
+        segments,
+        [HistoryMessage(m["sender"], m["body"]) for m in messages],
+        no_context=NO_CONTEXT,
     )
 
     generation_params = {  # type: ignore
-        "prompt": prompt_with_context,
+        "prompt": packed.prompt,
         "max_tokens": max_tokens,
         "temperature": temperature,
         "stop_sequences": stop_sequences,
@@ -357,13 +381,18 @@ def generate_response(
         response_text = response_client.get_response(**generation_params)  # type: ignore
 
         # Dynamically create the list of source IDs
-        sources = [{"segment_id": s.id} for s in segments]  # type: ignore
+        sources = [{"segment_id": s.id} for s in packed.segments]
 
         return jsonify(
             {
                 "text": response_text,
                 "sources": sources,
                 "conversation_id": conversation_id,
+                "usage": {
+                    "prompt_tokens": packed.stats.total_tokens,
+                    "context_tokens": packed.stats.context_tokens,
+                    "history_tokens": packed.stats.history_tokens,
+                },
             }
         )
 
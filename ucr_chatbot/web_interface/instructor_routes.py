@@ -7,6 +7,7 @@ from flask import (
     send_from_directory,
     abort,
     flash,
+    jsonify,
     Response as FlaskResponse,
 )
 
@@ -29,22 +30,26 @@ from ucr_chatbot.db.models import (
     ParticipatesIn,
     Documents,
     add_new_document,
-    store_segment,
-    store_embedding,
+    enqueue_ingestion_job,
+    get_ingestion_job,
     get_active_documents,
+    get_course_embedding_model,
     set_document_inactive,
     add_user_to_course,
     add_students_from_list,
     add_assistants_from_list,
     Users,
 )
-from ucr_chatbot.config import Config
+from ucr_chatbot.config import Config, VectorBackend
 
+from ucr_chatbot.api.context_retrieval.mmap_index import MmapVectorIndex
 from ucr_chatbot.api.summary_generation import generate_usage_summary
 
 
-from ucr_chatbot.api.file_parsing.file_parsing import parse_file
-from ucr_chatbot.api.embedding.embedding import embed_text
+from ucr_chatbot.api.file_parsing.file_parsing import (
+    SUPPORTED_EXTENSIONS,
+    InvalidFileExtensionError,
+)
 
 bp = Blueprint("instructor_routes", __name__)
 
@@ -96,23 +101,26 @@ def course_documents(course_id: int):
             relative_path = Path(str(course_id)) / filename
             full_local_path = curr_path / relative_path
 
+            extension = relative_path.suffix[1:]
+            if extension not in SUPPORTED_EXTENSIONS:
+                raise InvalidFileExtensionError(extension)
+
             create_upload_folder(course_id=course_id)
             file.save(str(full_local_path))
 
-            segments = parse_file(str(full_local_path))
-            add_new_document(
-                str(relative_path).replace(str(Path().anchor), ""),
-                course_id,
-            )
-            for seg in segments:
-                seg_id = store_segment(
-                    seg,
-                    str(relative_path).replace(str(Path().anchor), ""),
-                )
+            document_path = str(relative_path).replace(str(Path().anchor), "")
+            add_new_document(document_path, course_id)
+            job_id = enqueue_ingestion_job(document_path, course_id)
 
-                embedding = embed_text(seg)
-                store_embedding(embedding, seg_id)
-            flash("File uploaded and processed successfully!", "success")
+            if request.accept_mimetypes.best == "application/json":
+                status_url = url_for(
+                    ".ingestion_job_status", course_id=course_id, job_id=job_id
+                )
+                return jsonify(job_id=job_id, status_url=status_url), 202
+            flash(
+                f"File uploaded! It will be searchable once processing finishes (job {job_id}).",
+                "success",
+            )
             return redirect(url_for(".course_documents", course_id=course_id))
 
         except (ValueError, TypeError):
@@ -148,6 +156,28 @@ def course_documents(course_id: int):
     return render_template("documents.html", body=body, course_id=course_id)
 
 
+@bp.route("/course/<int:course_id>/ingestion-jobs/<int:job_id>")
+@login_required
+@roles_required(["instructor"])
+def ingestion_job_status(course_id: int, job_id: int):
+    """Reports the progress of a document upload that is being processed in the background.
+
+    :param course_id: unique identifier for course where the document was uploaded
+    :type course_id: int
+    :param job_id: the id returned when the document was uploaded
+    :type job_id: int
+
+    :raises 404: If the job does not exist or belongs to another course.
+
+    :return: the job's status, the number of segments parsed, embedded, and stored, and any error
+    :rtype: flask.Response
+    """
+    job = get_ingestion_job(job_id)
+    if job is None or job["course_id"] != course_id:
+        abort(404, description="Job not found")
+    return jsonify(job)
+
+
 @bp.route("/document/<path:file_path>/delete", methods=["POST"])
 @login_required
 @roles_required(["instructor"])
@@ -197,6 +227,11 @@ def delete_document(file_path: str):
 
         if Path(full_path).exists():
             set_document_inactive(file_path)
+            if Config.VECTOR_BACKEND == VectorBackend.MMAP:
+                document_course = int(getattr(document, "course_id"))
+                MmapVectorIndex().mark_stale(
+                    document_course, get_course_embedding_model(document_course)
+                )
 
     return redirect(url_for(".course_documents", course_id=course_id))
 
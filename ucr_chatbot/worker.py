@@ -0,0 +1,233 @@
+"""
+Background Ingestion Worker
+
+Takes uploaded documents off the ingestion queue and parses, embeds, and stores them,
+so that the web server only has to save the upload and queue a job.
+Any number of workers may run at once; each job is claimed by exactly one of them.
+
+Usage (assuming running from project root):
+  uv run python -m ucr_chatbot.worker [--once] [--poll-interval SECONDS]
+
+
+This file contains the following functions:
+
+    * unstored_segments(file_path: str, segments: Iterable[str], stored: Counter[str] | None) -
+      Finds the segments of a document's new version that are not stored yet and so need
+      embedding.
+
+    * ingest(job: IngestionJobs) - Parses, embeds, and stores the document of a claimed job,
+      recording the progress of each stage. Segments are embedded a chunk at a time while
+      later pages of the document are still being parsed. Each segment is stored with its
+      position in the document and, for PDFs, its page or, for markdown, its section.
+      When a document is uploaded again, only the segments whose text changed are
+      embedded and stored; unchanged segments are reused and removed ones retired. The segments are stored all at once, so a job that was
+      interrupted leaves nothing behind, and its embeddings are cached for the retry.
+      If the course moved to another embedding model meanwhile, the new segments are
+      embedded again with it before they are stored.
+      With the mmap vector backend, the course's vector file is then appended to, or
+      rebuilt if segments were retired or reused.
+
+    * run_once() - Claims and runs the oldest runnable job, if there is one.
+
+    * rebuild_stale_indexes() - With the mmap vector backend, rebuilds the vector files of
+      the courses whose documents were deleted.
+
+    * main() - Parses the CLI arguments and runs jobs until interrupted.
+
+"""
+
+import argparse
+from collections import Counter
+from functools import partial
+from itertools import batched
+import time
+import traceback
+from typing import Iterable, Sequence
+
+from ucr_chatbot.api.context_retrieval.mmap_index import MmapVectorIndex
+from ucr_chatbot.api.embedding.cache import embed_texts_cached
+from ucr_chatbot.api.embedding.embedding import embed_texts
+from ucr_chatbot.api.embedding.workers import EmbeddingWorkerPool
+from ucr_chatbot.api.file_parsing.file_parsing import ParsedSegment, iter_document
+from ucr_chatbot.config import Config, VectorBackend
+from ucr_chatbot.db.models import (
+    EmbeddingModelChangedError,
+    IngestionJobs,
+    claim_ingestion_job,
+    finish_ingestion_job,
+    get_course_embedding_model,
+    get_document_segment_hashes,
+    segment_hash,
+    set_ingestion_progress,
+    sync_document_segments,
+)
+
+
+def unstored_segments(
+    file_path: str, segments: Iterable[str], stored: Counter[str] | None = None
+) -> dict[str, str]:
+    """Finds the segments of a document's new version that its stored version lacks.
+    :param file_path: The file path of the document.
+    :param segments: The segment texts of the new version.
+    :param stored: The hashes of the stored version's segments not matched yet, or None
+        to read them. Matched hashes are taken out, so the same counter can be passed
+        again with the next segments of the new version.
+    :return: The texts that need embedding, keyed by segment_hash.
+    """
+    if stored is None:
+        stored = get_document_segment_hashes(file_path)
+    new_texts: dict[str, str] = {}
+    for text in segments:
+        content_hash = segment_hash(text)
+        if stored[content_hash] > 0:
+            stored[content_hash] -= 1
+        else:
+            new_texts.setdefault(content_hash, text)
+    return new_texts
+
+
+def ingest(job: IngestionJobs):
+    """Parses, embeds, and stores the document of a claimed ingestion job.
+    :param job: The claimed job.
+    """
+    job_id = int(getattr(job, "id"))
+    file_path = str(job.document_id)
+    course_id = int(getattr(job, "course_id"))
+
+    model = get_course_embedding_model(course_id)
+    pool = EmbeddingWorkerPool(embed=partial(embed_texts, model=model))
+    stored = get_document_segment_hashes(file_path)
+    parsed: list[ParsedSegment] = []
+    new_segments: dict[str, str] = {}
+    new_embeddings: dict[str, Sequence[float]] = {}
+    set_ingestion_progress(job_id, parsed=0, embedded=0)
+    for chunk in batched(
+        iter_document(str(Config.FILE_STORAGE_PATH / file_path)),
+        Config.INGESTION_CHUNK_SIZE,
+    ):
+        parsed.extend(chunk)
+        new_texts = unstored_segments(
+            file_path, (segment.text for segment in chunk), stored
+        )
+        for content_hash in new_embeddings.keys() & new_texts.keys():
+            del new_texts[content_hash]
+        if new_texts:
+            embeddings = embed_texts_cached(
+                list(new_texts.values()), embed=pool.embed, model=model
+            )
+            new_segments.update(new_texts)
+            new_embeddings.update(zip(new_texts, embeddings))
+        set_ingestion_progress(job_id, parsed=len(parsed), embedded=len(new_embeddings))
+
+    while True:
+        try:
+            diff = sync_document_segments(
+                file_path,
+                [segment.text for segment in parsed],
+                new_embeddings,
+                model,
+                job_id=job_id,
+                pages=[segment.page for segment in parsed],
+                sections=[segment.section for segment in parsed],
+            )
+            break
+        except EmbeddingModelChangedError as e:
+            # The course was re-embedded meanwhile, so embed the new segments again.
+            model = e.model
+            pool = EmbeddingWorkerPool(embed=partial(embed_texts, model=model))
+            embeddings = embed_texts_cached(
+                list(new_segments.values()), embed=pool.embed, model=model
+            )
+            new_embeddings = dict(zip(new_segments, embeddings))
+    if Config.VECTOR_BACKEND == VectorBackend.MMAP:
+        vector_index = MmapVectorIndex()
+        if diff.retired or diff.reused:
+            vector_index.build(course_id, model)
+        else:
+            vector_index.append(
+                course_id,
+                model,
+                [segment_id for segment_id, _ in diff.added_segments],
+                [
+                    new_embeddings[content_hash]
+                    for _, content_hash in diff.added_segments
+                ],
+            )
+    print(
+        f"{file_path} version {diff.version}: {diff.added} segments added, "
+        f"{diff.retired} retired, {diff.reused} reused."
+    )
+
+
+def run_once() -> bool:
+    """Claims and runs the oldest runnable ingestion job.
+    :return: Whether there was a job to run.
+    """
+    job = claim_ingestion_job()
+    if job is None:
+        return False
+
+    job_id = int(getattr(job, "id"))
+    print(f"Ingesting {job.document_id} (job {job_id}).")
+    try:
+        ingest(job)
+    except Exception as e:
+        traceback.print_exc()
+        finish_ingestion_job(job_id, error=f"{type(e).__name__}: {e}")
+        print(f"Job {job_id} failed.")
+    else:
+        finish_ingestion_job(job_id)
+        print(f"Job {job_id} done.")
+    return True
+
+
+def rebuild_stale_indexes() -> bool:
+    """Rebuilds the vector files that the web server marked stale when documents were deleted.
+    :return: Whether any file was rebuilt.
+    """
+    if Config.VECTOR_BACKEND != VectorBackend.MMAP:
+        return False
+    rebuilt = MmapVectorIndex().rebuild_stale()
+    if rebuilt:
+        print(f"Rebuilt {rebuilt} stale vector index files.")
+    return rebuilt > 0
+
+
+def main(arg_list: list[str] | None = None):
+    """Initializes the argument parser and runs ingestion jobs.
+
+    Usage:
+      uv run python -m ucr_chatbot.worker [--once] [--poll-interval SECONDS]
+    """
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        prog="uv run python -m ucr_chatbot.worker",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        default=False,
+        help="run the jobs that are queued now, then exit",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=Config.INGESTION_POLL_INTERVAL,
+        help="the number of seconds to wait before checking an empty queue again",
+    )
+    args = parser.parse_args(arg_list)
+
+    try:
+        while True:
+            if run_once() or rebuild_stale_indexes():
+                continue
+            if args.once:
+                break
+            time.sleep(args.poll_interval)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()